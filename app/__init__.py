@@ -3,14 +3,25 @@ from flask_sqlalchemy import SQLAlchemy  # 导入SQLAlchemy，用于数据库操
 from flask_migrate import Migrate  # 导入Migrate，用于数据库迁移
 from flask_login import LoginManager  # 导入LoginManager，用于用户认证管理
 from config import Config  # 从config.py导入配置类
+from app.utils.view_counter import ViewCounter  # 导入浏览量缓冲计数器
+from app.cache import PageCache, IdentityCache  # 导入整页缓存和身份缓存
+from app.utils.passwords import PasswordHasher  # 导入密码哈希进程池
+from app.utils.replicas import RoutingSession, ReplicaRouter  # 导入只读副本路由
+from app.utils.images import ImageStore  # 导入上传图片存储
 
 # 创建扩展实例
 # 这些实例将在整个应用中使用
-db = SQLAlchemy()  # 创建数据库实例，用于ORM操作
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # 创建数据库实例，用于ORM操作；会话按语句选择主库或只读副本
 migrate = Migrate()  # 创建迁移实例，用于数据库版本管理
 login = LoginManager()  # 创建登录管理器，处理用户会话
 login.login_view = 'auth.login'  # 设置登录页面的路由名称
 login.login_message = '请先登录后再访问此页面。'  # 未登录时的提示消息
+view_counter = ViewCounter()  # 创建浏览量计数器，浏览量先在内存中累加再批量写回数据库
+page_cache = PageCache()  # 创建整页缓存，缓存匿名访客看到的页面
+identity_cache = IdentityCache()  # 创建身份缓存，登录用户的每个请求不必再查询users表
+password_hasher = PasswordHasher()  # 创建密码哈希进程池，哈希计算不占用请求线程
+replica_router = ReplicaRouter()  # 创建只读副本路由，GET请求的查询分流到副本
+image_store = ImageStore()  # 创建上传图片存储，缩略图在后台进程池中生成
 
 def create_app(config_class=Config):
     """
@@ -33,9 +44,30 @@ def create_app(config_class=Config):
     
     # 初始化扩展
     # 将扩展与Flask应用关联
+    from app.utils import db_pool
+    db_pool.configure_engines(app)  # 按DB_POOL_*配置连接池参数
     db.init_app(app)  # 初始化数据库
+    db_pool.init_app(app, db)  # 开启连接池统计
     migrate.init_app(app, db)  # 初始化迁移工具
     login.init_app(app)  # 初始化登录管理器
+    view_counter.init_app(app, db)  # 初始化浏览量计数器
+    page_cache.init_app(app)  # 初始化整页缓存
+    identity_cache.init_app(app)  # 初始化身份缓存
+    password_hasher.init_app(app)  # 初始化密码哈希进程池
+    replica_router.init_app(app, db)  # 初始化只读副本路由
+    image_store.init_app(app)  # 初始化上传图片存储，注册模板函数responsive_image
+    
+    # 开启按请求的SQL语句统计和查询预算检查
+    from app.utils import query_stats
+    query_stats.init_app(app)
+    
+    # 开启Server-Timing响应头、按路由的慢SQL记录和按需的单请求性能分析
+    from app.utils import profiler
+    profiler.init_app(app)
+    
+    # 开启运行指标（路由延迟、SQL、连接池、缓存），由/internal/metrics以Prometheus格式输出
+    from app.utils import metrics
+    metrics.init_app(app, db)
     
     # 注册蓝图（模块）
     # 蓝图是Flask中组织路由的一种方式，每个功能模块一个蓝图
@@ -54,9 +86,58 @@ def create_app(config_class=Config):
     from app.post import bp as post_bp
     app.register_blueprint(post_bp, url_prefix='/post')
     
+    # 注册订阅源和站点地图蓝图（/feeds/...、/sitemap.xml）
+    from app.feeds import bp as feeds_bp
+    app.register_blueprint(feeds_bp)
+    
+    # 注册图片上传蓝图
+    from app.uploads import bp as uploads_bp
+    app.register_blueprint(uploads_bp, url_prefix='/uploads')
+    
+    # 注册内部运行状态蓝图（连接池统计等，只对管理员和监控系统开放）
+    from app.internal import bp as internal_bp
+    app.register_blueprint(internal_bp, url_prefix='/internal')
+    
+    # 注册命令行工具
+    # 例如：flask search rebuild 重建搜索索引
+    from app.search.cli import search_cli
+    app.cli.add_command(search_cli)
+    
+    # flask counters reconcile 重算文章、用户和标签的冗余计数
+    from app.utils.counters import counters_cli
+    app.cli.add_command(counters_cli)
+    
+    # flask content rerender 重新渲染全部文章的HTML
+    from app.utils.content import content_cli
+    app.cli.add_command(content_cli)
+    
+    # flask import posts 从JSONL文件或Markdown目录批量导入文章
+    from app.utils.importer import import_cli
+    app.cli.add_command(import_cli)
+    
+    # flask export static 把已发布的内容导出为静态HTML
+    from app.utils.static_export import export_cli
+    app.cli.add_command(export_cli)
+    
+    # flask profile token 生成按需分析单个请求的签名令牌
+    from app.utils.profiler import profile_cli
+    app.cli.add_command(profile_cli)
+    
+    # flask images rebuild 为上传的图片补齐缩小版本和WebP版本
+    from app.utils.images import images_cli
+    app.cli.add_command(images_cli)
+    
+    # flask replicas status 检查只读副本的连通性和复制延迟
+    from app.utils.replicas import replicas_cli
+    app.cli.add_command(replicas_cli)
+    
+    # flask check-query-plans 检查所有页面的SQL执行计划
+    from app.utils.query_plan import check_query_plans
+    app.cli.add_command(check_query_plans)
+    
     # 返回配置完成的应用实例
     return app
 
 # 导入模型，确保在应用上下文中可用
 # 这行代码必须在create_app之后，避免循环导入
-from app.models import user, post
\ No newline at end of file
+from app.models import user, post, search
\ No newline at end of file
@@ -25,8 +25,18 @@ def login():
         # 根据用户名查询用户
         user = User.query.filter_by(username=form.username.data).first()
         
+        # 校验密码可能要在哈希进程池排队，先归还数据库连接，避免登录高峰占满连接池
+        # close()只是把user从会话中分离，已加载的属性仍然可用
+        db.session.close()
+        
         # 检查用户是否存在且密码正确
         if user and user.check_password(form.password.data):
+            # 哈希参数已经调整过的旧密码，趁有明文时按新参数重新生成
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.add(user)
+                db.session.commit()
+            
             # 登录用户，remember_me决定是否记住登录状态
             login_user(user, remember=form.remember_me.data)
             
@@ -66,6 +76,8 @@ def register():
         user = User(username=form.username.data, email=form.email.data)
         
         # 设置密码（自动加密）
+        # 哈希在进程池中计算，等待期间先归还表单校验时占用的数据库连接
+        db.session.close()
         user.set_password(form.password.data)
         
         # 添加到数据库会话
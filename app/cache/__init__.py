@@ -0,0 +1,5 @@
+# 缓存：可替换的缓存后端（进程内LRU、文件系统）、共享的失效版本号、匿名访客整页缓存和登录用户的身份缓存
+from app.cache.backends import NullBackend, MemoryBackend, FileSystemBackend, make_backend
+from app.cache.versions import MemoryVersions, FileSystemVersions, make_versions
+from app.cache.page import PageCache
+from app.cache.identity import IdentityCache, UserSnapshot
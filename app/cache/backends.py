@@ -0,0 +1,168 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class NullBackend:
+    """不缓存任何内容，用于关闭缓存"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """
+    进程内LRU缓存
+    按TTL过期，总大小超过max_bytes时淘汰最久未使用的条目；
+    值以pickle后的字节保存，既能精确统计大小，也避免调用方修改缓存中的对象
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {key: (expires, data)}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+class FileSystemBackend:
+    """
+    文件系统缓存，同一台机器上的多个工作进程共享
+    每个键对应目录下的一个文件，先写临时文件再原子替换，读者不会读到写了一半的内容；
+    总大小超过max_bytes时按修改时间删除最旧的文件
+    """
+
+    CULL_EVERY = 100  # 每写入多少次检查一次目录大小
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            self._unlink(path)
+            return None
+        if expires is not None and expires < time.time():
+            self._unlink(path)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._unlink(tmp_path)
+            raise
+
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self._cull()
+
+    def delete(self, key):
+        self._unlink(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            self._unlink(os.path.join(self.directory, name))
+
+    def _cull(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def make_backend(name, config, prefix):
+    """
+    按名称创建缓存后端
+    prefix是配置项前缀，例如PAGE_CACHE会读取PAGE_CACHE_MAX_BYTES和PAGE_CACHE_DIR
+    """
+    if name == 'memory':
+        return MemoryBackend(max_bytes=config[f'{prefix}_MAX_BYTES'])
+    if name == 'filesystem':
+        return FileSystemBackend(config[f'{prefix}_DIR'], max_bytes=config[f'{prefix}_MAX_BYTES'])
+    if name in ('null', 'none', ''):
+        return NullBackend()
+    raise ValueError(f'未知的缓存后端: {name}')
@@ -0,0 +1,121 @@
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache.backends import make_backend, MemoryBackend, NullBackend
+from app.cache.versions import MemoryVersions, make_versions
+
+_PENDING_KEY = 'identity_cache_pending'
+
+
+class UserSnapshot(UserMixin):
+    """
+    已登录用户的轻量只读快照，作为current_user使用
+    只包含页面和权限判断需要的字段，不绑定数据库会话，可以安全地缓存和跨请求复用；
+    文章数、评论数等频繁变化的计数不在快照中，需要时用load()取完整的User对象
+    """
+
+    FIELDS = ('id', 'username', 'email', 'avatar_url', 'bio', 'is_admin', 'created_at')
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for name in self.FIELDS:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{name: getattr(user, name) for name in cls.FIELDS})
+
+    def load(self):
+        """取对应的User模型对象（会查询数据库）"""
+        from app import db
+        from app.models.user import User
+        return db.session.get(User, self.id)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __setstate__(self, state):
+        for name in self.FIELDS:
+            setattr(self, name, state.get(name))
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+class IdentityCache:
+    """
+    Flask-Login用户加载器前面的身份缓存
+    每个进程有一个带TTL的LRU（MemoryBackend），保存UserSnapshot而不是ORM对象；
+    可选的共享后端（如filesystem）让多个工作进程共用快照和版本号
+
+    失效：User的资料、密码或is_admin被修改（ORM刷新UPDATE/DELETE）后，
+    在事务提交时更新该用户的版本号，持有旧版本号的快照在下次读取时作废。
+    版本号保存在所有工作进程共享、不会被淘汰的版本号存储中（CACHE_VERSION_*），每次读取快照都会核对，
+    所以撤销管理员权限、修改密码或删除用户在所有进程中立即生效，不必等快照过期
+    """
+
+    def __init__(self, app=None):
+        self.local = NullBackend()
+        self.shared = NullBackend()
+        self.has_shared = False
+        self.versions = MemoryVersions()
+        self.ttl = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.local = MemoryBackend(app.config['IDENTITY_CACHE_MAX_BYTES'])
+        self.shared = make_backend(app.config['IDENTITY_CACHE_BACKEND'], app.config, 'IDENTITY_CACHE')
+        self.has_shared = not isinstance(self.shared, NullBackend)
+        self.versions = make_versions(app.config)
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+        app.extensions['identity_cache'] = self
+
+    def get(self, user_id, loader):
+        """
+        返回用户快照；缓存未命中时调用loader(user_id)取User对象，用户不存在时返回None
+        """
+        key = f'user:{user_id}'
+        version = self.versions.get(f'user:{user_id}')
+
+        entry = self.local.get(key)
+        if entry is None and self.has_shared:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry, self.ttl)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        # 版本号在查询数据库之前读取：查询期间发生的修改会让这份快照在下次读取时作废
+        user = loader(user_id)
+        if user is None:
+            return None
+        entry = (version, UserSnapshot.from_user(user))
+        self.local.set(key, entry, self.ttl)
+        self.shared.set(key, entry, self.ttl)
+        return entry[1]
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            key = f'user:{user_id}'
+            self.local.delete(key)
+            self.shared.delete(key)
+        self.versions.bump(*(f'user:{user_id}' for user_id in user_ids))
+
+    def watch(self, user_model):
+        """监听用户表的修改，在事务提交后使对应的快照失效"""
+
+        def remember(mapper, connection, target):
+            session = Session.object_session(target)
+            if session is not None:
+                session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+        def after_commit(session):
+            user_ids = session.info.pop(_PENDING_KEY, None)
+            if user_ids:
+                self.invalidate(*user_ids)
+
+        event.listen(user_model, 'after_update', remember)
+        event.listen(user_model, 'after_delete', remember)
+        event.listen(Session, 'after_commit', after_commit)
@@ -0,0 +1,132 @@
+from functools import wraps
+
+from flask import Response, g, request, session, make_response, stream_with_context
+from flask_login import current_user
+
+from app.cache.backends import make_backend, NullBackend
+from app.cache.versions import MemoryVersions, make_versions
+
+
+class PageCache:
+    """
+    匿名访客的整页缓存
+    以URL（含查询字符串）为键缓存完整的响应，只对未登录、没有待显示提示消息的GET请求生效，
+    因为base.html会根据current_user和flash消息渲染不同的内容
+
+    每个缓存条目带有若干标签（如'posts'、'post:<slug>'），写入时记录标签的当前版本；
+    invalidate()更新标签版本后，带有该标签的条目在下次读取时自动失效，
+    不需要遍历或删除缓存条目，内存和文件系统后端都适用
+    标签版本不放在缓存后端里，而是保存在所有工作进程共享、不会被淘汰的版本号存储中（CACHE_VERSION_*），
+    任何一个进程（包括命令行）的失效对所有进程的缓存条目都立即生效
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.versions = MemoryVersions()
+        self.ttl = 60
+        self.stream_ttl = 3600
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(app.config['PAGE_CACHE_BACKEND'], app.config, 'PAGE_CACHE')
+        self.versions = make_versions(app.config)
+        self.ttl = app.config['PAGE_CACHE_TTL']
+        self.stream_ttl = app.config['PAGE_CACHE_STREAM_TTL']
+        app.extensions['page_cache'] = self
+
+    def _tag_versions(self, tags):
+        return {tag: self.versions.get(f'tag:{tag}') for tag in tags}
+
+    def invalidate(self, *tags):
+        """使所有进程中带有这些标签的缓存页面失效，应在数据库事务提交之后调用"""
+        self.versions.bump(*(f'tag:{tag}' for tag in tags))
+
+    def clear(self):
+        """清空本进程可见的缓存后端（memory后端只清空当前进程）；要让所有进程的页面失效请用invalidate()"""
+        self.backend.clear()
+
+    @staticmethod
+    def is_cacheable_request():
+        return (request.method == 'GET'
+                and not current_user.is_authenticated
+                and '_flashes' not in session)
+
+    def cached(self, tags, on_hit=None):
+        """
+        视图装饰器
+        tags：接收视图参数、返回标签列表的函数
+        on_hit：命中缓存时调用的函数，参数是视图渲染时写入g.page_cache_meta的数据，
+                用于在不执行视图的情况下完成浏览计数等副作用
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.is_cacheable_request():
+                    return view(*args, **kwargs)
+
+                key = f'page:{request.full_path}'
+                entry_tags = tags(*args, **kwargs)
+                entry = self.backend.get(key)
+                if entry is not None and entry['versions'] == self._tag_versions(entry_tags):
+                    if on_hit is not None and entry['meta'] is not None:
+                        on_hit(entry['meta'])
+                    response = make_response(entry['body'], entry['status'], entry['headers'])
+                    response.headers['X-Page-Cache'] = 'HIT'
+                    return response
+
+                # 在渲染之前读取标签版本，渲染期间发生的失效会让这个条目在下次读取时作废
+                versions = self._tag_versions(entry_tags)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.backend.set(key, {
+                        'body': response.get_data(),
+                        'status': response.status_code,
+                        'headers': [(k, v) for k, v in response.headers if k.lower() != 'set-cookie'],
+                        'versions': versions,
+                        'meta': g.get('page_cache_meta'),
+                    }, self.ttl)
+                response.headers['X-Page-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def streamed(self, tags, mimetype):
+        """
+        流式响应的缓存装饰器，用于订阅源、站点地图这类与访问者无关的大响应
+        视图返回逐段产生文本的可迭代对象；未命中时边生成边发送，同时收集各段，
+        完整生成后才写入缓存（客户端中途断开时不缓存半截内容）；命中时直接返回缓存的内容
+        内容与登录状态无关，所以对所有用户生效；重新生成的代价较高，
+        有效期使用更长的PAGE_CACHE_STREAM_TTL，内容变化时靠标签失效。
+        外层有conditional()时，条目同时记录生成时的ETag（g.conditional_etag），
+        ETag变了就重新生成：即使漏掉了某次失效（例如直接修改数据库），也不会用新的ETag发送旧的内容
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = f'stream:{request.full_path}'
+                entry_tags = tags(*args, **kwargs)
+                etag = g.get('conditional_etag')
+                entry = self.backend.get(key)
+                if (entry is not None and entry['versions'] == self._tag_versions(entry_tags)
+                        and (etag is None or entry.get('etag') == etag)):
+                    response = Response(entry['body'], mimetype=mimetype)
+                    response.headers['X-Page-Cache'] = 'HIT'
+                    return response
+
+                versions = self._tag_versions(entry_tags)
+                chunks = view(*args, **kwargs)
+
+                def generate():
+                    body = []
+                    for chunk in chunks:
+                        body.append(chunk)
+                        yield chunk
+                    self.backend.set(key, {'body': ''.join(body), 'versions': versions, 'etag': etag},
+                                     self.stream_ttl)
+
+                response = Response(stream_with_context(generate()), mimetype=mimetype)
+                response.headers['X-Page-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
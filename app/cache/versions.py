@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+
+class MemoryVersions:
+    """
+    进程内的失效版本号，只在当前进程有效
+    只适用于单进程运行的场景（开发服务器、命令行、测试），多个工作进程时会漏掉其他进程的失效
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            version = self._versions.get(key)
+            if version is None:
+                version = self._versions[key] = time.time_ns()
+            return version
+
+    def bump(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = max(time.time_ns(), self._versions.get(key, 0) + 1)
+
+
+class FileSystemVersions:
+    """
+    文件系统中的失效版本号，同一台机器上的所有工作进程共享
+    每个键一个小文件，内容是版本号；和缓存条目分开保存，没有过期时间，也不参与按大小淘汰。
+    键还没有版本号（第一次使用，或目录被清空）时用当前时间创建一个，
+    所以丢失的版本号不会和任何旧条目中记录的版本号相同，旧条目只会作废而不会“复活”
+    """
+
+    shared = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.version')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                return int(f.read())
+        except FileNotFoundError:
+            pass
+        # 多个进程同时创建时只有一个os.link成功，其他进程读取它写入的值
+        self._write(path, time.time_ns(), replace=False)
+        with open(path, 'rb') as f:
+            return int(f.read())
+
+    def bump(self, *keys):
+        for key in keys:
+            self._write(self._path(key), time.time_ns(), replace=True)
+
+    def _write(self, path, version, replace):
+        """先写临时文件，再原子地替换（replace）或只在不存在时创建（link），读者不会读到写了一半的内容"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(str(version).encode())
+            if replace:
+                os.replace(tmp_path, path)
+                return
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        os.unlink(tmp_path)
+
+
+def make_versions(config):
+    """按CACHE_VERSION_BACKEND创建失效版本号的存储"""
+    name = config['CACHE_VERSION_BACKEND']
+    if name == 'filesystem':
+        return FileSystemVersions(config['CACHE_VERSION_DIR'])
+    if name == 'memory':
+        return MemoryVersions()
+    raise ValueError(f'未知的版本号后端: {name}')
@@ -0,0 +1,247 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from itertools import chain
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import desc, func, select
+
+from app.feeds import bp
+from app import db, page_cache
+from app.models.post import Post, Tag, post_tags
+from app.models.user import User
+from app.utils.http_cache import conditional
+from app.utils.post_cards import tags_by_post
+
+FEED_TITLE = '我的博客'
+FEED_DESCRIPTION = '分享技术与生活'
+FETCH_SIZE = 500  # 服务端游标每批取出的行数
+
+ATOM = 'application/atom+xml'
+RSS = 'application/rss+xml'
+XML = 'application/xml'
+
+# 订阅源和站点地图只和已发布的文章有关，都带'posts'标签整体缓存，
+# 发布、编辑、删除文章时失效；未命中时一边用服务端游标读取一边输出，不会把全部行读进内存。
+# 条件请求复用文章列表页的校验值，文章没有变化时返回304
+
+
+def _listing_validators(**kwargs):
+    return Post.listing_validators()
+
+
+def _tag_validators(slug):
+    """标签订阅源的校验值：列表页的校验值再加上标签名；标签不存在时返回None，由视图返回404"""
+    name = db.session.scalar(select(Tag.name).where(Tag.slug == slug))
+    if name is None:
+        return None
+    last_modified, etag_parts = Post.listing_validators()
+    return last_modified, (name,) + etag_parts
+
+
+def _posts_tag(**kwargs):
+    return ['posts']
+
+
+def _stream(statement):
+    """按FETCH_SIZE行一批读取查询结果（服务端游标），逐批产生行列表；读取期间不要在同一个会话上执行其他查询"""
+    result = db.session.execute(statement, execution_options={'yield_per': FETCH_SIZE})
+    yield from result.partitions()
+
+
+def _utc(value):
+    return (value or datetime(1970, 1, 1)).replace(tzinfo=timezone.utc)
+
+
+def _entries(*criteria):
+    """
+    最新的FEED_ENTRIES篇已发布文章，产生 (行, 标签) 对
+    正文直接读取渲染好的content_html；标签在开始读取文章之前用一次查询取出，
+    MySQL的服务端游标没有读完时同一个连接上不能执行其他查询
+    """
+    where = (Post.is_published == True, *criteria)
+    order = (desc(Post.published_at), desc(Post.id))
+    limit = current_app.config['FEED_ENTRIES']
+    # IN子查询里不能直接用LIMIT（MySQL），包一层派生表
+    latest = select(Post.id).where(*where).order_by(*order).limit(limit).subquery()
+    tags = tags_by_post(select(latest.c.id))
+    statement = (select(Post.id, Post.title, Post.slug, Post.summary, Post.excerpt, Post.content_html,
+                        Post.published_at, Post.updated_at, User.username)
+                 .join(User, User.id == Post.user_id)
+                 .where(*where).order_by(*order).limit(limit))
+    for rows in _stream(statement):
+        for row in rows:
+            yield row, tags.get(row.id, ())
+
+
+def _atom(title, alternate, updated, entries):
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+           f'<title>{escape(title)}</title>\n'
+           f'<link rel="alternate" type="text/html" href={quoteattr(alternate)}/>\n'
+           f'<link rel="self" href={quoteattr(request.base_url)}/>\n'
+           f'<id>{escape(request.base_url)}</id>\n'
+           f'<updated>{_utc(updated).isoformat()}</updated>\n')
+    for row, tags in entries:
+        link = url_for('post.detail', slug=row.slug, _external=True)
+        parts = ['<entry>\n',
+                 f'<title>{escape(row.title)}</title>\n',
+                 f'<link rel="alternate" type="text/html" href={quoteattr(link)}/>\n',
+                 f'<id>{escape(link)}</id>\n',
+                 f'<published>{_utc(row.published_at).isoformat()}</published>\n',
+                 f'<updated>{_utc(row.updated_at or row.published_at).isoformat()}</updated>\n',
+                 f'<author><name>{escape(row.username)}</name></author>\n']
+        parts += [f'<category term={quoteattr(tag.name)}/>\n' for tag in tags]
+        if row.summary or row.excerpt:
+            parts.append(f'<summary>{escape(row.summary or row.excerpt)}</summary>\n')
+        if row.content_html:
+            parts.append(f'<content type="html">{escape(row.content_html)}</content>\n')
+        parts.append('</entry>\n')
+        yield ''.join(parts)
+    yield '</feed>\n'
+
+
+def _rss(title, alternate, updated, entries):
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+           'xmlns:dc="http://purl.org/dc/elements/1.1/">\n<channel>\n'
+           f'<title>{escape(title)}</title>\n'
+           f'<link>{escape(alternate)}</link>\n'
+           f'<description>{escape(FEED_DESCRIPTION)}</description>\n'
+           f'<atom:link rel="self" type="{RSS}" href={quoteattr(request.base_url)}/>\n'
+           f'<lastBuildDate>{format_datetime(_utc(updated))}</lastBuildDate>\n')
+    for row, tags in entries:
+        link = url_for('post.detail', slug=row.slug, _external=True)
+        parts = ['<item>\n',
+                 f'<title>{escape(row.title)}</title>\n',
+                 f'<link>{escape(link)}</link>\n',
+                 f'<guid isPermaLink="true">{escape(link)}</guid>\n',
+                 f'<pubDate>{format_datetime(_utc(row.published_at))}</pubDate>\n',
+                 f'<dc:creator>{escape(row.username)}</dc:creator>\n']
+        parts += [f'<category>{escape(tag.name)}</category>\n' for tag in tags]
+        description = row.content_html or row.summary or row.excerpt
+        if description:
+            parts.append(f'<description>{escape(description)}</description>\n')
+        parts.append('</item>\n')
+        yield ''.join(parts)
+    yield '</channel>\n</rss>\n'
+
+
+@bp.route('/feeds/atom.xml')
+@conditional(_listing_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=ATOM)
+def atom():
+    last_modified, _ = Post.listing_validators()
+    return _atom(FEED_TITLE, url_for('main.index', _external=True), last_modified, _entries())
+
+
+@bp.route('/feeds/rss.xml')
+@conditional(_listing_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=RSS)
+def rss():
+    last_modified, _ = Post.listing_validators()
+    return _rss(FEED_TITLE, url_for('main.index', _external=True), last_modified, _entries())
+
+
+def _tag_feed(slug, render):
+    tag = db.session.execute(select(Tag.id, Tag.name).where(Tag.slug == slug)).first()
+    if tag is None:
+        abort(404)
+    last_modified, _ = Post.listing_validators()
+    tagged = select(post_tags.c.post_id).where(post_tags.c.tag_id == tag.id)
+    return render(f'{FEED_TITLE} - {tag.name}', url_for('post.index', tag=slug, _external=True),
+                  last_modified, _entries(Post.id.in_(tagged)))
+
+
+@bp.route('/feeds/tags/<slug>/atom.xml')
+@conditional(_tag_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=ATOM)
+def tag_atom(slug):
+    return _tag_feed(slug, _atom)
+
+
+@bp.route('/feeds/tags/<slug>/rss.xml')
+@conditional(_tag_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=RSS)
+def tag_rss(slug):
+    return _tag_feed(slug, _rss)
+
+
+def _urlset(urls):
+    """urls：(地址, 最后修改时间) 的可迭代对象"""
+    yield '<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for loc, lastmod in urls:
+        lastmod = f'<lastmod>{_utc(lastmod).isoformat()}</lastmod>' if lastmod else ''
+        yield f'<url><loc>{escape(loc)}</loc>{lastmod}</url>\n'
+    yield '</urlset>\n'
+
+
+@bp.route('/sitemap.xml')
+@conditional(_listing_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=XML)
+def sitemap_index():
+    """
+    站点地图索引：一个列出首页、列表页和标签页的分片，加上按文章ID划分的若干文章分片
+    每个文章分片包含ID在 [(n-1)*SITEMAP_SHARD_SIZE, n*SITEMAP_SHARD_SIZE) 之间的已发布文章，
+    文章ID不会改变，所以新发布的文章只会改变一个分片的内容和lastmod
+    """
+    size = current_app.config['SITEMAP_SHARD_SIZE']
+    last_modified, _ = Post.listing_validators()
+    shard = (Post.id // size).label('shard')
+    statement = (select(shard, func.max(Post.updated_at))
+                 .where(Post.is_published == True)
+                 .group_by(shard).order_by(shard))
+
+    def generate():
+        yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+               f'<sitemap><loc>{escape(url_for("feeds.sitemap_pages", _external=True))}</loc>'
+               f'<lastmod>{_utc(last_modified).isoformat()}</lastmod></sitemap>\n')
+        for rows in _stream(statement):
+            for number, lastmod in rows:
+                loc = url_for('feeds.sitemap_posts', shard=int(number) + 1, _external=True)
+                yield f'<sitemap><loc>{escape(loc)}</loc><lastmod>{_utc(lastmod).isoformat()}</lastmod></sitemap>\n'
+        yield '</sitemapindex>\n'
+    return generate()
+
+
+@bp.route('/sitemaps/pages.xml')
+@conditional(_listing_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=XML)
+def sitemap_pages():
+    """首页、关于、文章列表和每个有已发布文章的标签列表"""
+    last_modified, _ = Post.listing_validators()
+
+    def urls():
+        yield url_for('main.index', _external=True), last_modified
+        yield url_for('main.about', _external=True), None
+        yield url_for('post.index', _external=True), last_modified
+        for rows in _stream(select(Tag.slug).where(Tag.post_count > 0).order_by(Tag.slug)):
+            for slug, in rows:
+                yield url_for('post.index', tag=slug, _external=True), None
+    return _urlset(urls())
+
+
+@bp.route('/sitemaps/posts-<int:shard>.xml')
+@conditional(_listing_validators)
+@page_cache.streamed(tags=_posts_tag, mimetype=XML)
+def sitemap_posts(shard):
+    """
+    第shard个文章分片（从1开始），按主键范围用服务端游标读取，分片里没有已发布文章时返回404
+    草稿在Python中跳过：条件里带上is_published时，数据库会改用(is_published, ...)索引再额外排序
+    """
+    size = current_app.config['SITEMAP_SHARD_SIZE']
+    if shard < 1:
+        abort(404)
+    statement = (select(Post.slug, Post.updated_at, Post.published_at, Post.is_published)
+                 .where(Post.id >= (shard - 1) * size, Post.id < shard * size)
+                 .order_by(Post.id))
+    published = (row for rows in _stream(statement) for row in rows if row.is_published)
+    first = next(published, None)
+    if first is None:
+        abort(404)
+
+    def urls():
+        for slug, updated_at, published_at, _ in chain([first], published):
+            yield url_for('post.detail', slug=slug, _external=True), updated_at or published_at
+    return _urlset(urls())
@@ -0,0 +1,56 @@
+import hmac
+import os
+
+from flask import abort, current_app, jsonify, request
+from flask_login import current_user
+from app.internal import bp
+from app import db
+from app.utils.db_pool import pool_status
+from app.utils.metrics import render_latest
+from app.utils.profiler import slow_statements
+
+
+@bp.before_request
+def require_internal_access():
+    """只允许管理员或带着INTERNAL_TOKEN的请求访问，其他人看到的是404"""
+    token = current_app.config.get('INTERNAL_TOKEN')
+    # Prometheus等抓取程序只能设置Authorization头，也接受 Bearer <INTERNAL_TOKEN>
+    supplied = request.headers.get('X-Internal-Token', '')
+    if not supplied and request.authorization and request.authorization.type == 'bearer':
+        supplied = request.authorization.token or ''
+    if token and hmac.compare_digest(supplied.encode(), token.encode()):
+        return None
+    if current_user.is_authenticated and current_user.is_admin:
+        return None
+    abort(404)
+
+
+@bp.route('/pool')
+def pool():
+    """
+    本进程数据库连接池的状态：使用中/空闲/溢出的连接数，
+    以及累计的取连接次数、等待时间、溢出和超时次数
+    多进程部署时每次请求只能看到处理它的那个工作进程
+    """
+    return jsonify(pool_status(db))
+
+
+@bp.route('/slow-queries')
+def slow_queries():
+    """
+    本进程每个路由最慢的SQL：规范化后的语句（不含参数值）、执行次数、总耗时、最大和平均耗时
+    加上 ?reset=1 在返回后清空统计
+    """
+    result = {'pid': os.getpid(), 'routes': slow_statements.snapshot()}
+    if request.args.get('reset') == '1':
+        slow_statements.clear()
+    return jsonify(result)
+
+
+@bp.route('/metrics')
+def metrics():
+    """
+    Prometheus文本格式的运行指标
+    Gunicorn下汇总所有工作进程（多进程模式，见gunicorn.conf.py），不会因为抓取落在不同进程而跳变
+    """
+    return render_latest()
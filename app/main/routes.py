@@ -1,17 +1,31 @@
 from flask import render_template, request, current_app
 from app.main import bp
+from app import page_cache
+from app.utils.pagination import paginate_keyset, redirect_legacy_page, post_counter
+from app.utils.http_cache import conditional
 from app.models.post import Post, Tag
 from app.models.user import User
+from app.search import search as search_posts
+from app.utils.post_cards import card_query, to_cards
 from sqlalchemy import desc
 
 @bp.route('/')
+@conditional(Post.listing_validators)
+@page_cache.cached(tags=lambda: ['posts'])
 def index():
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(is_published=True).order_by(desc(Post.published_at)).paginate(
-        page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False)
+    per_page = current_app.config['POSTS_PER_PAGE']
+    # 列表只选择卡片需要的列，不加载正文，结果是不可变的PostCard
+    query = card_query(Post.is_published == True)
+    
+    legacy = redirect_legacy_page(query, Post, 'main.index', per_page)
+    if legacy:
+        return legacy
     
-    recent_posts = Post.query.filter_by(is_published=True).order_by(desc(Post.created_at)).limit(5).all()
-    popular_tags = Tag.query.limit(10).all()
+    total = post_counter.get('published', lambda: Post.query.filter_by(is_published=True).count())
+    posts = paginate_keyset(query, Post, request.args.get('cursor'), per_page, total=total, transform=to_cards)
+    
+    recent_posts = to_cards(card_query(Post.is_published == True).order_by(desc(Post.created_at)).limit(5))
+    popular_tags = Tag.query.order_by(Tag.post_count.desc()).limit(10).all()
     
     return render_template('main/index.html', 
                          posts=posts, 
@@ -29,11 +43,7 @@ def contact():
 @bp.route('/search')
 def search():
     query = request.args.get('q', '')
-    if query:
-        posts = Post.query.filter(
-            Post.title.contains(query) | Post.content.contains(query)
-        ).filter_by(is_published=True).order_by(desc(Post.created_at)).all()
-    else:
-        posts = []
+    page = request.args.get('page', 1, type=int)
+    posts = search_posts(query, page=page, per_page=current_app.config['POSTS_PER_PAGE'])
     
     return render_template('main/search.html', posts=posts, query=query)
\ No newline at end of file
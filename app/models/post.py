@@ -1,6 +1,7 @@
 from datetime import datetime  # 导入日期时间模块
 from flask_sqlalchemy import SQLAlchemy  # 导入SQLAlchemy ORM框架
-from app import db  # 从app包导入数据库实例
+from sqlalchemy import func  # 导入SQL函数，用于聚合查询
+from app import db, view_counter  # 从app包导入数据库实例和浏览量计数器
 
 class Post(db.Model):
     """
@@ -12,15 +13,32 @@ class Post(db.Model):
     # 指定对应的数据库表名
     __tablename__ = 'posts'
     
+    # 复合索引，对应列表页的查询方式：按是否发布筛选，再按发布时间或创建时间排序
+    # id放在最后，游标分页的(published_at, id)排序可以直接按索引顺序读取
+    # (is_published, id)供详情页的"相关文章"按ID取前几篇已发布文章
+    __table_args__ = (
+        db.Index('ix_posts_is_published_published_at', 'is_published', 'published_at', 'id'),
+        db.Index('ix_posts_is_published_id', 'is_published', 'id'),
+        db.Index('ix_posts_is_published_created_at', 'is_published', 'created_at'),
+        db.Index('ix_posts_is_published_updated_at', 'is_published', 'updated_at'),
+    )
+    
     # 定义表的字段（列）
     id = db.Column(db.Integer, primary_key=True)  # 主键，自动递增的整数ID
     title = db.Column(db.String(200), nullable=False)  # 文章标题，最大200字符，不能为空
     slug = db.Column(db.String(200), unique=True, nullable=False, index=True)  # URL友好的文章标识符，唯一，建立索引
-    content = db.Column(db.Text, nullable=False)  # 文章内容，长文本，不能为空
+    # 文章内容（Markdown原文），长文本，不能为空
+    # 列表页不需要原文，设为延迟加载，只有访问post.content时才单独查询
+    content = db.deferred(db.Column(db.Text, nullable=False))
+    # 保存时由app.utils.content渲染并过滤后的HTML，详情页直接输出；同样延迟加载
+    content_html = db.deferred(db.Column(db.Text))
+    excerpt = db.Column(db.String(255))  # 从正文提取的纯文本摘要，没有填写summary时在列表页显示
+    reading_time = db.Column(db.Integer)  # 估算的阅读时间（分钟）
     summary = db.Column(db.String(500))  # 文章摘要，最大500字符，可为空
     featured_image = db.Column(db.String(300))  # 特色图片URL，可为空
     is_published = db.Column(db.Boolean, default=False)  # 是否已发布，默认为False（草稿）
     view_count = db.Column(db.Integer, default=0)  # 浏览次数，默认为0
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 已审核评论数，由app.utils.counters在写评论时维护
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间，默认为当前时间
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 更新时间，修改时自动更新
     published_at = db.Column(db.DateTime)  # 发布时间，可为空（草稿没有发布时间）
@@ -47,10 +65,54 @@ class Post(db.Model):
     def increment_view(self):
         """
         增加文章浏览次数
-        每次调用这个方法，view_count加1
+        只在内存中累加，由view_counter定期批量写回数据库，
+        避免每次浏览都产生一次写事务
+        """
+        view_counter.incr(self.id)
+    
+    @property
+    def total_views(self):
+        """
+        显示用的浏览次数
+        数据库中的view_count加上本进程尚未写回的缓冲增量，让访客至少能看到自己刚才的浏览
+        """
+        return (self.view_count or 0) + view_counter.local_pending(self.id)
+    
+    @staticmethod
+    def listing_validators():
         """
-        self.view_count += 1  # 浏览次数加1
-        db.session.commit()   # 提交到数据库
+        文章列表页的条件请求校验值
+        一条查询取出已发布文章数、最新发布时间和最新修改时间，
+        发布、撤回、编辑、删除文章都会改变其中至少一个值
+        三个值各用一个标量子查询：合在一个聚合里时数据库只能逐行读表，
+        分开后每个子查询都只读(is_published, ...)复合索引，MAX只需读索引的一端
+        返回 (last_modified, etag_parts)
+        """
+        def published(column):
+            return db.session.query(column).filter(Post.is_published == True).scalar_subquery()
+        count, last_published, last_updated = db.session.query(
+            published(func.count()), published(func.max(Post.published_at)), published(func.max(Post.updated_at))
+        ).one()
+        last_modified = max([t for t in (last_published, last_updated) if t], default=None)
+        return last_modified, (count, last_published, last_updated)
+    
+    @staticmethod
+    def detail_validators(slug):
+        """
+        文章详情页的条件请求校验值
+        一条查询取出文章的修改时间和最新评论时间
+        返回 (last_modified, etag_parts, meta)，文章不存在时返回None
+        """
+        last_comment = (db.session.query(func.max(Comment.created_at))
+                        .filter(Comment.post_id == Post.id, Comment.is_approved == True)
+                        .scalar_subquery())
+        row = (db.session.query(Post.id, Post.updated_at, last_comment)
+               .filter(Post.slug == slug, Post.is_published == True).first())
+        if row is None:
+            return None
+        post_id, updated_at, commented_at = row
+        last_modified = max([t for t in (updated_at, commented_at) if t], default=None)
+        return last_modified, (post_id, updated_at, commented_at), {'post_id': post_id}
 
 class Comment(db.Model):
     """
@@ -61,6 +123,11 @@ class Comment(db.Model):
     
     __tablename__ = 'comments'
     
+    # 复合索引：详情页按文章查询已审核的评论并按时间排序
+    __table_args__ = (
+        db.Index('ix_comments_post_id_is_approved_created_at', 'post_id', 'is_approved', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)  # 主键，评论ID
     content = db.Column(db.Text, nullable=False)  # 评论内容，不能为空
     is_approved = db.Column(db.Boolean, default=True)  # 是否已审核通过，默认为True
@@ -69,7 +136,7 @@ class Comment(db.Model):
     # 外键
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 评论者ID
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)  # 所属文章ID
-    parent_id = db.Column(db.Integer, db.ForeignKey('comments.id'))  # 父评论ID，用于回复功能
+    parent_id = db.Column(db.Integer, db.ForeignKey('comments.id'), index=True)  # 父评论ID，用于回复功能，建立索引供加载评论树时按父评论查找回复
     
     # 自关联关系：评论可以回复其他评论
     # remote_side=[id]表示关系的远端是Comment.id
@@ -91,6 +158,7 @@ class Tag(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)  # 标签名称，唯一，不能为空
     slug = db.Column(db.String(50), unique=True, nullable=False)  # URL友好的标签标识符
     color = db.Column(db.String(7), default='#007bff')  # 标签颜色，十六进制颜色代码，默认为蓝色
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)  # 已发布文章数，建立索引供标签云按热度排序
     
     def __repr__(self):
         return f'<Tag {self.name}>'
@@ -99,6 +167,8 @@ class Tag(db.Model):
 # 因为文章和标签是多对多关系，需要一张中间表来存储关联
 post_tags = db.Table('post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('posts.id'), primary_key=True),  # 文章ID，外键
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)    # 标签ID，外键
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),   # 标签ID，外键
     # 两个字段一起组成复合主键，确保一篇文章不会重复关联同一个标签
+    # 复合主键以post_id开头，按标签查文章时用不上，所以再建一个以tag_id开头的索引
+    db.Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id')
 )
\ No newline at end of file
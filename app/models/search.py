@@ -0,0 +1,37 @@
+from app import db  # 从app包导入数据库实例
+
+class SearchPosting(db.Model):
+    """
+    倒排索引表
+    对应数据库中的search_postings表
+    每行记录一个检索词在一篇文章中出现的次数
+    """
+    
+    __tablename__ = 'search_postings'
+    
+    # 搜索时每个检索词按词频从高到低只取前几条倒排记录，按索引顺序读取，不需要排序
+    __table_args__ = (
+        db.Index('ix_search_postings_term_tf', 'term', 'tf', 'post_id'),
+    )
+    
+    term = db.Column(db.String(64), primary_key=True)  # 检索词
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True, index=True)  # 文章ID，建立索引方便按文章删除
+    tf = db.Column(db.Integer, nullable=False)  # 词频：检索词在这篇文章中出现的次数
+    
+    def __repr__(self):
+        return f'<SearchPosting {self.term} {self.post_id}>'
+
+class SearchDocument(db.Model):
+    """
+    已建立索引的文章表
+    对应数据库中的search_documents表
+    记录每篇文章的词数，用于BM25的文档长度归一化
+    """
+    
+    __tablename__ = 'search_documents'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True)  # 文章ID
+    length = db.Column(db.Integer, nullable=False)  # 文章切分后的总词数
+    
+    def __repr__(self):
+        return f'<SearchDocument {self.post_id}>'
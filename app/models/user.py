@@ -1,8 +1,7 @@
 from datetime import datetime  # 导入日期时间模块，用于记录创建和更新时间
 from flask_sqlalchemy import SQLAlchemy  # 导入SQLAlchemy，ORM框架
 from flask_login import UserMixin  # 导入用户认证基类，提供用户会话管理功能
-from werkzeug.security import generate_password_hash, check_password_hash  # 导入密码加密和验证工具
-from app import db, login  # 从app包导入数据库实例和登录管理器
+from app import db, login, identity_cache, password_hasher  # 从app包导入数据库实例、登录管理器、身份缓存和密码哈希进程池
 
 class User(UserMixin, db.Model):
     """
@@ -24,6 +23,8 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间，默认为当前时间
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 更新时间，修改时自动更新
     is_admin = db.Column(db.Boolean, default=False)  # 是否管理员，默认为False
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')     # 已发布文章数，由app.utils.counters维护
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 已审核评论数，由app.utils.counters维护
     
     # 定义关系（外键关联）
     # 一个用户有多篇文章，backref='author'表示Post类可以通过author访问对应的用户
@@ -46,8 +47,8 @@ class User(UserMixin, db.Model):
         设置用户密码
         接收明文密码，生成哈希值存储到数据库
         """
-        # 使用Werkzeug的generate_password_hash生成安全的密码哈希
-        self.password_hash = generate_password_hash(password)
+        # 在密码哈希进程池中按PASSWORD_HASH_METHOD生成安全的密码哈希
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """
@@ -55,15 +56,26 @@ class User(UserMixin, db.Model):
         接收明文密码，与存储的哈希值比较
         返回True或False
         """
-        # 使用Werkzeug的check_password_hash验证密码
-        return check_password_hash(self.password_hash, password)
+        # 在密码哈希进程池中验证密码
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """
+        密码哈希的算法或成本参数是否与当前配置不同
+        登录成功时检查，需要时用刚验证过的明文密码重新生成哈希
+        """
+        return password_hasher.needs_rehash(self.password_hash)
     
     def get_posts_count(self):
         """
-        获取用户的文章数量
+        获取用户已发布的文章数量
+        读取冗余的post_count列，不再执行COUNT查询
         返回整数
         """
-        return self.posts.count()
+        return self.post_count
+
+# 用户资料、密码或管理员权限修改并提交后，使身份缓存中的快照失效
+identity_cache.watch(User)
 
 # 用户加载回调函数
 # Flask-Login需要这个函数来从用户ID获取用户对象
@@ -73,6 +85,10 @@ def load_user(id):
     从用户ID加载用户对象
     用于Flask-Login的会话管理
     id参数是字符串，需要转换为整数
+    返回身份缓存中的UserSnapshot，缓存未命中时才查询数据库
     """
-    # 使用User.query.get()通过主键查询用户
-    return User.query.get(int(id))
\ No newline at end of file
+    try:
+        user_id = int(id)
+    except (TypeError, ValueError):
+        return None
+    return identity_cache.get(user_id, lambda user_id: db.session.get(User, user_id))
\ No newline at end of file
@@ -2,11 +2,19 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, BooleanField, SubmitField, HiddenField
 from wtforms.validators import DataRequired, Length, Optional, URL
 
+from app.utils.images import uploaded_name
+
+
+def image_url(form, field):
+    """特色图片可以是外部图片的完整URL，也可以是上传接口返回的本站地址"""
+    if not uploaded_name(field.data):
+        URL()(form, field)
+
 class PostForm(FlaskForm):
     title = StringField('标题', validators=[DataRequired(), Length(min=5, max=200)])
     content = TextAreaField('内容', validators=[DataRequired(), Length(min=10)])
     summary = TextAreaField('摘要', validators=[Optional(), Length(max=500)])
-    featured_image = StringField('特色图片URL', validators=[Optional(), URL()])
+    featured_image = StringField('特色图片URL', validators=[Optional(), image_url])
     tags = StringField('标签（用逗号分隔）', validators=[Optional()])
     is_published = BooleanField('立即发布')
     submit = SubmitField('保存文章')
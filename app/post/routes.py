@@ -1,46 +1,80 @@
 from datetime import datetime
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import render_template, redirect, url_for, flash, request, abort, current_app, g
 from flask_login import login_required, current_user
 from app.post import bp
-from app import db
+from app import db, page_cache, view_counter
 from app.models.post import Post, Comment, Tag
 from app.post.forms import PostForm, CommentForm
+from app.search import index_post, remove_post
+from app.utils.pagination import paginate_keyset, redirect_legacy_page, post_counter
+from app.utils.http_cache import conditional
+from app.utils.tags import parse_tag_names, resolve_tags, sync_post_tags
+from app.utils.helpers import slugify
+from app.utils.slugs import save_with_unique_slug
+from app.utils.comments import load_comment_threads
+from app.utils import counters
+from app.utils.content import apply_rendered_content
+from app.utils.post_cards import card_query, to_cards
 from sqlalchemy import desc
-import re
+from sqlalchemy.orm import joinedload, selectinload, undefer
 
-def slugify(text):
-    """将标题转换为URL友好的slug"""
-    text = re.sub(r'[^\w\s-]', '', text).strip().lower()
-    text = re.sub(r'[-\s]+', '-', text)
-    return text
+def _count_cached_view(meta):
+    """详情页命中整页缓存或返回304时，视图函数不会执行，在这里补上浏览计数"""
+    view_counter.incr(meta['post_id'])
 
 @bp.route('/')
+@conditional(Post.listing_validators)
+@page_cache.cached(tags=lambda: ['posts'])
 def index():
-    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['POSTS_PER_PAGE']
     tag_slug = request.args.get('tag')
     
-    query = Post.query.filter_by(is_published=True)
+    # 列表只选择卡片需要的列，不加载正文，结果是不可变的PostCard
+    query = card_query(Post.is_published == True)
     
     if tag_slug:
         tag = Tag.query.filter_by(slug=tag_slug).first_or_404()
         query = query.filter(Post.tags.contains(tag))
     
-    posts = query.order_by(desc(Post.published_at)).paginate(
-        page=page, per_page=10, error_out=False)
+    legacy = redirect_legacy_page(query, Post, 'post.index', per_page, tag=tag_slug)
+    if legacy:
+        return legacy
     
-    tags = Tag.query.limit(20).all()
+    # 近似总数在后台线程中统计，那里需要新建查询而不能复用当前请求的会话
+    if tag_slug:
+        total = post_counter.get(('tag', tag_slug), lambda: Post.query.filter_by(is_published=True).filter(
+            Post.tags.any(Tag.slug == tag_slug)).count())
+    else:
+        total = post_counter.get('published', lambda: Post.query.filter_by(is_published=True).count())
+    # 作者用户名随列一起JOIN取出，标签用一次IN查询批量取出
+    posts = paginate_keyset(query, Post, request.args.get('cursor'), per_page, total=total,
+                            transform=lambda rows: to_cards(rows, with_tags=True))
+    
+    # 标签云：直接读取冗余的post_count列，按文章数取前20个
+    tags = Tag.query.order_by(Tag.post_count.desc()).limit(20).all()
     
     return render_template('post/index.html', posts=posts, tags=tags, tag_slug=tag_slug)
 
 @bp.route('/<slug>')
+@conditional(Post.detail_validators, on_not_modified=_count_cached_view)
+@page_cache.cached(tags=lambda slug: [f'post:{slug}'], on_hit=_count_cached_view)
 def detail(slug):
-    post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
+    post = (Post.query.options(joinedload(Post.author), selectinload(Post.tags), undefer(Post.content_html))
+            .filter_by(slug=slug, is_published=True).first_or_404())
     post.increment_view()
+    g.page_cache_meta = {'post_id': post.id}
     
     form = CommentForm()
-    comments = Comment.query.filter_by(post_id=post.id, is_approved=True).order_by(Comment.created_at.desc())
-    
-    return render_template('post/detail.html', post=post, form=form, comments=comments)
+    # 评论按顶层评论分页，每页连同全部回复一起加载
+    comment_page = request.args.get('cpage', 1, type=int)
+    comments = load_comment_threads(post.id, page=max(comment_page, 1),
+                                    per_page=current_app.config['COMMENTS_PER_PAGE'])
+    if comment_page < 1 or comment_page > comments.pages:
+        abort(404)
+    related_posts = Post.query.filter(Post.id != post.id, Post.is_published == True).order_by(Post.id).limit(5).all()
+    
+    return render_template('post/detail.html', post=post, form=form, comments=comments,
+                           related_posts=related_posts)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -48,18 +82,8 @@ def create():
     form = PostForm()
     
     if form.validate_on_submit():
-        slug = slugify(form.title.data)
-        
-        # 确保slug唯一
-        counter = 1
-        original_slug = slug
-        while Post.query.filter_by(slug=slug).first():
-            slug = f"{original_slug}-{counter}"
-            counter += 1
-        
         post = Post(
             title=form.title.data,
-            slug=slug,
             content=form.content.data,
             summary=form.summary.data,
             featured_image=form.featured_image.data,
@@ -67,20 +91,23 @@ def create():
             user_id=current_user.id
         )
         
-        # 处理标签
-        tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name, slug=slugify(tag_name))
-                db.session.add(tag)
-            post.tags.append(tag)
-        
         if form.is_published.data:
             post.published_at = datetime.utcnow()
         
-        db.session.add(post)
+        # 渲染Markdown并提取摘要和阅读时间，之后的每次浏览都不必再处理
+        apply_rendered_content(post)
+        
+        # 一次前缀查询分配唯一的slug，并发冲突时在保存点内重试；插入后即可拿到文章ID
+        save_with_unique_slug(post, Post.slug, slugify(form.title.data))
+        
+        # 处理标签：批量查询和创建，与标签数量无关
+        tags = resolve_tags(parse_tag_names(form.tags.data))
+        sync_post_tags(post, tags, new=True)
+        counters.post_saved(post, False, [tag.id for tag in tags])
+        index_post(post)
         db.session.commit()
+        if post.is_published:
+            page_cache.invalidate('posts')
         
         flash('文章创建成功！')
         return redirect(url_for('post.detail', slug=post.slug))
@@ -98,8 +125,10 @@ def edit(slug):
     form = PostForm()
     
     if form.validate_on_submit():
+        was_published = post.is_published
         post.title = form.title.data
         post.content = form.content.data
+        apply_rendered_content(post)
         post.summary = form.summary.data
         post.featured_image = form.featured_image.data
         post.is_published = form.is_published.data
@@ -107,17 +136,14 @@ def edit(slug):
         if form.is_published.data and not post.published_at:
             post.published_at = datetime.utcnow()
         
-        # 更新标签
-        post.tags.clear()
-        tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name, slug=slugify(tag_name))
-                db.session.add(tag)
-            post.tags.append(tag)
+        # 更新标签：只写入有变化的关联
+        tags = resolve_tags(parse_tag_names(form.tags.data))
+        added, removed = sync_post_tags(post, tags)
+        counters.post_saved(post, was_published, [tag.id for tag in tags], added, removed)
         
+        index_post(post)
         db.session.commit()
+        page_cache.invalidate('posts', f'post:{post.slug}')
         flash('文章更新成功！')
         return redirect(url_for('post.detail', slug=post.slug))
     
@@ -139,8 +165,11 @@ def delete(slug):
     if post.user_id != current_user.id and not current_user.is_admin:
         abort(403)
     
+    remove_post(post.id)
+    counters.post_deleted(post)
     db.session.delete(post)
     db.session.commit()
+    page_cache.invalidate('posts', f'post:{slug}')
     
     flash('文章已删除！')
     return redirect(url_for('main.index'))
@@ -152,14 +181,22 @@ def add_comment(slug):
     form = CommentForm()
     
     if form.validate_on_submit():
+        parent_id = None
+        if form.parent_id.data:
+            # 只能回复同一篇文章下的评论
+            parent = Comment.query.filter_by(id=form.parent_id.data, post_id=post.id).first_or_404()
+            parent_id = parent.id
+        
         comment = Comment(
             content=form.content.data,
             user_id=current_user.id,
             post_id=post.id,
-            parent_id=form.parent_id.data if form.parent_id.data else None
+            parent_id=parent_id
         )
         db.session.add(comment)
+        counters.comment_added(comment)
         db.session.commit()
+        page_cache.invalidate(f'post:{slug}')
         
         flash('评论发布成功！')
     
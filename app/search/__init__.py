@@ -0,0 +1,3 @@
+# 全文搜索：中英文分词、倒排索引和BM25排序
+from app.search.tokenizer import tokenize
+from app.search.index import index_post, remove_post, search, rebuild_index, SearchResults
@@ -0,0 +1,17 @@
+import time
+
+import click
+from flask.cli import AppGroup
+
+from app.search.index import rebuild_index
+
+search_cli = AppGroup('search', help='全文搜索索引管理')
+
+
+@search_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的文章数')
+def rebuild(batch_size):
+    """重建全部文章的搜索索引（重建期间搜索结果可能不完整）"""
+    started = time.perf_counter()
+    count = rebuild_index(batch_size=batch_size)
+    click.echo(f'已为 {count} 篇文章建立索引，用时 {time.perf_counter() - started:.1f} 秒')
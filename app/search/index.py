@@ -0,0 +1,169 @@
+import math
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import selectinload, undefer
+
+from app import db
+from app.models.post import Post
+from app.models.search import SearchPosting, SearchDocument
+from app.search.tokenizer import tokenize
+from app.utils.pagination import OffsetPage
+from app.utils.post_cards import card_query, to_cards
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+TITLE_BOOST = 3  # 标题中的词按出现3次计算
+
+# 候选集的上限：每个检索词只读取词频最高的这么多条倒排记录，查询最多取这么多个检索词，
+# 常用词（例如按单字索引的"的"）也不会把整张倒排表读进内存；排序和分页都在这个候选集内进行
+MAX_POSTINGS_PER_TERM = 1000
+MAX_QUERY_TERMS = 32
+
+# 全库统计（文档总数、平均长度）的进程内缓存时间（秒）
+STATS_TTL = 60
+_stats_cache = {'expires': 0, 'value': (0, 0.0)}
+
+
+class SearchResults(OffsetPage):
+    """搜索结果分页对象"""
+
+
+def document_terms(post):
+    """统计一篇文章的词频，标题和标签按TITLE_BOOST加权；汉字同时按单字和二元组建立索引"""
+    counts = Counter(tokenize(post.content, unigrams=True))
+    boosted = post.title + ' ' + ' '.join(tag.name for tag in post.tags)
+    for term in tokenize(boosted, unigrams=True):
+        counts[term] += TITLE_BOOST
+    return counts
+
+
+def index_post(post):
+    """
+    更新一篇文章的索引
+    在调用方的事务中执行，随文章的修改一起提交；未发布的文章会被移出索引
+    """
+    remove_post(post.id)
+    if not post.is_published:
+        return
+
+    counts = document_terms(post)
+    if counts:
+        db.session.execute(insert(SearchPosting),
+                           [{'term': term, 'post_id': post.id, 'tf': tf} for term, tf in counts.items()])
+    db.session.execute(insert(SearchDocument).values(post_id=post.id, length=sum(counts.values())))
+
+
+def add_documents(documents):
+    """
+    为一批还没有索引的文章批量写入倒排记录
+    documents是(post_id, document_terms的结果)的序列，整批只执行两条executemany
+    """
+    postings = []
+    rows = []
+    for post_id, counts in documents:
+        postings.extend({'term': term, 'post_id': post_id, 'tf': tf} for term, tf in counts.items())
+        rows.append({'post_id': post_id, 'length': sum(counts.values())})
+    if postings:
+        db.session.execute(insert(SearchPosting), postings)
+    if rows:
+        db.session.execute(insert(SearchDocument), rows)
+
+
+def remove_post(post_id):
+    """从索引中删除一篇文章，必须在删除文章本身之前调用"""
+    db.session.execute(delete(SearchPosting).where(SearchPosting.post_id == post_id))
+    db.session.execute(delete(SearchDocument).where(SearchDocument.post_id == post_id))
+
+
+def _collection_stats():
+    """返回(文档总数, 平均文档长度)，短时间缓存避免每次搜索都做聚合查询"""
+    now = time.monotonic()
+    if now >= _stats_cache['expires']:
+        total, avg_length = db.session.execute(
+            select(func.count(), func.avg(SearchDocument.length))).one()
+        _stats_cache['value'] = (total or 0, float(avg_length or 0))
+        _stats_cache['expires'] = now + STATS_TTL
+    return _stats_cache['value']
+
+
+def search(query, page=1, per_page=10):
+    """
+    按BM25相关度搜索已发布的文章
+    只读取查询词对应的倒排记录，不扫描文章正文；
+    每个检索词按(term, tf)索引只取词频最高的MAX_POSTINGS_PER_TERM条，在这个候选集内排序和分页
+    返回SearchResults分页对象
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    page = max(page, 1)
+    if not terms:
+        return SearchResults([], page, per_page, 0)
+
+    # 文档频率按完整的倒排记录统计（只读索引），IDF不受候选集上限影响
+    doc_freq = dict(db.session.execute(
+        select(SearchPosting.term, func.count())
+        .where(SearchPosting.term.in_(terms)).group_by(SearchPosting.term)
+    ).all())
+    if not doc_freq:
+        return SearchResults([], page, per_page, 0)
+
+    top = [select(SearchPosting.term, SearchPosting.post_id, SearchPosting.tf)
+           .where(SearchPosting.term == term)
+           .order_by(SearchPosting.tf.desc(), SearchPosting.post_id.desc())
+           .limit(MAX_POSTINGS_PER_TERM).subquery()
+           for term in doc_freq]
+    candidates = union_all(*(select(subquery) for subquery in top)).subquery()
+    rows = db.session.execute(
+        select(candidates.c.term, candidates.c.post_id, candidates.c.tf, SearchDocument.length)
+        .join(SearchDocument, SearchDocument.post_id == candidates.c.post_id)
+    ).all()
+
+    total_docs, avg_length = _collection_stats()
+    total_docs = max(total_docs, max(doc_freq.values()))
+    avg_length = avg_length or 1.0
+
+    scores = defaultdict(float)
+    for term, post_id, tf, length in rows:
+        df = doc_freq[term]
+        idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+        scores[post_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+    ranked = sorted(scores, key=lambda post_id: (-scores[post_id], -post_id))
+    page_ids = ranked[(page - 1) * per_page:page * per_page]
+
+    posts = {}
+    if page_ids:
+        posts = {post.id: post for post in to_cards(card_query(Post.id.in_(page_ids)))}
+    items = [posts[post_id] for post_id in page_ids if post_id in posts]
+    return SearchResults(items, page, per_page, len(ranked))
+
+
+def rebuild_index(batch_size=500):
+    """
+    重建整个索引
+    按ID分批读取已发布的文章，每批批量写入倒排记录，返回建立索引的文章数
+    """
+    db.session.execute(delete(SearchPosting))
+    db.session.execute(delete(SearchDocument))
+
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = (Post.query.options(selectinload(Post.tags), undefer(Post.content))
+                 .filter(Post.is_published == True, Post.id > last_id)
+                 .order_by(Post.id).limit(batch_size).all())
+        if not batch:
+            break
+
+        add_documents((post.id, document_terms(post)) for post in batch)
+        db.session.commit()
+
+        indexed += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()  # 释放已处理的文章对象，控制内存占用
+
+    db.session.commit()
+    _stats_cache['expires'] = 0
+    return indexed
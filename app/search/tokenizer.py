@@ -0,0 +1,40 @@
+import re
+
+# CJK统一汉字（含扩展A区和兼容区）
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+
+# 一段连续的汉字，或一段连续的字母数字（不含下划线和汉字）
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}_]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+MAX_TERM_LENGTH = 64  # 与search_postings.term字段长度一致
+
+
+def tokenize(text, unigrams=False):
+    """
+    把文本切分成检索词
+    英文等拉丁文字按单词切分并转小写；
+    中文没有空格分词，按相邻两个字切成二元组（bigram），
+    例如"博客内容"切成"博客"、"客内"、"内容"，单独一个汉字保留为一个词
+    unigrams：为文章建立索引时为True，连续的汉字还会额外切出每个单字，
+    只输入一个字的查询（例如"库"）也能命中"数据库优化"；
+    查询时为False，多个字的查询只按二元组匹配，不会被常用单字稀释
+    """
+    if not text:
+        return []
+
+    text = _TAG_RE.sub(' ', text).lower()  # 去掉HTML标签
+    terms = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        if _CJK_RE.match(token):
+            if len(token) == 1:
+                terms.append(token)
+            else:
+                terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+                if unigrams:
+                    terms.extend(token)
+        else:
+            terms.append(token[:MAX_TERM_LENGTH])
+    return terms
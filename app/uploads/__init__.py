@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint('uploads', __name__)
+
+from app.uploads import routes
@@ -0,0 +1,58 @@
+from flask import abort, current_app, jsonify, request, send_from_directory, url_for
+from flask_login import current_user, login_required
+from flask_wtf.csrf import validate_csrf
+from wtforms import ValidationError
+
+from app.uploads import bp
+from app import image_store
+from app.utils.images import InvalidImage
+
+# 文件名由内容哈希决定，内容不会变化，浏览器和CDN可以永久缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@bp.route('/images', methods=['POST'])
+@login_required
+def upload_image():
+    """
+    上传一张图片，返回JSON：{url, name, created}
+    请求体可以直接是图片数据（fetch/XHR，Content-Type: image/*），也可以是multipart表单中名为image的文件；
+    直接上传时请求体按块写入磁盘，不会整体读入内存（大小上限为MAX_CONTENT_LENGTH）
+    表单提交时在请求头X-CSRFToken中带上CSRF令牌
+    """
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            # 直接上传时不能访问request.form，否则请求体会被当作表单读取
+            token = request.headers.get('X-CSRFToken')
+            if token is None and request.mimetype == 'multipart/form-data':
+                token = request.form.get('csrf_token')
+            validate_csrf(token)
+        except ValidationError as e:
+            return jsonify(error=str(e)), 400
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        if upload is None:
+            return jsonify(error='缺少image文件'), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+
+    try:
+        name, created = image_store.save(stream)
+    except InvalidImage as e:
+        return jsonify(error=str(e)), 400
+
+    current_app.logger.info('用户 %s 上传图片 %s', current_user.id, name)
+    return jsonify(url=url_for('uploads.image', name=name), name=name, created=created), 201 if created else 200
+
+
+@bp.route('/images/<name>')
+def image(name):
+    """
+    上传的图片及其变体
+    生产环境应由Nginx直接提供UPLOAD_FOLDER下的文件，这里供开发环境和没有配置的部署使用
+    """
+    if name.startswith('.'):
+        abort(404)
+    return send_from_directory(image_store.folder, name, max_age=IMMUTABLE_MAX_AGE)
@@ -0,0 +1,97 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.post import Comment
+from app.utils.pagination import OffsetPage
+
+
+class CommentNode:
+    """评论树中的一个节点：评论本身、按时间排列的回复、嵌套深度"""
+
+    __slots__ = ('comment', 'replies', 'depth')
+
+    def __init__(self, comment, depth=0):
+        self.comment = comment
+        self.replies = []
+        self.depth = depth
+
+
+def _supports_recursive_cte():
+    """MySQL 8.0、MariaDB 10.2、SQLite 3.8.3起支持WITH RECURSIVE"""
+    dialect = db.session.get_bind().dialect
+    if dialect.name != 'mysql':
+        return True
+    version = dialect.server_version_info or (0,)
+    return version >= ((10, 2) if dialect.is_mariadb else (8, 0))
+
+
+def _approved(post_id):
+    return (Comment.post_id == post_id, Comment.is_approved == True)
+
+
+def _load_with_cte(post_id, top_ids):
+    """用一条递归CTE查询取出这些顶层评论及其全部已审核的回复，同时加载作者"""
+    anchor = select(Comment.id).where(Comment.id.in_(top_ids))
+    tree = anchor.cte('comment_tree', recursive=True)
+    # 回复与父评论一定属于同一篇文章，递归部分只按parent_id查找，以便使用parent_id上的索引
+    tree = tree.union_all(select(Comment.id).where(Comment.parent_id == tree.c.id, Comment.is_approved == True))
+    return (Comment.query.options(joinedload(Comment.author))
+            .join(tree, Comment.id == tree.c.id).all())
+
+
+def _load_by_level(post_id, top_ids):
+    """不支持递归CTE的数据库（MySQL 5.7）逐层查询，查询次数等于评论树的深度"""
+    comments = []
+    frontier = list(top_ids)
+    query = Comment.query.options(joinedload(Comment.author))
+    comments.extend(query.filter(Comment.id.in_(frontier)).all())
+    while frontier:
+        level = query.filter(Comment.parent_id.in_(frontier), Comment.is_approved == True).all()
+        comments.extend(level)
+        frontier = [comment.id for comment in level]
+    return comments
+
+
+def _build_tree(comments, top_ids):
+    """在内存中把评论组装成树，顶层按top_ids的顺序，回复按发表时间正序"""
+    children = {}
+    for comment in comments:
+        children.setdefault(comment.parent_id, []).append(comment)
+    for replies in children.values():
+        replies.sort(key=lambda comment: (comment.created_at, comment.id))
+
+    by_id = {comment.id: comment for comment in comments}
+    roots = [CommentNode(by_id[comment_id]) for comment_id in top_ids if comment_id in by_id]
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        for reply in children.get(node.comment.id, ()):
+            child = CommentNode(reply, node.depth + 1)
+            node.replies.append(child)
+            stack.append(child)
+    return roots
+
+
+def load_comment_threads(post_id, page=1, per_page=10):
+    """
+    加载一篇文章第page页的评论树
+    按顶层评论分页（最新的在前），每个顶层评论连同它的全部回复一起返回；
+    固定三次查询：顶层评论数、本页顶层评论ID、递归CTE取整棵子树并加载作者；
+    返回OffsetPage，items是本页的顶层CommentNode，total是顶层评论数
+    （全部评论数直接读取posts.comment_count）
+    """
+    total = db.session.scalar(
+        select(func.count()).where(*_approved(post_id), Comment.parent_id.is_(None)))
+
+    top_ids = db.session.scalars(
+        select(Comment.id).where(*_approved(post_id), Comment.parent_id.is_(None))
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+        .limit(per_page).offset((page - 1) * per_page)).all()
+
+    comments = []
+    if top_ids:
+        loader = _load_with_cte if _supports_recursive_cte() else _load_by_level
+        comments = loader(post_id, top_ids)
+
+    return OffsetPage(_build_tree(comments, top_ids), page, per_page, total)
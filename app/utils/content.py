@@ -0,0 +1,125 @@
+import html
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bleach
+import click
+import markdown
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, select, update
+
+from app.utils.helpers import truncate_text, get_reading_time
+
+EXCERPT_LENGTH = 200  # 与列表页原来截取的长度一致
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists']
+
+# Markdown允许输出的HTML标签和属性，其余标签会被去掉（内容保留为纯文本）
+ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS | {
+    'p', 'br', 'hr', 'pre', 'span', 'del', 'sup', 'sub', 'img',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'abbr': ['title'],
+    'acronym': ['title'],
+    'img': ['src', 'alt', 'title'],
+    'code': ['class'],  # fenced_code生成的 language-xxx
+    'th': ['align'],
+    'td': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+_local = threading.local()  # Markdown和Cleaner对象不是线程安全的，每个线程各用一个
+
+content_cli = AppGroup('content', help='文章内容渲染')
+
+
+def _renderers():
+    if not hasattr(_local, 'markdown'):
+        _local.markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        _local.cleaner = bleach.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                                        protocols=ALLOWED_PROTOCOLS, strip=True)
+        _local.stripper = bleach.Cleaner(tags=set(), strip=True)
+    return _local.markdown, _local.cleaner, _local.stripper
+
+
+def render_content(text):
+    """
+    把文章的Markdown原文处理成 (安全的HTML, 摘要, 阅读时间)
+    原文中直接写的HTML会经过同样的白名单过滤，旧文章中的HTML内容仍能正常显示
+    """
+    md, cleaner, stripper = _renderers()
+    content_html = cleaner.clean(md.reset().convert(text or ''))
+    plain = re.sub(r'\s+', ' ', html.unescape(stripper.clean(content_html))).strip()
+    return content_html, truncate_text(plain, EXCERPT_LENGTH), get_reading_time(plain)
+
+
+def apply_rendered_content(post):
+    """在创建和编辑文章时调用，写入content_html、excerpt和reading_time"""
+    post.content_html, post.excerpt, post.reading_time = render_content(post.content)
+
+
+def rerender_all(batch_size=200, workers=None):
+    """
+    用多进程重新渲染全部文章
+    主进程按ID分批读取原文，交给进程池渲染，只把结果有变化的文章写回（同时更新updated_at，
+    让条件请求拿到新内容），每批提交后使这些文章和文章列表的整页缓存在所有工作进程中失效；
+    返回 (处理的文章数, 更新的文章数)
+    """
+    from datetime import datetime
+    from app import db, page_cache
+    from app.models.post import Post
+
+    posts = Post.__table__
+    workers = workers or os.cpu_count() or 1
+    processed = changed = 0
+    last_id = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rows = db.session.execute(
+                select(posts.c.id, posts.c.slug, posts.c.content, posts.c.content_html, posts.c.excerpt,
+                       posts.c.reading_time)
+                .where(posts.c.id > last_id).order_by(posts.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+
+            chunksize = max(1, len(rows) // (workers * 4))
+            rendered = executor.map(render_content, [row.content for row in rows], chunksize=chunksize)
+            now = datetime.utcnow()
+            changed_rows = [(row, result) for row, result in zip(rows, rendered)
+                            if (row.content_html, row.excerpt, row.reading_time) != result]
+            updates = [{'post_id': row.id, 'content_html': result[0], 'excerpt': result[1],
+                        'reading_time': result[2], 'updated_at': now}
+                       for row, result in changed_rows]
+            if updates:
+                db.session.execute(
+                    update(posts).where(posts.c.id == bindparam('post_id'))
+                    .values(content_html=bindparam('content_html'), excerpt=bindparam('excerpt'),
+                            reading_time=bindparam('reading_time'), updated_at=bindparam('updated_at')),
+                    updates)
+            db.session.commit()
+            if updates:
+                page_cache.invalidate('posts', *(f'post:{row.slug}' for row, _ in changed_rows))
+
+            processed += len(rows)
+            changed += len(updates)
+            last_id = rows[-1].id
+    return processed, changed
+
+
+@content_cli.command('rerender')
+@click.option('--batch-size', default=200, show_default=True, help='每批读取的文章数')
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认为CPU核数')
+def rerender(batch_size, workers):
+    """重新渲染全部文章的HTML、摘要和阅读时间（升级数据库或修改渲染规则后执行）"""
+    started = time.perf_counter()
+    processed, changed = rerender_all(batch_size=batch_size, workers=workers)
+    elapsed = time.perf_counter() - started
+    click.echo(f'处理了 {processed} 篇文章，其中 {changed} 篇有变化，'
+               f'用时 {elapsed:.1f} 秒（{processed / elapsed if elapsed else 0:.0f} 篇/秒）')
@@ -0,0 +1,124 @@
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, func, select, update
+
+from app import db
+from app.models.post import Post, Comment, Tag, post_tags
+from app.models.user import User
+
+# 冗余计数列：
+#   posts.comment_count  已审核的评论数
+#   users.post_count     已发布的文章数
+#   users.comment_count  已审核的评论数
+#   tags.post_count      已发布的文章数
+# 写操作在同一个事务中用 col = col + n 增量更新，并发写入不会互相覆盖；
+# 计数出现偏差时用 flask counters reconcile 整体重算
+
+counters_cli = AppGroup('counters', help='冗余计数列维护')
+
+
+def _values(table, **values):
+    """带updated_at的表保持原值，计数变化不算内容修改（也不影响Last-Modified）"""
+    if 'updated_at' in table.c:
+        values['updated_at'] = table.c.updated_at
+    return values
+
+
+def _bump(model, column, ids, delta):
+    """把ids对应行的column加上delta"""
+    ids = list(ids)
+    if not ids or not delta:
+        return
+    table = model.__table__
+    db.session.execute(update(table).where(table.c.id.in_(ids))
+                       .values(_values(table, **{column: table.c[column] + delta})))
+
+
+def bump_many(model, column, deltas):
+    """
+    按 {id: 增量} 批量更新column，不论多少行都只执行一条executemany的UPDATE
+    用于一次操作涉及很多行、每行增量不同的场景（删除文章、批量导入）
+    """
+    rows = [{'row_id': row_id, 'delta': delta} for row_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = model.__table__
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('row_id'))
+        .values(_values(table, **{column: table.c[column] + bindparam('delta')})),
+        rows)
+
+
+def comment_added(comment):
+    """新评论已审核时，文章和评论者的评论数加一"""
+    if comment.is_approved is False:
+        return
+    _bump(Post, 'comment_count', [comment.post_id], 1)
+    _bump(User, 'comment_count', [comment.user_id], 1)
+
+
+def post_saved(post, was_published, tag_ids, added=(), removed=()):
+    """
+    创建或编辑文章后更新作者和标签的文章数
+    was_published：保存前是否已发布（新文章为False）
+    tag_ids：保存后的全部标签ID；added/removed：sync_post_tags返回的标签变化
+    """
+    if was_published and post.is_published:
+        _bump(Tag, 'post_count', added, 1)
+        _bump(Tag, 'post_count', removed, -1)
+    elif post.is_published:
+        _bump(User, 'post_count', [post.user_id], 1)
+        _bump(Tag, 'post_count', tag_ids, 1)
+    elif was_published:
+        _bump(User, 'post_count', [post.user_id], -1)
+        _bump(Tag, 'post_count', (set(tag_ids) - set(added)) | set(removed), -1)
+
+
+def post_deleted(post):
+    """删除文章前调用：扣除作者和标签的文章数，以及每位评论者在这篇文章下的评论数"""
+    if post.is_published:
+        _bump(User, 'post_count', [post.user_id], -1)
+        _bump(Tag, 'post_count', [tag.id for tag in post.tags], -1)
+
+    per_user = db.session.execute(
+        select(Comment.user_id, func.count()).where(Comment.post_id == post.id, Comment.is_approved == True)
+        .group_by(Comment.user_id)).all()
+    bump_many(User, 'comment_count', {user_id: -n for user_id, n in per_user})
+
+
+def reconcile():
+    """
+    用关联子查询整体重算全部计数列，只更新与实际值不符的行
+    返回 {列名: 修正的行数}
+    """
+    posts, users, comments, tags = Post.__table__, User.__table__, Comment.__table__, Tag.__table__
+    published = posts.c.is_published == True
+    approved = comments.c.is_approved == True
+
+    actual = {
+        (posts, 'comment_count'): select(func.count()).where(comments.c.post_id == posts.c.id, approved),
+        (users, 'post_count'): select(func.count()).where(posts.c.user_id == users.c.id, published),
+        (users, 'comment_count'): select(func.count()).where(comments.c.user_id == users.c.id, approved),
+        (tags, 'post_count'): (select(func.count()).select_from(post_tags.join(posts))
+                               .where(post_tags.c.tag_id == tags.c.id, published)),
+    }
+
+    fixed = {}
+    for (table, column), subquery in actual.items():
+        subquery = subquery.scalar_subquery()
+        result = db.session.execute(update(table).where(table.c[column] != subquery)
+                                    .values(_values(table, **{column: subquery})))
+        fixed[f'{table.name}.{column}'] = result.rowcount
+    db.session.commit()
+    return fixed
+
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """重算文章、用户和标签的冗余计数列"""
+    started = time.perf_counter()
+    for column, rows in reconcile().items():
+        click.echo(f'{column}: 修正了 {rows} 行')
+    click.echo(f'用时 {time.perf_counter() - started:.1f} 秒')
@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+WARN_INTERVAL = 10  # 同一个连接池两次告警日志之间至少间隔的秒数，避免高峰期刷屏
+
+# 每次取连接后调用的函数 listener(连接池名称, 等待秒数, 是否新建了溢出连接, 是否超时)，例如运行指标
+checkout_listeners = []
+
+
+class PoolStats:
+    """
+    一个连接池的累计统计（本进程）
+    wait是从请求连接到拿到连接的等待时间，连接池有空闲连接时接近0，耗尽时等于排队时间
+    """
+
+    def __init__(self, name, slow_checkout):
+        self.name = name
+        self.slow_checkout = slow_checkout  # 超过这个等待时间（秒）算慢，记录告警
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.overflow_checkouts = 0  # 池中连接不够、新建溢出连接的次数
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+        self._last_warned = 0
+        self._lock = threading.Lock()
+
+    def record(self, pool, wait, overflowed, timed_out=False):
+        in_use = pool.checkedout()
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.peak_in_use = max(self.peak_in_use, in_use)
+            if overflowed:
+                self.overflow_checkouts += 1
+            slow = not timed_out and wait >= self.slow_checkout
+            if slow:
+                self.slow_checkouts += 1
+            now = time.monotonic()
+            warn = (timed_out or slow) and now - self._last_warned >= WARN_INTERVAL
+            if warn:
+                self._last_warned = now
+
+        for listener in checkout_listeners:
+            listener(self.name, wait, overflowed, timed_out)
+
+        if warn:
+            level = logging.ERROR if timed_out else logging.WARNING
+            logger.log(level, '数据库连接池 %s %s：等待 %.0f ms，使用中 %d/%d（溢出 %d）',
+                       self.name, '获取连接超时' if timed_out else '获取连接较慢', wait * 1000,
+                       in_use, pool.size() + max(pool._max_overflow, 0), max(pool.overflow(), 0))
+
+    def snapshot(self, pool):
+        with self._lock:
+            return {
+                'pool_size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'in_use': pool.checkedout(),
+                'idle': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'peak_in_use': self.peak_in_use,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录每次取连接的等待时间、溢出和超时的QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats('default', 0.1)  # 引擎创建后由init_app换成带名称和告警阈值的统计
+
+    def _do_get(self):
+        overflow = self._overflow
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            self.stats.record(self, time.perf_counter() - started, False, timed_out=True)
+            raise
+        self.stats.record(self, time.perf_counter() - started, self._overflow > max(overflow, 0))
+        return connection
+
+    def recreate(self):
+        # engine.dispose()和fork后的重建会生成新的连接池对象，统计继续累计
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options(url, config):
+    """
+    按配置生成一个数据库连接的create_engine参数
+    SQLite（测试、本地开发）只换上带统计的连接池类，连接池大小等参数只对MySQL等服务端数据库生效
+    """
+    options = {'poolclass': InstrumentedQueuePool}
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return options
+    options.update({
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    })
+    if backend in ('mysql', 'mariadb'):
+        options['connect_args'] = {'connect_timeout': config['DB_CONNECT_TIMEOUT']}
+    return options
+
+
+def configure_engines(app):
+    """
+    在db.init_app之前调用：把连接池配置写入SQLALCHEMY_ENGINE_OPTIONS和SQLALCHEMY_BINDS
+    配置中已经显式给出的参数优先
+    """
+    config = app.config
+    primary = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for key, value in engine_options(config['SQLALCHEMY_DATABASE_URI'], config).items():
+        primary.setdefault(key, value)
+
+    binds = {}
+    for key, value in config.get('SQLALCHEMY_BINDS', {}).items():
+        bind = {'url': value} if isinstance(value, str) else dict(value)
+        for option, default in engine_options(bind['url'], config).items():
+            bind.setdefault(option, default)
+        binds[key] = bind
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_app(app, db):
+    """在db.init_app之后调用：为每个带统计的连接池设置名称和慢取连接的告警阈值"""
+    slow_checkout = app.config['DB_POOL_SLOW_CHECKOUT_MS'] / 1000
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if isinstance(engine.pool, InstrumentedQueuePool):
+                engine.pool.stats = PoolStats(key or 'primary', slow_checkout)
+
+
+def pool_status(db):
+    """当前进程中每个数据库连接池的状态和累计统计 {'primary': {...}, 'replica0': {...}}"""
+    status = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, InstrumentedQueuePool):
+            status[key or 'primary'] = pool.stats.snapshot(pool)
+        else:
+            status[key or 'primary'] = {'pool': type(pool).__name__}
+    return {'pid': os.getpid(), 'pools': status}
+
+
+def dispose_after_fork(app, db):
+    """
+    在fork出的工作进程中调用：丢弃从父进程继承的连接池
+    close=False表示不关闭父进程的连接（关闭会发送断开命令，影响父进程和其他子进程），
+    子进程第一次查询时按需建立自己的连接
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -8,10 +8,16 @@ def format_datetime(value, format='%Y-%m-%d %H:%M'):
     return value
 
 def truncate_text(text, length=100, suffix='...'):
-    """截断文本"""
+    """截断文本，截断处在英文单词中间时退回到前一个空格（中文没有空格，直接截断）"""
     if len(text) <= length:
         return text
-    return text[:length].rsplit(' ', 1)[0] + suffix
+    cut = text[:length]
+    if _is_word_char(cut[-1]) and _is_word_char(text[length]) and ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut + suffix
+
+def _is_word_char(char):
+    return char.isascii() and char.isalnum()
 
 def slugify(text):
     """将文本转换为URL友好的slug"""
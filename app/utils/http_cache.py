@@ -0,0 +1,74 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import g, request, session, make_response
+from flask_login import current_user
+
+
+def make_etag(*parts):
+    """由若干个值计算ETag"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def is_not_modified(etag, last_modified):
+    """
+    判断客户端缓存的版本是否仍然有效
+    按HTTP规范，请求带If-None-Match时只比较ETag，否则才比较If-Modified-Since
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return request.if_modified_since >= last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """给响应加上ETag、Last-Modified和要求每次重新验证的Cache-Control"""
+    # 页面里的浏览量等细节可能变化，所以使用弱ETag
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(validators, on_not_modified=None):
+    """
+    条件请求（ETag / Last-Modified / 304）视图装饰器
+    validators：接收视图参数的函数，用一条轻量查询返回
+                (last_modified, etag_parts) 或 (last_modified, etag_parts, meta)；
+                返回None表示资源不存在，交给视图自己处理（例如返回404）
+    on_not_modified：返回304时调用的函数，参数是validators返回的meta
+
+    校验在视图函数之前进行，验证通过时直接返回304，不会执行视图中的查询和模板渲染。
+    只对匿名访客生效：登录用户看到的页面带有用户名和CSRF令牌，不适合复用旧版本
+    计算出的ETag放在g.conditional_etag中，内层的缓存装饰器可以用它核对缓存的内容是否对应这个ETag
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or current_user.is_authenticated
+                    or '_flashes' in session):
+                return view(*args, **kwargs)
+
+            result = validators(*args, **kwargs)
+            if result is None:
+                return view(*args, **kwargs)
+            last_modified, etag_parts, *meta = result
+            etag = make_etag(request.full_path, *etag_parts)
+
+            if is_not_modified(etag, last_modified):
+                if on_not_modified is not None and meta:
+                    on_not_modified(meta[0])
+                return set_validators(make_response('', 304), etag, last_modified)
+
+            g.conditional_etag = etag
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup
+from PIL import Image, UnidentifiedImageError
+
+from app.utils import metrics
+from app.utils.workers import BoundedProcessPool
+
+logger = logging.getLogger(__name__)
+
+SKIPPED = metrics.counter('image_variant_jobs_skipped_total', '缩略图进程池已满而没有提交的任务数')
+
+CHUNK_SIZE = 64 * 1024
+# 允许上传的图片格式 -> 文件扩展名（按文件内容识别，不相信客户端给出的文件名和Content-Type）
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class InvalidImage(ValueError):
+    """上传的内容不是支持的图片格式，或者像素数超过上限"""
+
+
+def _write_atomic(path, save):
+    """先写到同目录的临时文件再改名，读取方不会看到写了一半的文件"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.variant-')
+    os.close(fd)
+    try:
+        save(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def make_variants(path, widths, quality):
+    """
+    在工作进程中执行：为原图生成各宽度的缩小版本（原格式）和WebP版本，最后写清单文件
+    清单 <hash>.json 记录原图尺寸和已生成的宽度，模板辅助函数只根据清单输出srcset，
+    所以清单最后写入，看到清单时所有变体都已经就绪
+    """
+    stem, ext = os.path.splitext(path)
+    with Image.open(path) as image:
+        image.load()
+        width, height = image.size
+        fmt = image.format
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        resized = []
+        for target in sorted({w for w in widths if w < width} | {width}):
+            variant = image if target == width else image.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS)
+            if fmt != 'WEBP' or target < width:
+                _write_atomic(f'{stem}-{target}.webp', lambda tmp: variant.save(tmp, 'WEBP', quality=quality, method=4))
+            if target < width and fmt != 'WEBP':
+                _write_atomic(f'{stem}-{target}{ext}', lambda tmp: variant.save(
+                    tmp, fmt, **({'quality': quality, 'optimize': True} if fmt == 'JPEG' else {})))
+            resized.append(target)
+    manifest = {'width': width, 'height': height, 'widths': resized}
+    _write_atomic(f'{stem}.json', lambda tmp: _dump(tmp, manifest))
+    return manifest
+
+
+def _dump(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+class ImageStore:
+    """
+    上传图片的存储和后台缩略图生成
+
+    上传内容按块写入UPLOAD_FOLDER/images下的临时文件，同时计算SHA-256，
+    写完后按内容哈希改名为 <hash>.<ext>：同一张图片无论上传多少次都只保存一份，
+    文件名随内容变化，可以设置永久缓存。
+    缩小版本和WebP版本由独立的进程池生成（IMAGE_WORKERS，spawn启动、低优先级），
+    不占用请求线程；排队的任务超过IMAGE_MAX_PENDING时不再提交，
+    模板在变体就绪前使用原图，之后可以用 flask images rebuild 补齐
+
+    IMAGE_WORKERS为0时在当前线程中生成（命令行脚本、测试等场景）
+    """
+
+    def __init__(self, app=None):
+        self.folder = None
+        self.widths = (480, 800, 1200)
+        self.quality = 80
+        self.max_pixels = 40_000_000
+        self.pool = BoundedProcessPool(workers=0, max_pending=32, nice=10)
+        self._manifests = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = os.path.join(app.config['UPLOAD_FOLDER'], 'images')
+        self.widths = tuple(app.config['IMAGE_WIDTHS'])
+        self.quality = app.config['IMAGE_QUALITY']
+        self.max_pixels = app.config['IMAGE_MAX_PIXELS']
+        self.pool.configure(app.config['IMAGE_WORKERS'], app.config['IMAGE_MAX_PENDING'],
+                            app.config['IMAGE_WORKER_NICE'])
+        app.add_template_global(responsive_image)
+        app.extensions['image_store'] = self
+
+    def save(self, stream):
+        """
+        把上传的数据流保存为 <hash>.<ext>，返回 (文件名, 是否为新文件)
+        按CHUNK_SIZE分块读取，内存中不会保留整个文件；不是支持的图片格式时抛出InvalidImage
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.folder, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+            # 只读取文件头，确认格式和尺寸；完整解码在工作进程中进行
+            try:
+                with Image.open(tmp) as image:
+                    fmt, (width, height) = image.format, image.size
+            except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+                raise InvalidImage('无法识别的图片文件') from e
+            if fmt not in FORMATS:
+                raise InvalidImage(f'不支持的图片格式：{fmt}')
+            if width * height > self.max_pixels:
+                raise InvalidImage(f'图片尺寸过大：{width}x{height}')
+
+            name = f'{digest.hexdigest()[:32]}.{FORMATS[fmt]}'
+            path = os.path.join(self.folder, name)
+            created = not os.path.exists(path)
+            if created:
+                os.chmod(tmp, 0o644)
+                os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+        if created or self.manifest(name) is None:
+            self.submit(name)
+        return name, created
+
+    def submit(self, name):
+        """提交生成变体的任务，不等待结果；返回是否已提交（或已在当前线程完成）"""
+        path = os.path.join(self.folder, name)
+        if not self.pool.workers:
+            make_variants(path, self.widths, self.quality)
+            return True
+
+        future = self.pool.try_submit(make_variants, path, self.widths, self.quality)
+        if future is None:
+            logger.warning('缩略图进程池已满（%d 个任务），%s 暂时使用原图', self.pool.max_pending, name)
+            SKIPPED.inc()
+            return False
+
+        def done(future):
+            if future.exception() is not None:
+                logger.error('生成 %s 的缩略图失败：%r', name, future.exception())
+        future.add_done_callback(done)
+        return True
+
+    def manifest(self, name):
+        """
+        读取变体清单，还没有生成时返回None
+        文件名由内容决定，清单写入后不会再变，所以只缓存已经存在的清单
+        """
+        manifest = self._manifests.get(name)
+        if manifest is None:
+            try:
+                with open(os.path.join(self.folder, os.path.splitext(name)[0] + '.json')) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if len(self._manifests) >= 10000:
+                self._manifests.clear()
+            self._manifests[name] = manifest
+        return manifest
+
+    def originals(self):
+        """上传目录中的全部原图文件名"""
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name for name in os.listdir(self.folder)
+                      if not name.startswith('.') and '-' not in name
+                      and os.path.splitext(name)[1][1:] in FORMATS.values())
+
+    def shutdown(self, wait=False):
+        self.pool.shutdown(wait=wait)
+
+
+def uploaded_name(url):
+    """featured_image等字段中保存的上传图片地址对应的文件名，不是本站上传的图片时返回None"""
+    prefix = url_for('uploads.image', name='')
+    if url and url.startswith(prefix) and '/' not in url[len(prefix):]:
+        return url[len(prefix):]
+    return None
+
+
+# 页面主栏（col-lg-8）在各断点下的显示宽度
+MAIN_COLUMN_SIZES = '(min-width: 1400px) 856px, (min-width: 1200px) 736px, (min-width: 992px) 616px, 100vw'
+
+
+def responsive_image(url, alt='', width=800, sizes=MAIN_COLUMN_SIZES, class_=None):
+    """
+    模板辅助函数：输出图片标签
+    本站上传且变体已就绪的图片输出<picture>：WebP和原格式各一组srcset，
+    浏览器按sizes和屏幕密度选择合适的宽度；src默认使用不小于width的最小版本。
+    外部图片和变体还没生成的图片直接输出原地址
+    """
+    store = current_app.extensions['image_store']
+    name = uploaded_name(url)
+    manifest = store.manifest(name) if name else None
+    attrs = Markup(' alt="{}"').format(alt)
+    if class_:
+        attrs += Markup(' class="{}"').format(class_)
+    if manifest is None:
+        return Markup('<img src="{}"{} loading="lazy">').format(url, attrs)
+
+    stem, ext = os.path.splitext(name)
+    full = manifest['width']
+
+    def variant(target, suffix):
+        if target == full and suffix == ext:
+            return url_for('uploads.image', name=name)
+        return url_for('uploads.image', name=f'{stem}-{target}{suffix}')
+
+    def srcset(suffix):
+        return ', '.join(f'{variant(target, suffix)} {target}w' for target in manifest['widths'])
+
+    default = min((target for target in manifest['widths'] if target >= width), default=full)
+    height = round(manifest['height'] * default / full)
+    return Markup(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{} loading="lazy"></picture>'
+    ).format(srcset('.webp'), sizes, variant(default, ext), srcset(ext), sizes, default, height, attrs)
+
+
+images_cli = AppGroup('images', help='上传图片的缩略图管理')
+
+
+@images_cli.command('rebuild')
+@click.option('--all', 'rebuild_all', is_flag=True, help='重新生成全部图片的变体（修改了IMAGE_WIDTHS或IMAGE_QUALITY之后）')
+def rebuild(rebuild_all):
+    """为还没有变体的上传图片生成缩小版本和WebP版本"""
+    store = current_app.extensions['image_store']
+    names = [name for name in store.originals() if rebuild_all or store.manifest(name) is None]
+    workers = store.pool.workers or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(make_variants, os.path.join(store.folder, name), store.widths, store.quality): name
+                   for name in names}
+        failed = 0
+        for future in futures:
+            if future.exception() is not None:
+                failed += 1
+                click.echo(f'{futures[future]}: {future.exception()!r}', err=True)
+    click.echo(f'处理了 {len(names)} 张图片，失败 {failed} 张')
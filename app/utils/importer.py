@@ -0,0 +1,502 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from app import db
+from app.models.post import Post, Comment, Tag, post_tags
+from app.models.user import User
+from app.search.index import add_documents, document_terms
+from app.utils.content import render_content
+from app.utils.counters import bump_many
+from app.utils.helpers import slugify
+from app.utils.slugs import allocate_slug
+from app.utils.tags import parse_tag_names, resolve_tags
+
+# 导入记录的格式（JSONL每行一篇文章；Markdown目录每个.md文件一篇文章，字段写在YAML front matter中）：
+#   title        标题（必填）
+#   content      Markdown正文（必填；Markdown文件中为front matter之后的全部内容）
+#   slug         文章标识，不填时由标题生成
+#   author       作者用户名，不存在的用户会被创建（没有密码，不能登录）
+#   tags         标签列表，或逗号分隔的字符串
+#   summary, featured_image, view_count
+#   created_at, updated_at, published_at（或date）  ISO 8601时间，带时区的转换为UTC
+#   is_published（或published、draft）  默认为已发布
+#   comments     评论列表（仅JSONL）：{id, parent_id, author, content, created_at, is_approved}，
+#                id和parent_id是原平台的评论ID，只用来在同一篇文章内还原回复关系，
+#                被回复的评论要排在回复之前（按时间顺序导出即可），否则回复按顶层评论导入
+
+IN_CHUNK = 500           # IN查询每次最多带的参数个数
+REPORT_INTERVAL = 5      # 导入过程中每隔多少秒输出一次进度
+IMPORTED_EMAIL_DOMAIN = 'imported.invalid'  # 导入时创建的用户的占位邮箱域名
+
+import_cli = AppGroup('import', help='从其他平台批量导入数据')
+
+_FRONT_MATTER_RE = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)', re.S)
+
+
+def _scalar(value):
+    """front matter中的单个值：去掉两侧引号，true/false转换为布尔值"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value.lower() in ('true', 'yes'):
+        return True
+    if value.lower() in ('false', 'no'):
+        return False
+    return value
+
+
+def parse_markdown(text):
+    """
+    把带front matter的Markdown文件拆成导入记录
+    不依赖YAML库，只支持导入需要的子集：key: value、[a, b]形式的列表和逐行"- item"形式的列表
+    """
+    record = {}
+    match = _FRONT_MATTER_RE.match(text)
+    if match:
+        key = None
+        for line in match.group(1).splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('- ') and key is not None:
+                if not isinstance(record.get(key), list):
+                    record[key] = []
+                record[key].append(_scalar(line[2:]))
+                continue
+            key, _, value = line.partition(':')
+            key, value = key.strip(), value.strip()
+            if value.startswith('[') and value.endswith(']'):
+                record[key] = [_scalar(item) for item in value[1:-1].split(',') if item.strip()]
+            else:
+                record[key] = _scalar(value) if value else None
+        text = text[match.end():]
+    record['content'] = text.strip('\n')
+    return record
+
+
+def read_jsonl(path, position=0):
+    """
+    从字节偏移position开始逐行读取JSONL文件，不把整个文件读入内存
+    产生 (记录, 下一行的字节偏移)，偏移写入检查点，续传时从这里继续
+    """
+    with open(path, 'rb') as f:
+        f.seek(position)
+        for line in f:
+            start = position
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise click.ClickException(f'{path} 字节偏移 {start} 处的行不是合法的JSON：{e}')
+            yield record, position
+
+
+def read_markdown(directory, position=0):
+    """按文件名顺序读取目录中的.md文件，从第position个文件开始，产生 (记录, 下一个文件的序号)"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.md'))
+    for index in range(position, len(names)):
+        with open(os.path.join(directory, names[index]), encoding='utf-8') as f:
+            yield parse_markdown(f.read()), index + 1
+
+
+def _datetime(value):
+    """ISO 8601字符串（或Unix时间戳）转换为数据库中使用的UTC naive时间"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _published(record):
+    if 'is_published' in record:
+        return bool(record['is_published'])
+    if 'published' in record:
+        return bool(record['published'])
+    return not record.get('draft', False)
+
+
+def _tag_names(value):
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(name) for name in value)
+    return parse_tag_names(value)
+
+
+def _chunks(items, size=IN_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _prepare(item):
+    """在渲染进程中执行：渲染正文，需要建立索引的文章同时统计词频（两者都是纯CPU计算）"""
+    title, content, tag_names, index = item
+    content_html, excerpt, reading_time = render_content(content)
+    counts = None
+    if index:
+        counts = document_terms(SimpleNamespace(title=title, content=content,
+                                                tags=[SimpleNamespace(name=name) for name in tag_names]))
+    return content_html, excerpt, reading_time, counts
+
+
+class Importer:
+    """
+    按批导入文章、标签和评论
+    每批的用户、标签和slug各用几条IN查询解析，文章、文章标签、评论和冗余计数都用executemany批量写入，
+    SQL语句数只和批次数有关，与批内的文章数和评论数无关（有回复的评论在不支持RETURNING的数据库上例外）；
+    事务由调用方在每批之后提交
+    """
+
+    def __init__(self, default_author=None, rename_duplicates=False, search_index=True, executor=None):
+        self.default_author = default_author
+        self.rename_duplicates = rename_duplicates
+        self.search_index = search_index
+        self.executor = executor
+        self.user_ids = {}  # casefold后的用户名 -> ID，跨批次缓存
+        self.tag_ids = {}   # casefold后的标签名 -> ID
+        self.stats = Counter()
+
+    def _post(self, record, now):
+        title = str(record.get('title') or '').strip()[:Post.title.type.length]
+        content = record.get('content')
+        if not title or content is None:
+            raise ValueError('缺少title或content')
+        author = record.get('author') or self.default_author
+        if not author:
+            raise ValueError('缺少author，可以用--default-author指定默认作者')
+
+        is_published = _published(record)
+        created_at = _datetime(record.get('created_at') or record.get('date'))
+        published_at = _datetime(record.get('published_at')) or created_at
+        created_at = created_at or published_at or now
+        comments = [self._comment(comment, created_at) for comment in record.get('comments') or ()]
+        return {
+            'title': title,
+            'content': str(content),
+            'base_slug': str(record.get('slug') or slugify(title))[:Post.slug.type.length],
+            'summary': (record.get('summary') or None) and str(record['summary'])[:Post.summary.type.length],
+            'featured_image': record.get('featured_image') or None,
+            'view_count': int(record.get('view_count') or 0),
+            'is_published': is_published,
+            'created_at': created_at,
+            'updated_at': _datetime(record.get('updated_at')) or created_at,
+            'published_at': (published_at or created_at) if is_published else None,
+            'author': str(author),
+            'tag_names': _tag_names(record.get('tags')),
+            'comments': comments,
+        }
+
+    def _comment(self, record, default_time):
+        author = record.get('author') or self.default_author
+        if not author or record.get('content') is None:
+            raise ValueError('评论缺少author或content')
+        return {
+            'source_id': record.get('id'),
+            'source_parent_id': record.get('parent_id'),
+            'author': str(author),
+            'content': str(record['content']),
+            'is_approved': bool(record.get('is_approved', True)),
+            'created_at': _datetime(record.get('created_at')) or default_time,
+        }
+
+    def _resolve_users(self, names):
+        """用户名解析为ID，不存在的用户批量创建"""
+        max_length = User.username.type.length
+        missing = {}
+        for name in names:
+            name = name[:max_length]
+            if name.casefold() not in self.user_ids:
+                missing.setdefault(name.casefold(), name)
+        if not missing:
+            return
+
+        def load(names):
+            for chunk in _chunks(names):
+                for user_id, username in db.session.execute(
+                        select(User.id, User.username).where(User.username.in_(chunk))):
+                    self.user_ids[username.casefold()] = user_id
+
+        load(missing.values())
+        # MySQL的用户名比较不区分大小写，'Bob'可能查到'bob'，所以同样按casefold判断是否已存在
+        created = [name for key, name in missing.items() if key not in self.user_ids]
+        if created:
+            # 邮箱由用户名的哈希生成，保证唯一，重复导入时也相同
+            db.session.execute(insert(User.__table__), [
+                {'username': name, 'password_hash': None, 'is_admin': False, 'post_count': 0, 'comment_count': 0,
+                 'email': f'{hashlib.sha1(name.casefold().encode()).hexdigest()}@{IMPORTED_EMAIL_DOMAIN}'}
+                for name in created])
+            load(created)
+            self.stats['users'] += len(created)
+
+    def _resolve_tags(self, names):
+        missing = {}
+        for name in names:
+            if name.casefold() not in self.tag_ids:
+                missing.setdefault(name.casefold(), name)
+        if missing:
+            names = list(missing.values())
+            for name, tag in zip(names, resolve_tags(names)):
+                self.tag_ids[name.casefold()] = tag.id
+
+    def _assign_slugs(self, posts):
+        """
+        一条IN查询找出已被使用的slug
+        slug已存在（包括批内重复）的文章默认跳过，这样中断后重新导入同一批记录不会产生重复文章；
+        rename_duplicates时改为分配一个带编号的新slug
+        """
+        taken = set()
+        for chunk in _chunks({post['base_slug'] for post in posts if post['base_slug']}):
+            taken.update(db.session.scalars(select(Post.slug).where(Post.slug.in_(chunk))))
+
+        kept = []
+        for post in posts:
+            slug = post['base_slug']
+            if not slug or slug in taken:
+                if slug and not self.rename_duplicates:
+                    self.stats['skipped'] += 1
+                    continue
+                slug = allocate_slug(Post.slug, slug, exclude=taken)
+            taken.add(slug)
+            post['slug'] = slug
+            kept.append(post)
+        return kept
+
+    def _insert_comments(self, posts):
+        """
+        按回复层级逐层插入评论：先插入顶层评论，拿到ID后再插入回复它们的评论，依此类推
+        没有回复的评论直接executemany；有回复的评论需要自己的ID，
+        数据库支持executemany的RETURNING时一起批量插入并按参数顺序取回ID，否则（MySQL）逐条插入
+        """
+        table = Comment.__table__
+        returning = db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order
+        level = []
+        for post in posts:
+            seen = {}
+            for comment in post['comments']:
+                comment['post_id'] = post['id']
+                comment['children'] = []
+                parent = seen.get(comment['source_parent_id'])
+                if parent is not None:
+                    parent['children'].append(comment)
+                else:
+                    level.append(comment)  # 顶层评论，以及父评论不在它前面（或不在导入数据中）的回复
+                if comment['source_id'] is not None:
+                    seen[comment['source_id']] = comment
+
+        parent_ids = {}
+        while level:
+            rows = [{'content': comment['content'], 'is_approved': comment['is_approved'],
+                     'created_at': comment['created_at'], 'user_id': comment['user_id'],
+                     'post_id': comment['post_id'], 'parent_id': parent_ids.get(id(comment))}
+                    for comment in level]
+            parents = [index for index, comment in enumerate(level) if comment['children']]
+            leaves = [rows[index] for index, comment in enumerate(level) if not comment['children']]
+            if leaves:
+                db.session.execute(insert(table), leaves)
+            if parents and returning:
+                ids = db.session.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                                         [rows[index] for index in parents]).all()
+            else:
+                ids = [db.session.execute(insert(table), rows[index]).inserted_primary_key[0] for index in parents]
+
+            next_level = []
+            for index, comment_id in zip(parents, ids):
+                for child in level[index]['children']:
+                    parent_ids[id(child)] = comment_id
+                    next_level.append(child)
+            self.stats['comments'] += len(rows)
+            level = next_level
+
+    def import_batch(self, records, now=None):
+        """导入一批记录，records为(记录序号, 记录)的列表；返回实际导入的文章数"""
+        now = now or datetime.utcnow()
+        posts = []
+        for number, record in records:
+            try:
+                posts.append(self._post(record, now))
+            except (ValueError, TypeError, AttributeError) as e:
+                raise click.ClickException(f'第 {number} 条记录无法导入：{e}')
+
+        self._resolve_users({post['author'] for post in posts}
+                            | {comment['author'] for post in posts for comment in post['comments']})
+        self._resolve_tags({name for post in posts for name in post['tag_names']})
+        posts = self._assign_slugs(posts)
+        if not posts:
+            return 0
+
+        items = [(post['title'], post['content'], post['tag_names'], self.search_index and post['is_published'])
+                 for post in posts]
+        if self.executor is not None:
+            workers = self.executor._max_workers
+            prepared = self.executor.map(_prepare, items, chunksize=max(1, len(items) // (workers * 4)))
+        else:
+            prepared = map(_prepare, items)
+
+        max_user = User.username.type.length
+        rows = []
+        for post, (content_html, excerpt, reading_time, counts) in zip(posts, prepared):
+            post['user_id'] = self.user_ids[post['author'][:max_user].casefold()]
+            post['terms'] = counts
+            for comment in post['comments']:
+                comment['user_id'] = self.user_ids[comment['author'][:max_user].casefold()]
+            rows.append({
+                'title': post['title'], 'slug': post['slug'], 'content': post['content'],
+                'content_html': content_html, 'excerpt': excerpt, 'reading_time': reading_time,
+                'summary': post['summary'], 'featured_image': post['featured_image'],
+                'is_published': post['is_published'], 'view_count': post['view_count'],
+                'comment_count': sum(comment['is_approved'] for comment in post['comments']),
+                'user_id': post['user_id'], 'created_at': post['created_at'],
+                'updated_at': post['updated_at'], 'published_at': post['published_at'],
+            })
+        db.session.execute(insert(Post.__table__), rows)
+
+        ids = {}
+        for chunk in _chunks(post['slug'] for post in posts):
+            ids.update(db.session.execute(select(Post.slug, Post.id).where(Post.slug.in_(chunk))).all())
+        for post in posts:
+            post['id'] = ids[post['slug']]
+
+        links = [{'post_id': post['id'], 'tag_id': tag_id} for post in posts
+                 for tag_id in dict.fromkeys(self.tag_ids[name.casefold()] for name in post['tag_names'])]
+        if links:
+            db.session.execute(insert(post_tags), links)
+        self._insert_comments(posts)
+
+        # 冗余计数：posts.comment_count已在插入时写好，其余按行汇总后各用一条executemany更新
+        user_posts, user_comments, tag_posts = Counter(), Counter(), Counter()
+        for post in posts:
+            if post['is_published']:
+                user_posts[post['user_id']] += 1
+                tag_posts.update({self.tag_ids[name.casefold()] for name in post['tag_names']})
+            user_comments.update(comment['user_id'] for comment in post['comments'] if comment['is_approved'])
+        bump_many(User, 'post_count', user_posts)
+        bump_many(User, 'comment_count', user_comments)
+        bump_many(Tag, 'post_count', tag_posts)
+
+        if self.search_index:
+            add_documents((post['id'], post['terms']) for post in posts if post['terms'] is not None)
+
+        self.stats['posts'] += len(posts)
+        self.stats['post_tags'] += len(links)
+        return len(posts)
+
+
+def _load_checkpoint(path, source, fmt):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('source') != source or checkpoint.get('format') != fmt:
+        raise click.ClickException(f'检查点 {path} 属于另一次导入（{checkpoint.get("source")}），'
+                                   f'请指定其他--checkpoint或加上--restart')
+    return checkpoint
+
+
+def _save_checkpoint(path, checkpoint):
+    """先写临时文件再原子替换，导入进程在任何时刻被杀掉都不会留下写了一半的检查点"""
+    temp = f'{path}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+@import_cli.command('posts')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'jsonl', 'markdown']), default='auto',
+              show_default=True, help='auto：目录按Markdown读取，文件按JSONL读取')
+@click.option('--batch-size', default=500, show_default=True, help='每批导入的文章数，每批提交一次')
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认为CPU核数；0表示在主进程中渲染')
+@click.option('--default-author', help='没有author字段的文章和评论使用的用户名')
+@click.option('--rename-duplicates', is_flag=True, help='slug已存在时分配带编号的新slug，默认跳过这篇文章')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False),
+              help='检查点文件，默认为 SOURCE.checkpoint.json')
+@click.option('--restart', is_flag=True, help='忽略已有的检查点，从头开始导入')
+@click.option('--no-search-index', is_flag=True, help='不更新搜索索引（之后执行flask search rebuild）')
+def import_posts(source, fmt, batch_size, workers, default_author, rename_duplicates, checkpoint_path,
+                 restart, no_search_index):
+    """
+    从JSONL文件或Markdown目录批量导入文章、标签和评论
+
+    流式读取，每批提交后把读取位置写入检查点；中断后用同样的参数重新执行会从检查点继续，
+    全部完成后删除检查点。记录格式见app/utils/importer.py
+    """
+    from app import page_cache
+
+    source = os.path.abspath(source)
+    if fmt == 'auto':
+        fmt = 'markdown' if os.path.isdir(source) else 'jsonl'
+    checkpoint_path = checkpoint_path or f'{source.rstrip(os.sep)}.checkpoint.json'
+    checkpoint = None if restart else _load_checkpoint(checkpoint_path, source, fmt)
+    if checkpoint:
+        click.echo(f'从检查点继续：已处理 {checkpoint["records"]} 条记录')
+    else:
+        checkpoint = {'source': source, 'format': fmt, 'position': 0, 'records': 0, 'stats': {}}
+
+    reader = read_markdown if fmt == 'markdown' else read_jsonl
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    importer = Importer(default_author=default_author, rename_duplicates=rename_duplicates,
+                        search_index=not no_search_index, executor=executor)
+
+    previous = Counter(checkpoint['stats'])  # 之前几次中断的导入的累计值
+    started = last_report = time.perf_counter()
+
+    def report(prefix):
+        # 速度只按本次执行写入的行数计算
+        stats = importer.stats
+        written = sum(stats[key] for key in ('posts', 'post_tags', 'comments', 'users'))
+        elapsed = time.perf_counter() - started
+        click.echo(f'{prefix}{checkpoint["records"]} 条记录，导入 {stats["posts"]} 篇文章、{stats["comments"]} 条评论、'
+                   f'{stats["post_tags"]} 个文章标签，新建 {stats["users"]} 个用户，跳过 {stats["skipped"]} 篇slug重复的文章；'
+                   f'共写入 {written} 行，用时 {elapsed:.1f} 秒（{written / elapsed if elapsed else 0:.0f} 行/秒）')
+
+    def flush(batch, position):
+        importer.import_batch(batch)
+        db.session.commit()
+        db.session.expunge_all()  # 释放解析标签时加载的对象，内存占用不随导入量增长
+        # 提交之后才推进检查点：两步之间中断时这一批会被重新读取，已导入的文章因slug重复被跳过
+        checkpoint.update(position=position, records=checkpoint['records'] + len(batch),
+                          stats=dict(previous + importer.stats))
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+    try:
+        batch = []
+        for record, position in reader(source, checkpoint['position']):
+            batch.append((checkpoint['records'] + len(batch) + 1, record))
+            if len(batch) >= batch_size:
+                flush(batch, position)
+                batch = []
+                if time.perf_counter() - last_report >= REPORT_INTERVAL:
+                    report('已处理 ')
+                    last_report = time.perf_counter()
+        if batch:
+            flush(batch, position)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if importer.stats['posts']:
+        # 导入只新增文章，它们的详情页不会在缓存中；列表页、标签云和订阅源带'posts'标签，
+        # 通过共享的版本号在所有工作进程中失效
+        page_cache.invalidate('posts')
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    report('导入完成：共处理 ')
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from app.utils import query_stats
+
+# 多进程模式：环境变量PROMETHEUS_MULTIPROC_DIR必须在导入prometheus_client之前设置（gunicorn.conf.py中设置），
+# 每个工作进程把指标写入该目录下按PID命名的mmap文件，抓取时汇总所有进程的文件
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# 网页请求和SQL语句的耗时分布（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _register(cls, name, documentation, labelnames=(), **kwargs):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or tuple(metric._labelnames) != tuple(labelnames):
+            raise ValueError(f'指标 {name} 已经以不同的类型或标签注册过')
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """
+    注册（或取得已注册的）计数器，供其他模块记录自己的指标：
+
+        rejected = metrics.counter('password_hash_rejected_total', '哈希进程池已满而拒绝的请求数')
+        rejected.inc()
+
+    同名指标只创建一次，重复调用（例如测试中多次create_app）返回同一个对象
+    """
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS):
+    """注册（或取得已注册的）直方图"""
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def gauge(name, documentation, labelnames=(), multiprocess_mode='livesum'):
+    """
+    注册（或取得已注册的）仪表
+    multiprocess_mode决定多进程时怎样汇总各进程的值：livesum（存活进程求和，默认）、
+    liveall（每个存活进程单独输出，带pid标签）、max、min等，见prometheus_client文档
+    """
+    return _register(Gauge, name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+
+REQUEST_LATENCY = histogram('http_request_duration_seconds', '请求处理耗时', ('blueprint', 'endpoint', 'method'),
+                            buckets=REQUEST_BUCKETS)
+REQUESTS = counter('http_requests_total', '请求数', ('blueprint', 'endpoint', 'method', 'status'))
+IN_FLIGHT = gauge('http_requests_in_flight', '正在处理的请求数')
+STATEMENT_LATENCY = histogram('db_statement_duration_seconds', 'SQL语句耗时（按发起语句的路由）', ('endpoint',),
+                              buckets=STATEMENT_BUCKETS)
+PAGE_CACHE = counter('page_cache_requests_total', '整页缓存的命中和未命中次数', ('endpoint', 'result'))
+POOL_CONNECTIONS = gauge('db_pool_connections', '数据库连接池中的连接数（各进程最近一次请求开始时的值）',
+                         ('pool', 'state'))
+POOL_CHECKOUTS = counter('db_pool_checkouts_total', '从连接池取连接的次数', ('pool',))
+POOL_WAIT = histogram('db_pool_checkout_wait_seconds', '从连接池取连接的等待时间', ('pool',),
+                      buckets=STATEMENT_BUCKETS)
+POOL_TIMEOUTS = counter('db_pool_timeouts_total', '等待连接池超时的次数', ('pool',))
+POOL_OVERFLOWS = counter('db_pool_overflow_checkouts_total', '新建溢出连接的次数', ('pool',))
+
+
+def _route_labels():
+    endpoint = request.endpoint or 'unmatched'
+    return request.blueprint or '', endpoint
+
+
+class _StatementCollector:
+    """挂在query_stats上的收集器：把本次请求执行的每条SQL的耗时计入直方图"""
+
+    def __init__(self, endpoint):
+        self.histogram = STATEMENT_LATENCY.labels(endpoint)
+
+    def add(self, statement, parameters, duration):
+        self.histogram.observe(duration)
+
+
+def record_checkout(name, wait, overflowed, timed_out):
+    """db_pool.PoolStats每次取连接后调用"""
+    if timed_out:
+        POOL_TIMEOUTS.labels(name).inc()
+        return
+    POOL_CHECKOUTS.labels(name).inc()
+    POOL_WAIT.labels(name).observe(wait)
+    if overflowed:
+        POOL_OVERFLOWS.labels(name).inc()
+
+
+def collect_pool_gauges(db):
+    """把本进程各连接池当前的使用中/空闲/溢出连接数写入仪表"""
+    from app.utils.db_pool import pool_status
+
+    for name, status in pool_status(db)['pools'].items():
+        for state in ('in_use', 'idle', 'overflow'):
+            if state in status:
+                POOL_CONNECTIONS.labels(name, state).set(status[state])
+
+
+def render_latest():
+    """Prometheus文本格式的全部指标；多进程模式下汇总所有工作进程"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, db):
+    """
+    为应用开启运行指标，在query_stats.init_app和db_pool.init_app之后调用
+    指标由 /internal/metrics 以Prometheus文本格式输出
+    """
+    from app.utils import db_pool
+
+    if record_checkout not in db_pool.checkout_listeners:
+        db_pool.checkout_listeners.append(record_checkout)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.inc()
+        # 在本请求取连接之前记录，反映的是同一进程中其他线程的占用；请求结束时会话还没有归还连接
+        collect_pool_gauges(db)
+        g.statement_collector = _StatementCollector(request.endpoint or 'unmatched')
+        query_stats.add_collector(g.statement_collector)
+
+    @app.after_request
+    def record_request_metrics(response):
+        blueprint, endpoint = _route_labels()
+        cache = response.headers.get('X-Page-Cache')
+        if cache:
+            PAGE_CACHE.labels(endpoint, cache.lower()).inc()
+        REQUESTS.labels(blueprint, endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        IN_FLIGHT.dec()
+        blueprint, endpoint = _route_labels()
+        REQUEST_LATENCY.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - started)
+        query_stats.remove_collector(g.pop('statement_collector', None))
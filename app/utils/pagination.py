@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, redirect, request, url_for, abort
+from sqlalchemy import and_, or_
+
+logger = logging.getLogger(__name__)
+
+
+class OffsetPage:
+    """
+    按页码分页的结果
+    属性与Flask-SQLAlchemy的Pagination保持一致，模板可以用同样的方式渲染分页
+    """
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+class KeysetPage:
+    """
+    基于游标（keyset）的分页结果
+    只知道前后是否还有数据，不知道总页数；total是可选的近似总数
+    """
+
+    def __init__(self, items, per_page, has_prev, has_next, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.total = total
+
+    @property
+    def prev_cursor(self):
+        """上一页的游标：以本页第一条记录为界向前翻"""
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(self.items[0], 'prev')
+
+    @property
+    def next_cursor(self):
+        """下一页的游标：以本页最后一条记录为界向后翻"""
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self.items[-1], 'next')
+
+
+def encode_cursor(post, direction):
+    """把(published_at, id)和翻页方向编码成URL安全的不透明字符串"""
+    payload = json.dumps([post.published_at.isoformat(), post.id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """解析游标，格式不正确时抛出ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        published_at, post_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('prev', 'next'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(published_at), int(post_id), direction
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'invalid cursor: {token!r}') from e
+
+
+def paginate_keyset(query, model, cursor=None, per_page=10, total=None, transform=None):
+    """
+    按(published_at, id)倒序做游标分页
+    WHERE条件直接定位到游标之后的位置，不论翻到多深都只读per_page+1行，
+    也不需要额外的COUNT(*)查询
+    无效的游标按第一页处理
+    没有发布时间的文章无法放进(published_at, id)的顺序，不在列表中出现（迁移已为已发布的文章回填发布时间）
+    transform：对本页结果做转换的函数（例如把只选部分列的Row转换成PostCard），
+               转换后的对象需要有published_at和id属性，用于生成游标
+    """
+    transform = transform or list
+    direction = 'next'
+    query = query.filter(model.published_at.isnot(None))
+    if cursor:
+        try:
+            published_at, post_id, direction = decode_cursor(cursor)
+        except ValueError:
+            cursor = None
+
+    if not cursor:
+        rows = query.order_by(model.published_at.desc(), model.id.desc()).limit(per_page + 1).all()
+        return KeysetPage(transform(rows[:per_page]), per_page, has_prev=False,
+                          has_next=len(rows) > per_page, total=total)
+
+    if direction == 'next':
+        rows = (query.filter(or_(model.published_at < published_at,
+                                 and_(model.published_at == published_at, model.id < post_id)))
+                .order_by(model.published_at.desc(), model.id.desc())
+                .limit(per_page + 1).all())
+        return KeysetPage(transform(rows[:per_page]), per_page, has_prev=True,
+                          has_next=len(rows) > per_page, total=total)
+
+    # 向前翻页时按升序取游标之前的记录，再反转回倒序
+    rows = (query.filter(or_(model.published_at > published_at,
+                             and_(model.published_at == published_at, model.id > post_id)))
+            .order_by(model.published_at.asc(), model.id.asc())
+            .limit(per_page + 1).all())
+    items = transform(list(reversed(rows[:per_page])))
+    return KeysetPage(items, per_page, has_prev=len(rows) > per_page, has_next=True, total=total)
+
+
+def redirect_legacy_page(query, model, endpoint, per_page, **url_args):
+    """
+    兼容旧的?page=N链接
+    只在第一次访问时用OFFSET定位一次，然后301重定向到对应的游标地址，
+    之后浏览器和爬虫都会直接使用游标链接
+    没有page参数时返回None
+    """
+    page = request.args.get('page', type=int)
+    if page is None:
+        return None
+    if page <= 1:
+        return redirect(url_for(endpoint, **url_args), code=301)
+
+    boundary = (query.filter(model.published_at.isnot(None)).order_by(model.published_at.desc(), model.id.desc())
+                .offset((page - 1) * per_page - 1).limit(1).first())
+    if boundary is None:
+        abort(404)
+    return redirect(url_for(endpoint, cursor=encode_cursor(boundary, 'next'), **url_args), code=301)
+
+
+class ApproximateCounter:
+    """
+    近似总数缓存
+    COUNT(*)在后台线程中执行，请求只读取上一次的结果，
+    结果过期后（POSTS_COUNT_TTL秒）由下一次读取触发后台刷新；还没有结果时返回None
+    """
+
+    def __init__(self):
+        self._values = {}       # {key: (count, expires)}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, count_fn):
+        """
+        返回key对应的近似总数
+        count_fn在应用上下文中执行，返回最新的总数
+        """
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._values.get(key, (None, 0))
+            if now < expires or key in self._refreshing:
+                return value
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+        ttl = app.config.get('POSTS_COUNT_TTL', 300)
+        threading.Thread(target=self._refresh, args=(app, key, count_fn, ttl), daemon=True).start()
+        return value
+
+    def _refresh(self, app, key, count_fn, ttl):
+        try:
+            with app.app_context():
+                count = count_fn()
+            with self._lock:
+                self._values[key] = (count, time.monotonic() + ttl)
+        except Exception:
+            logger.exception('近似总数刷新失败: %s', key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+post_counter = ApproximateCounter()
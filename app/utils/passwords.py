@@ -0,0 +1,101 @@
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.utils import metrics
+from app.utils.workers import BoundedProcessPool
+
+logger = logging.getLogger(__name__)
+
+REJECTED = metrics.counter('password_hash_rejected_total', '哈希进程池已满、等待超时或工作进程意外退出而返回503的次数',
+                           ('reason',))
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """哈希进程池已满或等待超时，返回503并提示客户端稍后重试"""
+
+    description = '登录请求过多，请稍后再试。'
+
+    def __init__(self, retry_after=1):
+        super().__init__(retry_after=retry_after)
+
+
+class PasswordHasher:
+    """
+    在独立的进程池中计算和校验密码哈希
+
+    scrypt是故意设计成很慢的CPU密集计算，直接在请求线程里执行时，
+    一波集中的登录（或撞库）就能占满所有工作线程，普通页面也跟着变慢。
+    这里把哈希计算交给固定大小的进程池，并用信号量限制排队的任务数：
+    超过PASSWORD_HASH_MAX_PENDING时立即返回503，而不是让请求无限排队。
+    工作进程以较低的优先级（PASSWORD_HASH_NICE）运行，和Web进程共用CPU时不会挤占页面请求。
+
+    PASSWORD_HASH_WORKERS为0时在当前线程中计算（命令行脚本、测试等场景）
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.timeout = 10
+        self.pool = BoundedProcessPool(workers=0, max_pending=16, nice=10)
+        self._prefix = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.pool.configure(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'],
+                            app.config['PASSWORD_HASH_NICE'])
+        self._prefix = None
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        if not self.pool.workers:
+            return fn(*args)
+
+        future = self.pool.try_submit(fn, *args)
+        if future is None:
+            logger.warning('密码哈希进程池已满（%d 个任务），拒绝请求', self.pool.max_pending)
+            REJECTED.labels('full').inc()
+            raise PasswordHasherBusy()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            REJECTED.labels('timeout').inc()
+            raise PasswordHasherBusy()
+        except BrokenProcessPool:
+            # 工作进程意外退出，进程池已被丢弃，下一个请求会重新创建
+            logger.error('密码哈希工作进程意外退出')
+            REJECTED.labels('broken').inc()
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        """按PASSWORD_HASH_METHOD生成密码哈希"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """校验密码，pwhash为空时直接返回False"""
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """哈希使用的算法或参数与当前配置不同（例如调高了成本），应在登录成功后重新生成"""
+        return bool(pwhash) and pwhash.split('$', 1)[0] != self._method_prefix()
+
+    def _method_prefix(self):
+        """
+        哈希值中'$'前面的部分，例如'scrypt:32768:8:1'
+        配置可能省略部分参数（如'scrypt'、'pbkdf2:sha256'），由Werkzeug补上默认值，
+        所以总是按配置生成一次哈希来确定完整形式，而不是直接比较配置字符串；
+        这次哈希和其他哈希一样交给进程池计算，结果在进程内缓存
+        """
+        if self._prefix is None:
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def shutdown(self):
+        self.pool.shutdown()
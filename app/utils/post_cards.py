@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+
+from app import db, view_counter
+from app.models.post import Post, Tag, post_tags
+from app.models.user import User
+
+
+class AuthorCard(NamedTuple):
+    id: int
+    username: str
+
+
+class TagCard(NamedTuple):
+    name: str
+    slug: str
+    color: str
+
+
+class PostCard(NamedTuple):
+    """
+    列表页用的文章只读数据
+    只包含卡片上显示的字段，不进入会话的identity map，也不会触发延迟加载；
+    属性名与Post一致（author.username、tags、total_views等），模板可以直接替换使用
+    """
+    id: int
+    title: str
+    slug: str
+    summary: Optional[str]
+    excerpt: Optional[str]
+    featured_image: Optional[str]
+    created_at: datetime
+    published_at: Optional[datetime]
+    view_count: int
+    user_id: int
+    author: AuthorCard
+    tags: tuple = ()
+
+    @property
+    def total_views(self):
+        return (self.view_count or 0) + view_counter.local_pending(self.id)
+
+
+# 卡片需要的列：文章本身的几个短字段加作者用户名，不含content和content_html
+CARD_COLUMNS = (Post.id, Post.title, Post.slug, Post.summary, Post.excerpt, Post.featured_image,
+                Post.created_at, Post.published_at, Post.view_count, Post.user_id, User.username)
+
+
+def card_query(*criteria):
+    """
+    只选择卡片所需列的查询，返回的是Row而不是Post对象
+    可以继续filter/order_by，也可以交给paginate_keyset，最后用to_cards转换
+    """
+    return db.session.query(*CARD_COLUMNS).join(User, User.id == Post.user_id).filter(*criteria)
+
+
+def tags_by_post(post_ids):
+    """一次查询取出这些文章的标签 {post_id: (TagCard, ...)}，post_ids可以是ID列表或返回ID的子查询"""
+    tags = {}
+    rows = db.session.execute(
+        select(post_tags.c.post_id, Tag.name, Tag.slug, Tag.color)
+        .join(Tag, Tag.id == post_tags.c.tag_id)
+        .where(post_tags.c.post_id.in_(post_ids))
+        .order_by(post_tags.c.post_id, Tag.id))
+    for post_id, name, slug, color in rows:
+        tags.setdefault(post_id, []).append(TagCard(name, slug, color))
+    return {post_id: tuple(items) for post_id, items in tags.items()}
+
+
+def to_cards(rows, with_tags=False):
+    """把card_query的结果转换成PostCard列表，with_tags=True时再用一次查询批量取标签"""
+    rows = list(rows)
+    tags = tags_by_post([row.id for row in rows]) if with_tags and rows else {}
+    return [PostCard(row.id, row.title, row.slug, row.summary, row.excerpt, row.featured_image,
+                     row.created_at, row.published_at, row.view_count, row.user_id,
+                     AuthorCard(row.user_id, row.username), tags.get(row.id, ()))
+            for row in rows]
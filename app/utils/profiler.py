@@ -0,0 +1,187 @@
+import cProfile
+import heapq
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app, g, request, template_rendered, before_render_template
+from flask.cli import AppGroup
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from app.utils import query_stats
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_ARG = '_profile'
+
+# 同一条SQL的IN列表长度不同、空白不同时归为一条
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """合并空白、把展开的IN列表缩成一个占位符；语句本身只含占位符，不含参数值"""
+    return _IN_LIST.sub('(?, ...)', _SPACES.sub(' ', statement).strip())
+
+
+class SlowStatements:
+    """
+    每个路由最慢的若干条SQL（本进程累计）
+    按规范化后的语句文本分组，记录次数、总耗时和最大耗时，不保存参数；
+    每个路由最多保留keep条，新的语句比其中最快的一条还快时直接丢弃
+    """
+
+    def __init__(self, keep=10):
+        self.keep = keep
+        self._routes = {}  # endpoint -> {statement: [count, total, max]}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, statement, duration):
+        with self._lock:
+            statements = self._routes.setdefault(endpoint, {})
+            entry = statements.get(statement)
+            if entry is None:
+                if len(statements) >= self.keep:
+                    fastest = min(statements, key=lambda s: statements[s][2])
+                    if statements[fastest][2] >= duration:
+                        return
+                    del statements[fastest]
+                entry = statements[statement] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+
+    def snapshot(self):
+        """{endpoint: [{statement, count, total_ms, max_ms, avg_ms}, ...]}，每个路由按最大耗时从大到小排列"""
+        with self._lock:
+            routes = {endpoint: dict(statements) for endpoint, statements in self._routes.items()}
+        result = {}
+        for endpoint, statements in sorted(routes.items(), key=lambda item: str(item[0])):
+            top = heapq.nlargest(self.keep, statements.items(), key=lambda item: item[1][2])
+            result[str(endpoint)] = [{
+                'statement': statement,
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'max_ms': round(longest * 1000, 3),
+                'avg_ms': round(total / count * 1000, 3),
+            } for statement, (count, total, longest) in top]
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+slow_statements = SlowStatements()
+
+
+class _RouteCollector:
+    """挂在query_stats上的收集器：把本次请求执行的每条SQL记到当前路由名下"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    def add(self, statement, parameters, duration):
+        slow_statements.add(self.endpoint, normalize_statement(statement), duration)
+
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='request-profiler')
+
+
+def make_profile_token(app):
+    """生成一个放在X-Profile-Token请求头中的签名令牌，有效期为PROFILER_TOKEN_MAX_AGE秒"""
+    return _serializer(app).dumps('profile')
+
+
+def _wants_profile(app):
+    """请求带有效的签名令牌，或者由管理员带上 ?_profile=1 发起"""
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            _serializer(app).loads(token, max_age=app.config['PROFILER_TOKEN_MAX_AGE'])
+            return True
+        except BadSignature:
+            return False
+    return (request.args.get(PROFILE_ARG) == '1'
+            and current_user.is_authenticated and current_user.is_admin)
+
+
+def _on_before_render(sender, template, context, **extra):
+    if g:
+        g.template_started = time.perf_counter()
+
+
+def _on_rendered(sender, template, context, **extra):
+    started = g.pop('template_started', None) if g else None
+    if started is not None:
+        g.template_time = g.get('template_time', 0.0) + time.perf_counter() - started
+
+
+def init_app(app):
+    """
+    为应用开启请求级别的性能诊断，在query_stats.init_app之后调用：
+
+    - 每个响应带Server-Timing头：sql（语句数和耗时）、tpl（模板渲染）、total（视图处理总耗时），
+      浏览器开发者工具的Network面板可以直接看到
+    - 按路由记录最慢的SQL（不含参数），在 /internal/slow-queries 查看
+    - 请求头带 X-Profile-Token（flask profile token 生成），或管理员访问时加 ?_profile=1，
+      用cProfile分析这一个请求，结果保存到PROFILER_DIR，文件名在响应头X-Profile-File中返回，
+      用 python -m pstats 文件名 查看
+    """
+    slow_statements.keep = app.config['PROFILER_SLOW_STATEMENTS']
+    template_rendered.connect(_on_rendered, app)
+    before_render_template.connect(_on_before_render, app)
+
+    @app.before_request
+    def start_profiling():
+        g.request_started = time.perf_counter()
+        g.route_collector = _RouteCollector(request.endpoint)
+        query_stats.add_collector(g.route_collector)
+        if _wants_profile(app):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def add_server_timing(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILER_DIR'], exist_ok=True)
+            name = (f'{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{os.getpid()}-'
+                    f'{re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unknown")}.prof')
+            profiler.dump_stats(os.path.join(app.config['PROFILER_DIR'], name))
+            response.headers['X-Profile-File'] = name
+        started = g.get('request_started')
+        stats = g.get('query_stats')
+        if started is not None and app.config['SERVER_TIMING']:
+            timings = []
+            if stats is not None:
+                timings.append(f'sql;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+            timings.append(f'tpl;dur={g.get("template_time", 0.0) * 1000:.1f}')
+            timings.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+            response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        collector = g.get('route_collector')
+        if collector is not None:
+            query_stats.remove_collector(collector)
+
+
+profile_cli = AppGroup('profile', help='按需分析单个请求的性能')
+
+
+@profile_cli.command('token')
+def token():
+    """生成一个X-Profile-Token请求头的值，在有效期内带着它的请求都会被分析"""
+    click.echo(make_profile_token(current_app))
+    click.echo(f'有效期 {current_app.config["PROFILER_TOKEN_MAX_AGE"]} 秒，例如：', err=True)
+    click.echo(f'  curl -H "{PROFILE_HEADER}: <令牌>" -D - -o /dev/null http://localhost:5000/', err=True)
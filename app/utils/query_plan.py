@@ -0,0 +1,209 @@
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_migrate import upgrade
+
+from app.utils.query_stats import count_queries
+from config import basedir
+
+# 允许全表扫描的语句：标签表很小且查询带LIMIT，搜索文档统计结果在进程内缓存
+ALLOWED_SCANS = {
+    'tags': '标签表很小，侧边栏查询带LIMIT',
+    'search_documents': '全库统计，结果缓存60秒',
+}
+
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)\b(?! USING)')
+_CTE_RE = re.compile(r'\bWITH\s+(?:RECURSIVE\s+)?(\w+)', re.IGNORECASE)
+
+
+def _is_derived(table, ctes=()):
+    """子查询和CTE生成的临时结果集（SQLAlchemy的anon_N、MySQL的<derivedN>、WITH定义的名称），不是真正的表"""
+    return table is None or table.startswith(('anon_', '<')) or table == 'CONSTANT' or table in ctes
+
+
+def explain(conn, statement, parameters):
+    """返回一条语句的执行计划，每行一个字典"""
+    if isinstance(parameters, list):  # executemany，只需解释第一组参数
+        parameters = parameters[0] if parameters else ()
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    result = conn.exec_driver_sql(prefix + statement, parameters)
+    return [dict(row._mapping) for row in result]
+
+
+def plan_problems(dialect, plan, ctes=()):
+    """
+    找出执行计划中的全表扫描和额外排序
+    ctes：语句中WITH定义的名称，对它们的扫描不算全表扫描
+    SQLite：'SCAN 表名'（没有USING INDEX）和'USE TEMP B-TREE FOR ORDER BY'
+    MySQL：type为ALL，或Extra中出现Using filesort
+    """
+    problems = []
+    for row in plan:
+        if dialect == 'sqlite':
+            detail = row['detail']
+            match = _SQLITE_SCAN_RE.match(detail)
+            if match and not _is_derived(match.group(1), ctes) and match.group(1) not in ALLOWED_SCANS:
+                problems.append(detail)
+            elif 'USE TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append(detail)
+        else:
+            table = row.get('table')
+            if row.get('type') == 'ALL' and not _is_derived(table, ctes) and table not in ALLOWED_SCANS:
+                problems.append(f'{table}: full table scan')
+            if 'Using filesort' in (row.get('Extra') or ''):
+                problems.append(f'{table}: Using filesort')
+    return problems
+
+
+def _seed(db):
+    """写入少量数据，让每个页面都能走到完整的查询路径"""
+    from app.models.user import User
+    from app.models.post import Post, Comment, Tag
+    from app.search import index_post
+
+    user = User(username='planner', email='planner@example.com')
+    user.password_hash = 'x'
+    db.session.add(user)
+    tag = Tag(name='plan', slug='plan')
+    db.session.add(tag)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for i in range(30):
+        post = Post(title=f'Query plan post {i}', slug=f'query-plan-{i}', content='explain query plan 查询计划',
+                    is_published=True, published_at=now - timedelta(hours=i), user_id=user.id, view_count=0)
+        post.tags.append(tag)
+        db.session.add(post)
+        db.session.flush()
+        index_post(post)  # 搜索页按倒排记录取候选集，没有索引时这些查询不会执行
+        comment = Comment(content='comment', user_id=user.id, post_id=post.id)
+        db.session.add(comment)
+        db.session.flush()
+        db.session.add(Comment(content='reply', user_id=user.id, post_id=post.id, parent_id=comment.id))
+    db.session.commit()
+    return user.id
+
+
+def _expect(response, method, url, status, location=None):
+    """检查响应状态（和重定向目标），不符合时抛出RuntimeError：页面没有真正执行时它的SQL也没有被检查"""
+    target = urlsplit(response.location or '').path
+    if response.status_code != status or (location is not None and target != location):
+        raise RuntimeError(f'{method} {url} 返回 {response.status_code} {target}，'
+                           f'预期 {status} {location or ""}'.rstrip())
+
+
+def _exercise_routes(app, user_id):
+    """
+    以匿名访客和登录用户身份访问main和post蓝图的全部路由，返回记录到的语句
+    必须在应用上下文之外调用：测试客户端的每个请求会推入新的应用上下文，
+    外层已有同一应用的上下文时所有请求共用一个g，第一个请求的匿名用户会留在g中
+    """
+    anonymous = app.test_client()
+    author = app.test_client()
+    with author.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    with count_queries(record=True) as stats:
+        for url in ['/', '/about', '/contact', '/search?q=query plan 查询',
+                    '/post/', '/post/?tag=plan', '/post/query-plan-3', '/post/?page=2', '/?page=2',
+                    '/feeds/atom.xml', '/feeds/tags/plan/rss.xml', '/sitemap.xml', '/sitemaps/pages.xml',
+                    '/sitemaps/posts-1.xml']:
+            response = anonymous.get(url, follow_redirects=True)
+            _expect(response, 'GET', url, 200)
+            response.close()
+        _expect(author.get('/post/create'), 'GET', '/post/create', 200)
+        _expect(author.post('/post/create', data={'title': 'Query plan post 3', 'content': 'new post content',
+                                                  'tags': 'plan, other', 'is_published': 'y'}),
+                'POST', '/post/create', 302, '/post/query-plan-post-3')
+        _expect(author.get('/post/query-plan-4/edit'), 'GET', '/post/query-plan-4/edit', 200)
+        _expect(author.post('/post/query-plan-4/edit', data={'title': 'Edited plan post', 'content': 'edited content',
+                                                            'tags': 'other', 'is_published': 'y'}),
+                'POST', '/post/query-plan-4/edit', 302, '/post/query-plan-4')
+        _expect(author.post('/post/query-plan-5/comment', data={'content': 'another comment'}),
+                'POST', '/post/query-plan-5/comment', 302, '/post/query-plan-5')
+        _expect(author.post('/post/query-plan-6/delete'), 'POST', '/post/query-plan-6/delete', 302, '/')
+    return stats.statements
+
+
+def run_plan_check(config, database_url=None):
+    """
+    在一个临时数据库上执行全部迁移，访问main和post蓝图的所有路由，
+    对记录到的每条SELECT/WITH/UPDATE/DELETE语句执行EXPLAIN
+    config：应用配置，临时应用在它的基础上换成临时数据库
+    返回 (检查的语句数, [(语句, 问题列表), ...])，第二项为空表示没有全表扫描和额外排序
+    """
+    from app import create_app, db
+
+    tmp_path = None
+    if database_url is None:
+        fd, tmp_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = f'sqlite:///{tmp_path}'
+
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'PAGE_CACHE_BACKEND': 'null',
+        'CACHE_VERSION_BACKEND': 'memory',  # 临时库上的写入不能让正在运行的站点的缓存失效
+        # 当前应用已经按自己的数据库生成了连接参数，临时库重新生成；也不使用只读副本
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'SQLALCHEMY_BINDS': {},
+    }
+    app = create_app(type('QueryPlanConfig', (object,), {**config, **overrides}))
+
+    seen = set()
+    failures = []
+    try:
+        with app.app_context():
+            upgrade(directory=os.path.join(basedir, 'migrations'))
+            user_id = _seed(db)
+            db.session.remove()
+        statements = _exercise_routes(app, user_id)
+
+        with app.app_context():
+            with db.engine.connect() as conn:
+                for statement, parameters, _ in statements:
+                    verb = statement.lstrip().split(None, 1)[0].upper()
+                    if verb not in ('SELECT', 'WITH', 'UPDATE', 'DELETE') or statement in seen:
+                        continue
+                    seen.add(statement)
+                    problems = plan_problems(conn.dialect.name, explain(conn, statement, parameters),
+                                             ctes=set(_CTE_RE.findall(statement)))
+                    if problems:
+                        failures.append((statement, problems))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+    return len(seen), failures
+
+
+@click.command('check-query-plans')
+@click.option('--database-url', default=None,
+              help='用于检查的空数据库，默认使用临时SQLite文件；也可以指向一个临时MySQL库')
+@with_appcontext
+def check_query_plans(database_url):
+    """
+    执行计划回归检查
+    在一个临时数据库上执行全部迁移，访问main和post蓝图的所有路由，
+    对记录到的每条SELECT/WITH/UPDATE/DELETE语句执行EXPLAIN，
+    出现全表扫描或额外排序（filesort）时以非零状态退出；tests/test_query_plans.py中有同样的检查
+    """
+    checked, failures = run_plan_check(current_app.config, database_url)
+    for statement, problems in failures:
+        click.echo(click.style('✗ ', fg='red') + ' '.join(statement.split()))
+        for problem in problems:
+            click.echo(f'    {problem}')
+
+    click.echo(f'检查了 {checked} 条语句，{len(failures)} 条存在全表扫描或额外排序')
+    if failures:
+        raise SystemExit(1)
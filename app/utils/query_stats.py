@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_listening = False
+
+
+class QueryBudgetExceeded(Exception):
+    """请求执行的SQL语句数超过了配置的预算"""
+
+
+class QueryStats:
+    """
+    一段时间内执行的SQL统计：语句数和总耗时（秒）
+    record=True时同时保存每条语句的文本、参数和耗时，供查询计划检查等工具使用
+    """
+
+    def __init__(self, record=False):
+        self.count = 0
+        self.duration = 0.0
+        self.record = record
+        self.statements = []
+
+    def add(self, statement, parameters, duration):
+        self.count += 1
+        self.duration += duration
+        if self.record:
+            self.statements.append((statement, parameters, duration))
+
+
+def _collectors():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+# 开始时间保存在这条语句的执行上下文上，随语句结束一起释放；
+# 执行失败的语句（例如保存点里故意触发的唯一约束冲突）不会调用after_cursor_execute，
+# 保存在连接上的话会在连接池的长连接里一直累积
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    duration = time.perf_counter() - started if started is not None else 0.0
+    for stats in _collectors():
+        stats.add(statement, parameters, duration)
+
+
+def add_collector(collector):
+    """
+    在当前线程上挂一个收集器，之后执行的每条SQL都会调用 collector.add(statement, parameters, duration)
+    用于按请求统计（见init_app）或其他按路由汇总的工具，用完后调用remove_collector
+    """
+    _collectors().append(collector)
+
+
+def remove_collector(collector):
+    collectors = _collectors()
+    if collector in collectors:
+        collectors.remove(collector)
+
+
+@contextmanager
+def count_queries(record=False):
+    """
+    统计代码块中执行的SQL，可以在测试中断言某个页面的查询次数：
+
+        with count_queries() as stats:
+            client.get('/')
+        assert stats.count <= 5
+    """
+    stats = QueryStats(record=record)
+    add_collector(stats)
+    try:
+        yield stats
+    finally:
+        remove_collector(stats)
+
+
+def query_budget(endpoint, config):
+    """返回某个路由的SQL语句数预算，SQL_QUERY_BUDGETS中的单独配置优先，0表示不限制"""
+    return config['SQL_QUERY_BUDGETS'].get(endpoint, config['SQL_QUERY_BUDGET'])
+
+
+def init_app(app):
+    """
+    为应用开启按请求的SQL统计
+    每个请求的统计结果保存在g.query_stats中；
+    超出预算时记录警告日志，SQL_QUERY_BUDGET_RAISE为True时（测试环境）直接抛出异常；
+    SQL_QUERY_COUNT_HEADER为True时在响应头X-Query-Count中返回 语句数;耗时毫秒
+    """
+    global _listening
+    if not _listening:
+        # 监听所有Engine，主库、从库和命令行工具创建的连接都会被统计
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+        add_collector(g.query_stats)
+
+    @app.after_request
+    def check_query_budget(response):
+        stats = g.get('query_stats')
+        budget = query_budget(request.endpoint, app.config)
+        if stats is not None and budget and stats.count > budget:
+            message = (f'{request.endpoint} 执行了 {stats.count} 条SQL，'
+                       f'超出预算 {budget} 条（耗时 {stats.duration * 1000:.1f} ms）')
+            if app.config['SQL_QUERY_BUDGET_RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        if stats is not None and app.config['SQL_QUERY_COUNT_HEADER']:
+            response.headers['X-Query-Count'] = f'{stats.count};{stats.duration * 1000:.1f}'
+        return response
+
+    @app.teardown_request
+    def stop_query_stats(exc):
+        stats = g.get('query_stats')
+        if stats is not None:
+            remove_collector(stats)
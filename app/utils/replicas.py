@@ -0,0 +1,235 @@
+import itertools
+import logging
+import threading
+import time
+
+import click
+from flask import current_app, g, has_request_context, request, session as cookie_session
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DisconnectionError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+BIND_PREFIX = 'replica'          # SQLALCHEMY_BINDS中只读副本的键名前缀：replica0、replica1……
+_STICKY_KEY = '_db_primary_until'  # 写入后在用户会话中记录的时间戳，之前的请求都读主库
+_WROTE_KEY = 'replica_router_wrote'
+_READ_KEY = 'replica_router_read'        # 当前语句发到的副本引擎
+_PRIMARY_KEY = 'replica_router_primary'  # 副本查询失败后，重试的语句强制读主库
+# 健康检查查询一张业务表而不只是SELECT 1：副本被重建成空库（SQLite还会自动创建不存在的文件）时也能发现
+HEALTH_QUERY = 'SELECT 1 FROM posts LIMIT 1'
+
+replicas_cli = AppGroup('replicas', help='只读副本')
+
+
+class RoutingSession(Session):
+    """
+    按语句选择数据库的会话
+    路由器允许时（GET/HEAD请求、本次请求还没有写入、用户最近没有写入过）
+    普通的SELECT发到健康的只读副本；INSERT/UPDATE/DELETE、flush、SELECT ... FOR UPDATE、
+    原始SQL文本以及请求之外（命令行、后台线程）的查询都使用主库
+
+    发到副本的查询出现连接错误时，副本已被标记为不可用（ReplicaRouter._on_error），
+    这条查询在主库上重试一次，正在处理的请求不会因此返回500
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info[_WROTE_KEY] = True
+            elif (getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+                  and not self.info.get(_WROTE_KEY) and not self.info.get(_PRIMARY_KEY)):
+                router = current_app.extensions.get('replica_router')
+                engine = router.engine_for_read() if router is not None else None
+                if engine is not None:
+                    self.info[_READ_KEY] = engine
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _with_primary_fallback(self, method, *args, **kwargs):
+        self.info.pop(_READ_KEY, None)
+        try:
+            return method(*args, **kwargs)
+        except (OperationalError, DisconnectionError):
+            replica = self.info.pop(_READ_KEY, None)
+            if replica is None:
+                raise
+            logger.warning('只读副本 %s 查询失败，改读主库重试', replica.url.render_as_string(hide_password=True))
+            # 断开的副本连接留在会话事务中，之后提交时会抛出PendingRollbackError；
+            # 查询还能发到副本说明这个事务没有写入过，没有未写入的修改时回滚不会丢失数据
+            if not (self.new or self.dirty or self.deleted):
+                self.rollback()
+            self.info[_PRIMARY_KEY] = True
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.info.pop(_PRIMARY_KEY, None)
+
+    def execute(self, *args, **kwargs):
+        return self._with_primary_fallback(super().execute, *args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self._with_primary_fallback(super().scalar, *args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self._with_primary_fallback(super().scalars, *args, **kwargs)
+
+
+class _Replica:
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.error = None
+
+
+class ReplicaRouter:
+    """
+    只读副本路由和健康检查
+
+    副本在SQLALCHEMY_BINDS中以replica开头的键配置（见DATABASE_REPLICA_URLS），
+    RoutingSession在GET请求中把只读查询轮流发到健康的副本。
+    读己之写：一个请求提交过写入后，在用户会话中记下REPLICA_STICKY_SECONDS秒的截止时间，
+    这段时间内该用户的请求全部读主库，不会因为复制延迟看不到自己刚发的文章或评论。
+
+    健康检查每隔REPLICA_HEALTH_INTERVAL秒在后台线程中执行一次：连不上、
+    或者（MySQL）复制延迟超过REPLICA_MAX_LAG秒的副本暂停使用；
+    查询时出现连接错误也会立即把副本标记为不可用，所有副本都不可用时读主库
+    """
+
+    def __init__(self, app=None, db=None):
+        self.replicas = []
+        self.sticky_seconds = 5
+        self.health_interval = 10
+        self.max_lag = 30
+        self._next = itertools.count()
+        self._checked_at = 0
+        self._checking = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """与Flask应用和数据库实例关联，db必须使用RoutingSession作为会话类"""
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.health_interval = app.config['REPLICA_HEALTH_INTERVAL']
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        with app.app_context():
+            keys = sorted(key for key in db.engines if key and key.startswith(BIND_PREFIX))
+            self.replicas = [_Replica(key, db.engines[key]) for key in keys]
+        self._checked_at = 0
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', self._on_error(replica))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(RoutingSession, 'after_commit', self._after_commit)
+        event.listen(RoutingSession, 'after_rollback', self._after_rollback)
+        app.extensions['replica_router'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def _before_request(self):
+        # 只有带着会话cookie的请求才读取会话，匿名请求不会因此多出Vary: Cookie
+        sticky = (current_app.config['SESSION_COOKIE_NAME'] in request.cookies
+                  and cookie_session.get(_STICKY_KEY, 0) > time.time())
+        g.use_replica = self.enabled and request.method in ('GET', 'HEAD') and not sticky
+
+    def _after_request(self, response):
+        if g.get('db_wrote'):
+            cookie_session[_STICKY_KEY] = time.time() + self.sticky_seconds
+        return response
+
+    def _after_commit(self, session):
+        if session.info.pop(_WROTE_KEY, False) and has_request_context():
+            # 本次请求剩下的查询和之后一段时间内的请求都读主库
+            g.db_wrote = True
+            g.use_replica = False
+
+    def _after_rollback(self, session):
+        session.info.pop(_WROTE_KEY, None)
+
+    def engine_for_read(self):
+        """返回本次查询应使用的副本引擎，应该读主库时返回None"""
+        if not self.replicas or not has_request_context() or not g.get('use_replica'):
+            return None
+        self._maybe_check()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)].engine
+
+    def _on_error(self, replica):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                if replica.healthy:
+                    logger.warning('只读副本 %s 查询出错，暂停使用: %s', replica.key, context.original_exception)
+                replica.healthy = False
+                replica.error = str(context.original_exception)
+        return handle_error
+
+    def _maybe_check(self):
+        with self._lock:
+            if self._checking or time.monotonic() - self._checked_at < self.health_interval:
+                return
+            self._checking = True
+        threading.Thread(target=self._check_in_background, daemon=True).start()
+
+    def _check_in_background(self):
+        try:
+            self.check()
+        finally:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self._checking = False
+
+    def check(self):
+        """检查所有副本的连通性和复制延迟，返回副本列表"""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    conn.execute(text(HEALTH_QUERY))
+                    replica.lag = _replication_lag(conn)
+                healthy = replica.lag is None or replica.lag <= self.max_lag
+                replica.error = None if healthy else f'复制延迟 {replica.lag} 秒'
+            except Exception as e:
+                healthy = False
+                replica.error = str(e)
+            if healthy != replica.healthy:
+                logger.warning('只读副本 %s %s', replica.key, '恢复使用' if healthy else f'暂停使用: {replica.error}')
+            replica.healthy = healthy
+        return self.replicas
+
+
+def _replication_lag(conn):
+    """MySQL/MariaDB副本的复制延迟（秒）；其他数据库或没有查看权限时返回None"""
+    if conn.dialect.name not in ('mysql', 'mariadb'):
+        return None
+    for statement in ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'):
+        try:
+            row = conn.exec_driver_sql(statement).mappings().first()
+        except Exception:
+            continue
+        if row is None:
+            return None
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        # 复制线程停止时延迟为NULL，按不可用处理
+        return float('inf') if lag is None else int(lag)
+    return None
+
+
+@replicas_cli.command('status')
+def status():
+    """检查只读副本的连通性和复制延迟"""
+    router = current_app.extensions['replica_router']
+    if not router.enabled:
+        click.echo('没有配置只读副本（DATABASE_REPLICA_URLS），所有查询都使用主库')
+        return
+    for replica in router.check():
+        state = '正常' if replica.healthy else f'不可用（{replica.error}）'
+        lag = '' if replica.lag is None else f'，延迟 {replica.lag} 秒'
+        click.echo(f'{replica.key}: {replica.engine.url.render_as_string(hide_password=True)} {state}{lag}')
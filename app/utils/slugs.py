@@ -0,0 +1,75 @@
+import re
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+SUFFIX_ROOM = 8  # 为"-数字"后缀预留的长度
+
+
+def _prefix_filter(column, base):
+    """
+    匹配 base-<任意内容> 的条件，能使用slug列上的索引做范围扫描
+    SQLite的LIKE默认不区分大小写、用不上普通索引，所以改用区分大小写的GLOB
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return column.op('GLOB')(re.sub(r'([*?\[])', r'[\1]', base) + '-*')
+    escaped = base.replace('\\', '\\\\').replace('%', r'\%').replace('_', r'\_')
+    return column.like(escaped + '-%', escape='\\')
+
+
+def allocate_slug(column, base, default='post', exclude=()):
+    """
+    为base分配一个未被使用的slug
+    一次前缀查询取出base和所有base-N形式的slug，在内存中找出下一个可用的编号，
+    不论已经有多少个同名slug都只需要一次查询
+    exclude是调用方已知不可用的slug（例如刚因唯一约束冲突而失败的slug）
+    """
+    max_length = column.type.length
+    base = (base or default)
+    if max_length and len(base) > max_length - SUFFIX_ROOM:
+        base = base[:max_length - SUFFIX_ROOM].rstrip('-') or default
+
+    taken = set(db.session.scalars(
+        select(column).where(or_(column == base, _prefix_filter(column, base)))))
+    taken.update(exclude)
+    if base not in taken:
+        return base
+
+    pattern = re.compile(re.escape(base) + r'-(\d+)')
+    used = [int(match.group(1)) for match in map(pattern.fullmatch, taken) if match]
+    return f'{base}-{max(used, default=0) + 1}'
+
+
+def _slug_taken(column, slug):
+    """加锁读取slug是否已被使用，能读到并发事务刚提交的行（InnoDB的普通读只能看到事务开始时的快照）"""
+    return db.session.scalar(select(column).where(column == slug).with_for_update(read=True)) is not None
+
+
+def save_with_unique_slug(obj, column, base, default='post', attempts=5, existing=None):
+    """
+    分配slug并在保存点中插入obj
+    两个请求同时拿到同一个slug时，后插入的一方会违反唯一约束，
+    这时只回滚保存点、排除这个slug后重新分配，不影响外层事务中的其他修改
+
+    existing：obj还有其他唯一列时（例如标签名），返回与obj冲突的已有行的函数；
+    插入失败时先调用它，找到了就直接返回那一行（并发创建同名标签），不再换slug重试。
+    只有slug确实已被占用时才重试，其他约束冲突原样抛出IntegrityError
+    """
+    failed = set()
+    for _ in range(attempts):
+        obj.slug = allocate_slug(column, base, default=default, exclude=failed)
+        try:
+            with db.session.begin_nested():
+                db.session.add(obj)
+            return obj
+        except IntegrityError:
+            if existing is not None:
+                row = existing()
+                if row is not None:
+                    return row
+            if not _slug_taken(column, obj.slug):
+                raise
+            failed.add(obj.slug)
+    raise RuntimeError(f'无法为 {base!r} 分配唯一的slug')
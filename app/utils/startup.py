@@ -0,0 +1,13 @@
+from sqlalchemy.orm import configure_mappers
+
+
+def prepare_for_fork(app):
+    """
+    提前完成每个工作进程在第一个请求中都要做的初始化：配置ORM映射关系、编译全部Jinja模板
+    在Gunicorn主进程（preload_app）中调用一次，fork出的工作进程直接继承结果；
+    不访问数据库，主进程不会持有连接
+    """
+    configure_mappers()
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
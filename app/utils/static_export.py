@@ -0,0 +1,289 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from markupsafe import escape
+from sqlalchemy import desc, func, select
+
+from app import db, image_store, page_cache, view_counter
+from app.cache.backends import NullBackend
+from app.models.post import Post, Comment, Tag, post_tags
+from app.utils.db_pool import dispose_after_fork
+from app.utils.images import uploaded_name
+from app.utils.pagination import encode_cursor
+
+# 导出目录的结构（与动态站点的URL一一对应，nginx按 $uri/index.html 查找文件）：
+#   index.html, page/<n>/index.html                          首页（main.index）及其后续各页
+#   post/index.html, post/page/<n>/index.html                文章列表（post.index）
+#   post/tag/<标签slug>/index.html, .../page/<n>/index.html  按标签筛选的文章列表
+#   post/<文章slug>/index.html                               文章详情
+# 动态站点的游标分页链接（?cursor=...）和标签链接（/post/?tag=...）在导出的页面中改写为上面的静态路径；
+# 其他带查询参数的链接（评论翻页、搜索）仍由应用处理
+
+MANIFEST = '.export-manifest.json'  # 导出目录中记录每个页面指纹的清单
+REPORT_INTERVAL = 10  # 每隔多少秒输出一次进度并保存清单
+MAX_FILENAME = 255    # 常见文件系统的文件名长度上限（字节）
+
+export_cli = AppGroup('export', help='静态站点导出')
+
+_HREF_RE = re.compile(r'href="([^"]*)"')
+_worker = {}
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _write_atomic(path, data):
+    """写入同目录下的临时文件再原子替换，nginx在任何时刻读到的都是完整的旧文件或新文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def _safe_segment(slug):
+    """slug能否直接用作目录名：不含路径分隔符、不以点开头、不超过文件名长度上限"""
+    return bool(slug) and '/' not in slug and '\\' not in slug and not slug.startswith('.') \
+        and len(slug.encode()) <= MAX_FILENAME
+
+
+def _init_worker(app, site_links, output):
+    """渲染进程的初始化：进程由fork创建，直接使用父进程已经配置好的应用"""
+    dispose_after_fork(app, db)
+    view_counter.enabled = False        # 导出时的渲染不是真实的浏览
+    page_cache.backend = NullBackend()  # 每个页面只渲染一次，写入整页缓存只会占用内存
+    _worker.update(client=app.test_client(), site_links=site_links, output=output)
+
+
+def _render_page(task):
+    """在渲染进程中执行：以匿名访客身份请求页面，改写分页和标签链接后写入导出目录，返回 (文件路径, 状态码)"""
+    url, path, links = task
+    response = _worker['client'].get(url)
+    if response.status_code != 200:
+        return path, response.status_code
+
+    site_links = _worker['site_links']
+
+    def rewrite(match):
+        href = match.group(1)
+        return f'href="{links.get(href) or site_links.get(href) or href}"'
+
+    html = _HREF_RE.sub(rewrite, response.get_data(as_text=True))
+    _write_atomic(os.path.join(_worker['output'], path), html.encode())
+    return path, 200
+
+
+class SitePlan:
+    """
+    一次导出需要生成的全部页面及其指纹
+    指纹由页面上显示的数据计算：文章的updated_at、评论数、最新评论时间、标签（含名称和颜色），
+    列表页再加上本页的文章和侧栏（热门标签、最新文章）；模板内容也计入指纹，修改模板后所有页面都会重新生成
+    所有数据用几条整表查询一次取出，不渲染任何页面
+    """
+
+    def __init__(self):
+        self.pages = {}       # 文件路径 -> (动态URL, 分页链接改写表, 指纹)
+        self.site_links = {}  # 所有页面共用的链接改写表：标签链接 -> 静态路径
+        self.skipped = []     # slug不能用作目录名的文章和标签
+
+    @staticmethod
+    def _href(route):
+        return quote(route, safe='/')
+
+    def _templates_digest(self):
+        env = current_app.jinja_env
+        sources = [env.loader.get_source(env, name)[0] for name in sorted(env.list_templates())]
+        return _digest(sources, current_app.config['POSTS_PER_PAGE'], current_app.config['COMMENTS_PER_PAGE'])
+
+    def build(self):
+        posts = db.session.execute(
+            select(Post.id, Post.slug, Post.published_at, Post.updated_at, Post.comment_count, Post.featured_image)
+            .where(Post.is_published == True).order_by(desc(Post.published_at), desc(Post.id))).all()
+        tags = {row.id: row for row in db.session.execute(
+            select(Tag.id, Tag.name, Tag.slug, Tag.color, Tag.post_count))}
+        tags_by_post = defaultdict(list)
+        for post_id, tag_id in db.session.execute(
+                select(post_tags.c.post_id, post_tags.c.tag_id).join(Post, Post.id == post_tags.c.post_id)
+                .where(Post.is_published == True).order_by(post_tags.c.post_id, post_tags.c.tag_id)):
+            tags_by_post[post_id].append(tag_id)
+        last_comment = dict(db.session.execute(
+            select(Comment.post_id, func.max(Comment.created_at))
+            .where(Comment.is_approved == True).group_by(Comment.post_id)).all())
+
+        templates = self._templates_digest()
+        cloud = _digest(sorted(((-tag.post_count, tag.id, tuple(tag)) for tag in tags.values()))[:20])
+        recent = _digest(db.session.execute(
+            select(Post.id, Post.title, Post.updated_at).where(Post.is_published == True)
+            .order_by(desc(Post.created_at)).limit(5)).all())
+        # 详情页的"相关文章"是按ID取的前几篇已发布文章
+        related = _digest(db.session.execute(
+            select(Post.id, Post.title, Post.updated_at).where(Post.is_published == True)
+            .order_by(Post.id).limit(6)).all())
+
+        def item(post):
+            # 上传的特色图片在缩略图生成之后输出的标签不同，文章本身没有修改也要重新渲染
+            image = uploaded_name(post.featured_image)
+            return (post.id, post.slug, post.updated_at, post.comment_count,
+                    tuple(tuple(tags[tag_id]) for tag_id in tags_by_post[post.id]),
+                    image and image_store.manifest(image) is not None)
+
+        items = {post.id: item(post) for post in posts}
+
+        for post in posts:
+            if not _safe_segment(post.slug):
+                self.skipped.append(f'文章 {post.slug!r}')
+                continue
+            self.pages[f'post/{post.slug}/index.html'] = (
+                url_for('post.detail', slug=post.slug), {},
+                _digest(templates, related, items[post.id], last_comment.get(post.id)))
+
+        listed = [post for post in posts if post.published_at is not None]  # 游标分页的列表页不包含没有发布时间的文章
+        self._listing(listed, items, 'main.index', '/', {}, (templates, cloud, recent))
+        self._listing(listed, items, 'post.index', '/post/', {}, (templates, cloud))
+
+        by_tag = defaultdict(list)
+        for post in listed:  # posts已经按列表页的顺序排好，每个标签下的文章保持同样的顺序
+            for tag_id in tags_by_post[post.id]:
+                by_tag[tag_id].append(post)
+        for tag_id, tagged in by_tag.items():
+            tag = tags[tag_id]
+            if not _safe_segment(tag.slug):
+                self.skipped.append(f'标签 {tag.slug!r}')
+                continue
+            route = f'/post/tag/{tag.slug}/'
+            self.site_links[str(escape(url_for('post.index', tag=tag.slug)))] = self._href(route)
+            self._listing(tagged, items, 'post.index', route, {'tag': tag.slug}, (templates, cloud))
+        return self
+
+    def _listing(self, posts, items, endpoint, route, args, context):
+        """
+        把一个列表按每页POSTS_PER_PAGE篇切成若干页
+        第n页的动态URL是以第n-1页最后一篇文章为界的游标地址，与用户翻页时访问的地址相同；
+        页面中的"上一页/下一页/首页"链接改写为相邻页的静态路径
+        """
+        per_page = current_app.config['POSTS_PER_PAGE']
+        pages = [posts[start:start + per_page] for start in range(0, len(posts), per_page)] or [[]]
+
+        def page_route(number):
+            return route if number == 1 else f'{route}page/{number}/'
+
+        for number, page in enumerate(pages, start=1):
+            links = {str(escape(url_for(endpoint, **args))): self._href(route)}
+            url = url_for(endpoint, **args)
+            if number > 1:
+                url = url_for(endpoint, cursor=encode_cursor(pages[number - 2][-1], 'next'), **args)
+                prev = url_for(endpoint, cursor=encode_cursor(page[0], 'prev'), **args)
+                links[str(escape(prev))] = self._href(page_route(number - 1))
+            has_next = number < len(pages)
+            if has_next:
+                following = url_for(endpoint, cursor=encode_cursor(page[-1], 'next'), **args)
+                links[str(escape(following))] = self._href(page_route(number + 1))
+            self.pages[page_route(number).lstrip('/') + 'index.html'] = (
+                url, links, _digest(context, number, has_next, [items[post.id] for post in page]))
+
+
+def _load_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(output, manifest):
+    _write_atomic(os.path.join(output, MANIFEST), json.dumps(manifest, ensure_ascii=False).encode())
+
+
+def _remove_page(output, path):
+    """删除不再存在的页面，并清理因此变空的目录"""
+    target = os.path.join(output, path)
+    if os.path.exists(target):
+        os.remove(target)
+    directory = os.path.dirname(target)
+    while os.path.abspath(directory) != os.path.abspath(output):
+        try:
+            os.rmdir(directory)
+        except OSError:  # 目录不为空
+            break
+        directory = os.path.dirname(directory)
+
+
+def export_site(output, workers=None, full=False, echo=None):
+    """
+    把已发布的内容导出为静态页面
+    只重新渲染指纹与清单不同（或文件不存在）的页面，不再存在的页面被删除；
+    页面在进程池中渲染，每个文件原子写入，清单定期保存，中断后再次执行会跳过已完成的页面
+    full=True时忽略清单，重新渲染全部页面
+    返回 {'pages', 'rendered', 'removed', 'failed', 'skipped', 'seconds'}
+    """
+    echo = echo or (lambda message: None)
+    started = time.perf_counter()
+    output = os.path.abspath(output)
+    os.makedirs(output, exist_ok=True)
+
+    app = current_app._get_current_object()
+    with app.test_request_context():
+        plan = SitePlan().build()
+    manifest = {} if full else _load_manifest(output)
+
+    removed = [path for path in manifest if path not in plan.pages]
+    for path in removed:
+        _remove_page(output, path)
+        del manifest[path]
+    tasks = [(url, path, links) for path, (url, links, fingerprint) in plan.pages.items()
+             if manifest.get(path) != fingerprint or not os.path.exists(os.path.join(output, path))]
+    echo(f'共 {len(plan.pages)} 个页面，需要渲染 {len(tasks)} 个，删除 {len(removed)} 个'
+         f'（规划用时 {time.perf_counter() - started:.1f} 秒）')
+
+    failed = []
+    if tasks:
+        workers = workers or os.cpu_count() or 1
+        db.session.close()  # 归还连接，渲染进程fork后各自建立连接
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                       initializer=_init_worker, initargs=(app, plan.site_links, output))
+        with executor:
+            chunksize = max(1, min(50, len(tasks) // (workers * 8)))
+            last_report = time.perf_counter()
+            for done, (path, status) in enumerate(executor.map(_render_page, tasks, chunksize=chunksize), start=1):
+                if status == 200:
+                    manifest[path] = plan.pages[path][2]
+                else:
+                    manifest.pop(path, None)
+                    failed.append((path, status))
+                if time.perf_counter() - last_report >= REPORT_INTERVAL:
+                    _save_manifest(output, manifest)
+                    elapsed = time.perf_counter() - started
+                    echo(f'已渲染 {done}/{len(tasks)} 个页面（{done / elapsed:.0f} 页/秒）')
+                    last_report = time.perf_counter()
+    _save_manifest(output, manifest)
+
+    return {'pages': len(plan.pages), 'rendered': len(tasks) - len(failed), 'removed': len(removed),
+            'failed': failed, 'skipped': plan.skipped, 'seconds': time.perf_counter() - started}
+
+
+@export_cli.command('static')
+@click.argument('output', type=click.Path(file_okay=False))
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认为CPU核数')
+@click.option('--full', is_flag=True, help='忽略上次导出的清单，重新生成全部页面（例如升级了依赖库）')
+def export_static(output, workers, full):
+    """把首页、文章列表、标签列表和全部已发布文章导出为静态HTML，只重新生成有变化的页面"""
+    result = export_site(output, workers=workers, full=full, echo=click.echo)
+    for item in result['skipped']:
+        click.echo(f'跳过：{item} 不能用作目录名')
+    for path, status in result['failed']:
+        click.echo(f'渲染失败：{path}（HTTP {status}）', err=True)
+    click.echo(f'渲染了 {result["rendered"]} 个页面，删除了 {result["removed"]} 个，'
+               f'共 {result["pages"]} 个页面，用时 {result["seconds"]:.1f} 秒')
+    if result['failed']:
+        raise SystemExit(1)
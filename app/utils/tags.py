@@ -0,0 +1,110 @@
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models.post import Tag, post_tags
+from app.utils.helpers import slugify
+from app.utils.slugs import save_with_unique_slug
+
+MAX_TAG_LENGTH = 50  # 与tags.name、tags.slug字段长度一致
+
+
+def parse_tag_names(text):
+    """把逗号分隔的标签字符串拆成去重后的标签名列表，保持原有顺序"""
+    names = []
+    seen = set()
+    for name in (text or '').split(','):
+        name = name.strip()[:MAX_TAG_LENGTH]
+        if name and name.casefold() not in seen:
+            seen.add(name.casefold())
+            names.append(name)
+    return names
+
+
+def _insert_ignore(table):
+    """插入时跳过违反唯一约束的行，用于处理并发创建同名标签的竞争"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with('IGNORE')  # MySQL / MariaDB
+
+
+def _match(tags, names):
+    """
+    按名称匹配查询到的标签
+    MySQL的默认排序规则不区分大小写，'Flask'可能查到名为'flask'的标签，所以再按casefold匹配一次
+    """
+    exact = {tag.name: tag for tag in tags}
+    folded = {tag.name.casefold(): tag for tag in tags}
+    return {name: exact.get(name) or folded.get(name.casefold()) for name in names}
+
+
+def _existing_tag(name):
+    """加锁读取名为name的标签，插入标签违反唯一约束后用来找到并发事务创建的同名标签"""
+    return _match(Tag.query.filter(Tag.name == name).with_for_update(read=True).all(), [name])[name]
+
+
+def resolve_tags(names):
+    """
+    把标签名解析成Tag对象，不存在的标签批量创建
+    无论多少个标签，固定为：一次IN查询、一次批量插入、一次补查
+    并发请求同时创建同名标签时，插入会跳过冲突的行，补查会读到对方提交的标签
+    返回与names顺序一致的Tag列表
+    """
+    if not names:
+        return []
+
+    found = _match(Tag.query.filter(Tag.name.in_(names)).all(), names)
+    missing = [name for name in names if found[name] is None]
+
+    if missing:
+        rows = [{'name': name, 'slug': slugify(name)[:MAX_TAG_LENGTH]} for name in missing]
+        rows = [row for row in rows if row['slug']]  # 全是符号的标签名没有slug，留给下面单独分配
+        if rows:
+            db.session.execute(_insert_ignore(Tag.__table__), rows)
+        # 加锁读取，确保能读到并发事务刚提交的标签（InnoDB的普通读只能看到事务开始时的快照）
+        created = Tag.query.filter(Tag.name.in_(missing)).with_for_update(read=True).all()
+        found.update({name: tag for name, tag in _match(created, missing).items() if tag is not None})
+
+        # 名称不同但slug相同（例如'C++'和'C'）的标签会被唯一约束跳过，换一个带编号的slug重新创建；
+        # 这期间其他请求先创建了同名标签时，直接使用那个标签
+        for name in missing:
+            if found[name] is None:
+                found[name] = save_with_unique_slug(Tag(name=name), Tag.slug, slugify(name), default='tag',
+                                                    existing=lambda name=name: _existing_tag(name))
+
+    return [found[name] for name in names]
+
+
+def sync_post_tags(post, tags, new=False):
+    """
+    把文章的标签更新为tags，只写入变化的部分
+    只新增缺少的post_tags行、只删除不再需要的行，标签没有变化时不产生任何写操作
+    new=True表示刚创建的文章，省去读取现有标签的查询
+    返回 (新增的tag_id列表, 删除的tag_id列表)
+    """
+    if post.id is None:
+        db.session.flush()
+
+    current = set()
+    if not new:
+        current = set(db.session.scalars(
+            select(post_tags.c.tag_id).where(post_tags.c.post_id == post.id)))
+
+    wanted = [tag.id for tag in tags]
+    added = [tag_id for tag_id in wanted if tag_id not in current]
+    removed = sorted(current - set(wanted))
+
+    if removed:
+        db.session.execute(delete(post_tags).where(post_tags.c.post_id == post.id,
+                                                   post_tags.c.tag_id.in_(removed)))
+    if added:
+        db.session.execute(insert(post_tags), [{'post_id': post.id, 'tag_id': tag_id} for tag_id in added])
+
+    # 直接设置关系的已加载状态，让post.tags与数据库一致，又不会被ORM当作修改再写一遍
+    set_committed_value(post, 'tags', list(tags))
+    return added, removed
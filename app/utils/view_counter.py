@@ -0,0 +1,141 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam, func, update
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    文章浏览量的写后（write-behind）缓冲计数器
+
+    每次浏览只在内存中累加，由后台线程定期把累计值合并成一批
+    UPDATE posts SET view_count = view_count + n 写回数据库。
+    同一进程内的所有线程共享一个缓冲区；多个工作进程各自缓冲，
+    因为写回语句是增量累加的，所以不会互相覆盖。
+    进程异常退出时最多丢失一个刷新间隔（或 max_pending 次）的浏览量，
+    正常退出时会在 atexit 中做最后一次刷新。
+    """
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = None
+        self.interval = 5
+        self.max_pending = 1000
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = Counter()   # 尚未写回的增量 {post_id: n}
+        self._inflight = Counter()  # 正在写回的增量，写回期间读者仍应看到
+        self._pending_total = 0
+        self._thread = None
+        self._atexit_registered = False
+
+        # 进程fork后子进程不能继承父进程的缓冲区和后台线程
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """与Flask应用和数据库实例关联，用法与migrate.init_app(app, db)一致"""
+        self.app = app
+        self.db = db
+        self.interval = app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 5)
+        self.max_pending = app.config.get('VIEW_COUNT_MAX_PENDING', 1000)
+        self.enabled = app.config.get('VIEW_COUNT_ENABLED', True)
+        app.extensions['view_counter'] = self
+
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def incr(self, post_id, n=1):
+        """记录一次（或n次）浏览，只写内存；关闭计数时（例如静态导出渲染页面时）什么都不做"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending[post_id] += n
+            self._pending_total += n
+            should_flush = self._pending_total >= self.max_pending
+        self._ensure_thread()
+        if should_flush:
+            self._wakeup.set()
+
+    def local_pending(self, post_id):
+        """
+        返回某篇文章在当前进程中尚未写入数据库的浏览量
+        每个工作进程各有一个缓冲区，这里只包含本进程的部分，不是全站未写回的总数；
+        在命令行等没有处理浏览请求的进程中总是0
+        """
+        with self._lock:
+            return self._pending.get(post_id, 0) + self._inflight.get(post_id, 0)
+
+    def flush(self):
+        """
+        把缓冲区中的增量一次性写回数据库
+        返回写回的浏览次数；写回失败时增量会放回缓冲区等待下次重试
+        """
+        if self.app is None:
+            return 0
+
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, Counter()
+            self._pending_total = 0
+            self._inflight.update(batch)
+
+        try:
+            with self.app.app_context():
+                posts = self.db.metadata.tables['posts']
+                # updated_at显式保持原值，浏览量变化不应该算作文章被修改
+                stmt = (update(posts)
+                        .where(posts.c.id == bindparam('post_id'))
+                        .values(view_count=func.coalesce(posts.c.view_count, 0) + bindparam('delta'),
+                                updated_at=posts.c.updated_at))
+                with self.db.engine.begin() as conn:
+                    conn.execute(stmt, [{'post_id': post_id, 'delta': delta}
+                                        for post_id, delta in batch.items()])
+        except Exception:
+            logger.exception('浏览量写回失败，%d 篇文章的增量将在下次重试', len(batch))
+            with self._lock:
+                self._inflight.subtract(batch)
+                self._inflight += Counter()  # 去掉计数为0的键
+                self._pending.update(batch)
+                self._pending_total += sum(batch.values())
+            return 0
+
+        with self._lock:
+            self._inflight.subtract(batch)
+            self._inflight += Counter()
+        return sum(batch.values())
+
+    def _ensure_thread(self):
+        """懒启动后台刷新线程，这样prefork服务器的每个工作进程在fork之后各自启动"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = Counter()
+        self._inflight = Counter()
+        self._pending_total = 0
+        self._thread = None
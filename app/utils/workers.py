@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def lower_priority(increment):
+    """工作进程的初始化函数：调低调度优先级，CPU紧张时优先处理页面请求"""
+    if increment and hasattr(os, 'nice'):
+        os.nice(increment)
+
+
+class BoundedProcessPool:
+    """
+    给CPU密集任务（密码哈希、生成缩略图）用的后台进程池
+
+    - 工作进程用spawn启动，避免在多线程的Web进程中fork，并以较低的优先级（nice）运行
+    - 用信号量限制已提交还没结束的任务数，达到max_pending时try_submit直接返回None，
+      由调用方决定是返回503还是跳过，而不是让请求无限排队
+    - 进程池在第一次提交时才创建；gunicorn等fork出的子进程会丢弃从父进程继承的进程池和锁，重新创建
+    - 工作进程意外退出（被OOM killer杀掉、段错误）后ProcessPoolExecutor会永久不可用，
+      这时丢弃它，下一次提交重新创建；受影响的任务的Future以BrokenProcessPool结束
+
+    workers为0时不创建进程池，调用方应在当前线程中直接执行
+    """
+
+    def __init__(self, workers=0, max_pending=16, nice=10):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.configure(workers, max_pending, nice)
+
+        # 进程池和它的管理线程不能跨fork使用，子进程需要重新创建
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def configure(self, workers, max_pending, nice):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _reset_after_fork(self):
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=lower_priority, initargs=(self.nice,))
+            return self._executor
+
+    def _discard(self, executor):
+        """丢弃已经损坏的进程池；其他线程已经换上新进程池时不做处理"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, args):
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # 上一个任务结束时进程池已经损坏，换一个新的进程池重新提交一次
+            self._discard(executor)
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+
+        def done(future):
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._discard(executor)
+        future.add_done_callback(done)
+        return future
+
+    def try_submit(self, fn, *args):
+        """
+        提交任务并返回Future；排队的任务已达max_pending时返回None
+        名额在任务真正结束时归还，调用方等待超时放弃的任务仍然占着名额
+        """
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._submit(fn, args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
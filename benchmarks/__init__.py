@@ -0,0 +1,5 @@
+"""
+性能基准脚本
+每个脚本都可以用 python -m benchmarks.<名称> 运行，默认在临时SQLite数据库上执行，
+也可以用 --database-url 指向一个空的MySQL库
+"""
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+
+def make_app(database_url=None, **overrides):
+    """
+    创建用于基准测试的应用
+    不指定database_url时使用临时SQLite文件，返回 (app, 清理函数)
+    """
+    from app import create_app, db
+
+    tmp_path = None
+    if database_url is None:
+        fd, tmp_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = f'sqlite:///{tmp_path}'
+
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'PAGE_CACHE_BACKEND': 'null',
+        'CACHE_VERSION_BACKEND': 'memory',
+    }
+    settings.update(overrides)
+    app = create_app(type('BenchmarkConfig', (Config,), settings))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    def cleanup():
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        if tmp_path:
+            os.unlink(tmp_path)
+
+    return app, cleanup
+
+
+def create_user(db, username='bench'):
+    from app.models.user import User
+
+    user = User(username=username, email=f'{username}@example.com')
+    user.password_hash = 'x'
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@contextmanager
+def timer():
+    """记录代码块的耗时（秒），结果在退出后通过 elapsed['seconds'] 读取"""
+    elapsed = {}
+    start = time.perf_counter()
+    try:
+        yield elapsed
+    finally:
+        elapsed['seconds'] = time.perf_counter() - start
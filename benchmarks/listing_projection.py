@@ -0,0 +1,137 @@
+"""
+列表页加载基准：文章很多、正文很长时，一页列表的内存占用和耗时
+
+对比三种加载方式，每种都按游标连续翻若干页，每页结束时像请求结束一样清空会话，
+耗时和内存峰值（tracemalloc）分两遍测量：
+  full      加载完整的Post对象并带上正文（延迟加载content之前的做法）
+  deferred  加载Post对象，正文保持延迟加载
+  cards     app.utils.post_cards只选择卡片需要的列，返回PostCard
+运行：
+
+    python -m benchmarks.listing_projection --posts 100000 --content-size 4000
+"""
+import argparse
+import random
+import statistics
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, selectinload, undefer
+
+from benchmarks.common import make_app, create_user, timer
+
+BATCH_SIZE = 5000
+
+
+def _seed(db, user_id, count, content_size):
+    """写入count篇已发布的文章，每篇content_size个字符的正文和同样长度的content_html，每篇两个标签"""
+    from app.models.post import Post, Tag, post_tags
+
+    rng = random.Random(42)
+    tags = [Tag(name=f'tag{i}', slug=f'tag{i}') for i in range(50)]
+    db.session.add_all(tags)
+    db.session.commit()
+    tag_ids = [tag.id for tag in tags]
+
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', '文章', '内容', '博客']
+    paragraph = ' '.join(rng.choice(words) for _ in range(content_size // 5))[:content_size]
+    base = datetime(2020, 1, 1)
+    for start in range(0, count, BATCH_SIZE):
+        rows = []
+        links = []
+        for i in range(start, min(start + BATCH_SIZE, count)):
+            published_at = base + timedelta(minutes=i)
+            rows.append({'id': i + 1, 'title': f'Post {i}', 'slug': f'post-{i}', 'content': paragraph,
+                         'content_html': f'<p>{paragraph}</p>', 'excerpt': paragraph[:200], 'reading_time': 1,
+                         'is_published': True, 'user_id': user_id, 'view_count': i % 1000,
+                         'created_at': published_at, 'updated_at': published_at, 'published_at': published_at})
+            links.extend({'post_id': i + 1, 'tag_id': tag_id} for tag_id in rng.sample(tag_ids, 2))
+        db.session.execute(insert(Post.__table__), rows)
+        db.session.execute(insert(post_tags), links)
+        db.session.commit()
+
+
+def _touch(posts):
+    """模拟模板渲染一张卡片时读取的属性"""
+    for post in posts:
+        (post.title, post.slug, post.excerpt, post.published_at, post.total_views,
+         post.author.username, [tag.name for tag in post.tags])
+
+
+def _loaders():
+    from app.models.post import Post
+    from app.utils.post_cards import card_query, to_cards
+
+    def orm(*options):
+        return lambda: (Post.query.filter(Post.is_published == True)
+                        .options(joinedload(Post.author), selectinload(Post.tags), *options), None)
+
+    return [
+        ('full', orm(undefer(Post.content), undefer(Post.content_html))),
+        ('deferred', orm()),
+        ('cards', lambda: (card_query(Post.is_published == True), lambda rows: to_cards(rows, with_tags=True))),
+    ]
+
+
+def _walk(db, Post, loader, pages, per_page, trace):
+    """按游标连续翻pages页，返回每页的耗时（秒）或内存峰值（字节）"""
+    from app.utils.pagination import paginate_keyset
+
+    samples = []
+    cursor = None
+    for _ in range(pages):
+        if trace:
+            tracemalloc.start()
+        with timer() as elapsed:
+            query, transform = loader()
+            page = paginate_keyset(query, Post, cursor, per_page, transform=transform)
+            _touch(page.items)
+            cursor = page.next_cursor
+            db.session.remove()
+        if trace:
+            samples.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        else:
+            samples.append(elapsed['seconds'])
+    return samples
+
+
+def run(posts, content_size, pages, per_page, database_url=None):
+    from app import db
+    from app.models.post import Post
+
+    app, cleanup = make_app(database_url)
+    results = []
+    try:
+        with app.app_context():
+            _seed(db, create_user(db).id, posts, content_size)
+            for name, loader in _loaders():
+                # 耗时和内存分两遍测量，tracemalloc本身会明显拖慢分配
+                latencies = _walk(db, Post, loader, pages, per_page, trace=False)
+                peaks = _walk(db, Post, loader, pages, per_page, trace=True)
+                results.append((name, statistics.median(peaks) / 1024,
+                                statistics.median(latencies) * 1000, max(latencies) * 1000))
+    finally:
+        cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--content-size', type=int, default=4000, help='每篇正文的字符数')
+    parser.add_argument('--pages', type=int, default=50, help='每种方式连续翻的页数')
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    print(f'{args.posts} 篇文章，正文 {args.content_size} 字符，每页 {args.per_page} 篇，翻 {args.pages} 页')
+    print(f'{"方式":<10}{"峰值内存KB/页":>16}{"中位毫秒/页":>14}{"最慢毫秒":>12}')
+    for name, peak_kb, median_ms, max_ms in run(args.posts, args.content_size, args.pages,
+                                                args.per_page, args.database_url):
+        print(f'{name:<10}{peak_kb:>16.0f}{median_ms:>14.2f}{max_ms:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+负载测试：按接近真实的访问比例请求主要路由，统计每个路由的延迟分位数、吞吐量和SQL语句数
+
+先用 benchmarks.datagen 生成数据，然后：
+
+    # 自动启动服务器（默认Gunicorn，未安装时用Flask自带的多线程服务器）
+    python -m benchmarks.loadtest --database-url sqlite:///bench.db --duration 60 --concurrency 16 \\
+        --output results/$(git rev-parse --short HEAD).json
+
+    # 测试已经在运行的服务器（需开启SQL_QUERY_COUNT_HEADER才能统计SQL语句数）
+    python -m benchmarks.loadtest --database-url mysql+pymysql://... --url http://127.0.0.1:8000
+
+--database-url用于抽取已有的文章、标签和用户作为请求参数；
+结果保存为JSON，包含提交号、参数、数据规模和每个路由的统计，便于比较不同提交的性能
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, quote
+from urllib.request import build_opener, HTTPCookieProcessor, HTTPRedirectHandler
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.datagen import EN_WORDS, ZH_WORDS, PASSWORD, _zipf_cum_weights
+from config import basedir
+
+# 默认的访问比例：大部分是匿名浏览，少量登录和评论
+MIX = {
+    'main.index': 25,
+    'post.index': 15,
+    'post.detail': 40,
+    'main.search': 10,
+    'auth.login': 5,
+    'post.add_comment': 5,
+}
+
+_CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """不跟随重定向，只测量请求本身（登录和评论成功后返回302）"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _opener():
+    return build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+
+def _fetch(opener, url, data=None):
+    """返回 (状态码, 响应体, 响应头)，4xx/5xx和3xx不抛异常"""
+    body = urlencode(data).encode() if data is not None else None
+    try:
+        with opener.open(url, body, timeout=60) as response:
+            return response.status, response.read(), response.headers
+    except HTTPError as e:
+        return e.code, e.read(), e.headers
+
+
+def _csrf_token(page):
+    match = _CSRF_RE.search(page.decode('utf-8', 'replace'))
+    return (match.group(1) or match.group(2)) if match else None
+
+
+def _login(base_url, username):
+    """
+    用新的会话登录，返回 (opener, csrf_token, 状态码, 响应头, 提交表单的耗时)
+    登录页的GET不计入耗时，只测量提交表单（包括校验密码）
+    """
+    opener = _opener()
+    _, page, _ = _fetch(opener, f'{base_url}/auth/login')
+    token = _csrf_token(page)
+    form = {'username': username, 'password': PASSWORD}
+    if token:
+        form['csrf_token'] = token
+    started = time.perf_counter()
+    status, _, headers = _fetch(opener, f'{base_url}/auth/login', form)
+    return opener, token, status, headers, time.perf_counter() - started
+
+
+class _Targets:
+    """从数据库中抽取请求参数，热门的文章和标签被访问得更多（Zipf分布）"""
+
+    def __init__(self, database_url):
+        engine = create_engine(database_url)
+        with engine.connect() as conn:
+            self.slugs = [row[0] for row in conn.execute(text(
+                'SELECT slug FROM posts WHERE is_published = 1 ORDER BY comment_count DESC, id LIMIT 5000'))]
+            self.tags = [row[0] for row in conn.execute(text(
+                'SELECT slug FROM tags ORDER BY post_count DESC, id LIMIT 200'))]
+            self.usernames = [row[0] for row in conn.execute(text('SELECT username FROM users ORDER BY id LIMIT 1000'))]
+            self.dataset = {table: conn.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                            for table in ('users', 'posts', 'comments', 'tags', 'post_tags')}
+        engine.dispose()
+        if not self.slugs or not self.usernames:
+            raise SystemExit('数据库中没有已发布的文章或用户，请先运行 python -m benchmarks.datagen')
+        self._slug_weights = _zipf_cum_weights(len(self.slugs), 1.0)
+        self._tag_weights = _zipf_cum_weights(len(self.tags), 1.0) if self.tags else None
+
+    def slug(self, rng):
+        return rng.choices(self.slugs, cum_weights=self._slug_weights)[0]
+
+    def tag(self, rng):
+        return rng.choices(self.tags, cum_weights=self._tag_weights)[0]
+
+    @staticmethod
+    def query(rng):
+        words = rng.sample(ZH_WORDS if rng.random() < 0.5 else EN_WORDS[20:], rng.randint(1, 2))
+        return ' '.join(words)
+
+
+class _Results:
+    def __init__(self):
+        self.samples = {route: [] for route in MIX}  # {路由: [(耗时秒, 状态码, SQL语句数, SQL毫秒)]}
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, status, headers):
+        queries = sql_ms = None
+        if headers is not None and headers.get('X-Query-Count'):
+            count, duration = headers['X-Query-Count'].split(';')
+            queries, sql_ms = int(count), float(duration)
+        with self._lock:
+            self.samples[route].append((seconds, status, queries, sql_ms))
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    """把原始样本汇总成每个路由的统计"""
+    routes = {}
+    for route, items in samples.items():
+        latencies = sorted(seconds * 1000 for seconds, _, _, _ in items)
+        queries = [q for _, _, q, _ in items if q is not None]
+        sql_ms = [ms for _, _, _, ms in items if ms is not None]
+        statuses = {}
+        for _, status, _, _ in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        routes[route] = {
+            'requests': len(items),
+            'errors': sum(1 for _, status, _, _ in items if status >= 500 or status == 0),
+            'statuses': statuses,
+            'throughput': round(len(items) / duration, 2),
+            'p50_ms': _round(_percentile(latencies, 0.50)),
+            'p95_ms': _round(_percentile(latencies, 0.95)),
+            'p99_ms': _round(_percentile(latencies, 0.99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+            'sql_queries_avg': _round(sum(queries) / len(queries) if queries else None),
+            'sql_queries_max': max(queries) if queries else None,
+            'sql_ms_avg': _round(sum(sql_ms) / len(sql_ms) if sql_ms else None),
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return routes, {'requests': total, 'throughput': round(total / duration, 2),
+                    'errors': sum(route['errors'] for route in routes.values())}
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def _worker(base_url, targets, seed, stop, measuring, results):
+    """一个虚拟用户：匿名浏览，按比例登录和发表评论"""
+    rng = random.Random(seed)
+    routes, weights = zip(*MIX.items())
+    browser = _opener()  # 匿名访客，可以命中整页缓存
+    member = token = None
+
+    while not stop.is_set():
+        route = rng.choices(routes, weights=weights)[0]
+        try:
+            if route == 'auth.login':
+                _, _, status, headers, elapsed = _login(base_url, rng.choice(targets.usernames))
+            else:
+                if route == 'post.add_comment':
+                    if member is None:
+                        member, token, _, _, _ = _login(base_url, rng.choice(targets.usernames))
+                    form = {'content': f'benchmark comment {rng.random():.6f}'}
+                    if token:
+                        form['csrf_token'] = token
+                    request = (member, f'{base_url}/post/{quote(targets.slug(rng))}/comment', form)
+                elif route == 'main.index':
+                    request = (browser, f'{base_url}/')
+                elif route == 'post.index':
+                    request = (browser, f'{base_url}/post/?tag={quote(targets.tag(rng))}')
+                elif route == 'post.detail':
+                    request = (browser, f'{base_url}/post/{quote(targets.slug(rng))}')
+                else:
+                    request = (browser, f'{base_url}/search?q={quote(targets.query(rng))}')
+                started = time.perf_counter()
+                status, _, headers = _fetch(*request)
+                elapsed = time.perf_counter() - started
+        except OSError:
+            status, headers, elapsed = 0, None, 0.0
+        if measuring.is_set():
+            results.add(route, elapsed, status, headers)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(database_url, server, workers, threads):
+    """在子进程中启动应用，返回 (进程, 地址)"""
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, SQL_QUERY_COUNT_HEADER='true',
+               DATABASE_REPLICA_URLS='', PYTHONPATH=basedir)
+    if server == 'gunicorn':
+        env.update(WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_ACCESS_LOG='/dev/null')
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'wsgi', 'run', '--port', str(port),
+                   '--with-threads', '--no-reload', '--no-debugger']
+    process = subprocess.Popen(command, cwd=basedir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'服务器启动失败：{" ".join(command)}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('服务器在60秒内没有启动')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(database_url, url=None, duration=30, warmup=5, concurrency=16, seed=42,
+        server='auto', workers=4, threads=4):
+    targets = _Targets(database_url)
+    process = None
+    if url is None:
+        if server == 'auto':
+            server = 'gunicorn' if shutil.which('gunicorn') else 'flask'
+        process, url = _start_server(database_url, server, workers, threads)
+    url = url.rstrip('/')
+
+    results = _Results()
+    stop = threading.Event()
+    measuring = threading.Event()
+    clients = [threading.Thread(target=_worker, args=(url, targets, seed + i, stop, measuring, results), daemon=True)
+               for i in range(concurrency)]
+    try:
+        for client in clients:
+            client.start()
+        time.sleep(warmup)  # 预热期间的请求不计入统计（模板编译、缓存填充）
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(duration)
+        measuring.clear()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for client in clients:
+            client.join(timeout=60)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    routes, total = summarize(results.samples, elapsed)
+    return {
+        'git_commit': _git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'parameters': {'duration': duration, 'warmup': warmup, 'concurrency': concurrency, 'seed': seed,
+                       'server': server if process is not None else url, 'workers': workers, 'threads': threads,
+                       'mix': MIX},
+        'dataset': targets.dataset,
+        'total': total,
+        'routes': routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', required=True, help='datagen生成的数据库，用于抽取请求参数')
+    parser.add_argument('--url', default=None, help='已经在运行的服务器地址，不指定时自动启动')
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'flask'), default='auto')
+    parser.add_argument('--workers', type=int, default=4, help='自动启动Gunicorn时的工作进程数')
+    parser.add_argument('--threads', type=int, default=4, help='自动启动Gunicorn时每个进程的线程数')
+    parser.add_argument('--duration', type=int, default=30, help='统计时长（秒）')
+    parser.add_argument('--warmup', type=int, default=5, help='预热时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发的虚拟用户数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='结果JSON文件路径')
+    args = parser.parse_args()
+
+    report = run(args.database_url, url=args.url, duration=args.duration, warmup=args.warmup,
+                 concurrency=args.concurrency, seed=args.seed, server=args.server,
+                 workers=args.workers, threads=args.threads)
+
+    print(f'提交 {report["git_commit"]}  总吞吐量 {report["total"]["throughput"]} 请求/秒  '
+          f'错误 {report["total"]["errors"]}')
+    print(f'{"路由":<18}{"请求数":>8}{"请求/秒":>10}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL/次":>8}{"SQL ms":>9}')
+    for route, stats in report['routes'].items():
+        print(f'{route:<18}{stats["requests"]:>8}{stats["throughput"]:>10}'
+              + ''.join(f'{"-" if stats[key] is None else stats[key]:>9}' for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+              + f'{"-" if stats["sql_queries_avg"] is None else stats["sql_queries_avg"]:>8}'
+              + f'{"-" if stats["sql_ms_avg"] is None else stats["sql_ms_avg"]:>9}')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'结果已保存到 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+登录风暴基准：大量并发登录时首页（main.index）的响应时间
+
+应用在独立进程中用多线程WSGI服务器运行，另一个进程里的一组线程持续提交登录表单，
+主进程按顺序请求首页并记录延迟。分别测量：
+    idle    没有登录请求
+    inline  在请求线程中计算哈希（PASSWORD_HASH_WORKERS=0，即原来的做法）
+    pool    在进程池中计算哈希，队列满时返回503
+运行：
+
+    python -m benchmarks.login_storm --duration 10 --attackers 32
+"""
+import argparse
+import http.client
+import logging
+import multiprocessing
+import statistics
+import threading
+import time
+from urllib.parse import urlencode
+
+from benchmarks.common import make_app, create_user, timer
+
+USERNAME = 'storm'
+PASSWORD = 'correct horse'
+
+
+def _request(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+
+def _serve(workers, database_url, ready, stop):
+    """服务器进程：建库、写入数据，然后在后台线程中运行WSGI服务器直到收到stop"""
+    from werkzeug.serving import make_server
+    from app import db, password_hasher
+    from app.models.post import Post
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('app.utils.passwords').setLevel(logging.ERROR)
+
+    app, cleanup = make_app(database_url, PASSWORD_HASH_WORKERS=workers, PAGE_CACHE_BACKEND='null')
+    with app.app_context():
+        user = create_user(db, USERNAME)
+        user.set_password(PASSWORD)
+        for i in range(20):
+            db.session.add(Post(title=f'Storm post {i}', slug=f'storm-{i}', content='content ' * 50,
+                                is_published=True, user_id=user.id))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put(server.server_port)
+    stop.wait()
+    server.shutdown()
+    password_hasher.shutdown()
+    cleanup()
+
+
+def _attack(port, attackers, stop, results):
+    """攻击进程：attackers个线程不停地登录，结束时汇报各状态码的次数"""
+    statuses = []
+    body = urlencode({'username': USERNAME, 'password': PASSWORD})
+
+    def loop():
+        while not stop.is_set():
+            statuses.append(_request(port, 'POST', '/auth/login', body))
+
+    threads = [threading.Thread(target=loop) for _ in range(attackers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((statuses.count(302), statuses.count(503)))
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000 if values else 0.0
+
+
+def run_scenario(attackers, duration, workers, database_url=None):
+    ctx = multiprocessing.get_context('spawn')
+    ready, stop, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+    server = ctx.Process(target=_serve, args=(workers, database_url, ready, stop))
+    server.start()
+    port = ready.get(timeout=60)
+
+    # 预热：让进程池启动工作进程
+    _request(port, 'GET', '/')
+    if attackers:
+        _request(port, 'POST', '/auth/login', urlencode({'username': USERNAME, 'password': PASSWORD}))
+
+    attack_stop = ctx.Event()
+    attacker = ctx.Process(target=_attack, args=(port, attackers, attack_stop, results))
+    if attackers:
+        attacker.start()
+        time.sleep(1)  # 等登录请求堆积起来
+
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        with timer() as elapsed:
+            _request(port, 'GET', '/')
+        latencies.append(elapsed['seconds'])
+
+    logins_ok = logins_rejected = 0
+    if attackers:
+        attack_stop.set()
+        logins_ok, logins_rejected = results.get(timeout=120)
+        attacker.join()
+    stop.set()
+    server.join()
+
+    return {
+        'index_requests': len(latencies),
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'logins_ok': logins_ok,
+        'logins_rejected': logins_rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=10, help='每个场景持续的秒数')
+    parser.add_argument('--attackers', type=int, default=32, help='并发登录线程数')
+    parser.add_argument('--workers', type=int, default=2, help='pool场景的哈希进程数')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    scenarios = [('idle', 0, 0), ('inline', args.attackers, 0), ('pool', args.attackers, args.workers)]
+    print(f'{"场景":<8}{"首页请求":>8}{"p50":>9}{"p95":>9}{"p99":>9}{"登录成功":>10}{"拒绝(503)":>10}')
+    for name, attackers, workers in scenarios:
+        result = run_scenario(attackers, args.duration, workers, args.database_url)
+        print(f'{name:<8}{result["index_requests"]:>10}{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+              f'{result["p99_ms"]:>9.1f}{result["logins_ok"]:>12}{result["logins_rejected"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
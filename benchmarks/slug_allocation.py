@@ -0,0 +1,80 @@
+"""
+slug分配基准：大量文章标题相同时，创建一篇新文章需要多少次查询、多少时间
+
+对比原来的逐个尝试（slug、slug-1、slug-2……每个候选一次查询）和
+app.utils.slugs的一次前缀查询。运行：
+
+    python -m benchmarks.slug_allocation --collisions 10 100 1000
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from benchmarks.common import make_app, create_user, timer
+
+TITLE = 'Hello World'
+
+
+def legacy_allocate(Post, slug):
+    """原来post.create中的写法，作为对照"""
+    counter = 1
+    original_slug = slug
+    while Post.query.filter_by(slug=slug).first():
+        slug = f'{original_slug}-{counter}'
+        counter += 1
+    return slug
+
+
+def _seed_collisions(db, Post, user_id, count):
+    """写入count篇slug为hello-world、hello-world-1……的文章"""
+    db.session.execute(Post.__table__.delete())
+    rows = [{'title': TITLE, 'slug': 'hello-world' if i == 0 else f'hello-world-{i}', 'content': 'x',
+             'is_published': True, 'user_id': user_id, 'view_count': 0,
+             'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()} for i in range(count)]
+    if rows:
+        db.session.execute(insert(Post.__table__), rows)
+    db.session.commit()
+
+
+def run(collisions, repeat, database_url=None):
+    from app import db
+    from app.models.post import Post
+    from app.utils.helpers import slugify
+    from app.utils.query_stats import count_queries
+    from app.utils.slugs import allocate_slug
+
+    app, cleanup = make_app(database_url)
+    results = []
+    try:
+        with app.app_context():
+            user_id = create_user(db).id
+            for count in collisions:
+                _seed_collisions(db, Post, user_id, count)
+                for name, allocate in [('legacy', lambda: legacy_allocate(Post, slugify(TITLE))),
+                                       ('prefix', lambda: allocate_slug(Post.slug, slugify(TITLE)))]:
+                    with count_queries() as stats, timer() as elapsed:
+                        for _ in range(repeat):
+                            slug = allocate()
+                    db.session.rollback()
+                    assert slug == f'hello-world-{count}' if count else slug == 'hello-world'
+                    results.append((count, name, stats.count / repeat, elapsed['seconds'] / repeat * 1000))
+    finally:
+        cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--collisions', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    print(f'{"已有同名":>8}  {"方式":<8}{"查询/次":>10}{"毫秒/次":>12}')
+    for count, name, queries, ms in run(args.collisions, args.repeat, args.database_url):
+        print(f'{count:>8}  {name:<8}{queries:>10.0f}{ms:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
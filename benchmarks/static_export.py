@@ -0,0 +1,98 @@
+"""
+静态导出基准：全量导出和增量导出的耗时
+
+用benchmarks.datagen生成数据（或使用已有的库），依次测量：
+  full         空目录，渲染全部页面
+  unchanged    数据没有变化，只计算指纹
+  incremental  修改--changed篇文章的标题、给同样数量的文章各加一条评论后再次导出
+运行：
+
+    python -m benchmarks.static_export --posts 100000 --workers 8
+    python -m benchmarks.static_export --database-url sqlite:///bench.db --workers 8
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime
+
+from config import Config
+
+
+def _modify(app, changed, seed):
+    """随机修改changed篇已发布文章的标题，再给另外changed篇文章各加一条评论"""
+    from sqlalchemy import select
+    from app import db
+    from app.models.post import Post, Comment
+    from app.utils import counters
+
+    rng = random.Random(seed)
+    with app.app_context():
+        ids = db.session.scalars(select(Post.id).where(Post.is_published == True)).all()
+        for post in Post.query.filter(Post.id.in_(rng.sample(ids, min(changed, len(ids))))):
+            post.title = f'{post.title} (修订)'
+        for post_id in rng.sample(ids, min(changed, len(ids))):
+            comment = Comment(content='静态导出基准', user_id=1, post_id=post_id, is_approved=True,
+                              created_at=datetime.utcnow())
+            db.session.add(comment)
+            counters.comment_added(comment)
+        db.session.commit()
+
+
+def run(app, output, workers, changed, seed):
+    from app.utils.static_export import export_site
+
+    results = {}
+
+    def measure(name, **kwargs):
+        with app.app_context():
+            result = export_site(output, workers=workers, **kwargs)
+        results[name] = result
+        print(f'{name:<12}共 {result["pages"]:>7} 页  渲染 {result["rendered"]:>7} 页  '
+              f'用时 {result["seconds"]:>7.1f} 秒  ({result["rendered"] / result["seconds"]:.0f} 页/秒)', flush=True)
+
+    measure('full', full=True)
+    measure('unchanged')
+    _modify(app, changed, seed)
+    measure('incremental')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', help='使用已有的库（例如datagen生成的库），不指定时生成临时SQLite库')
+    parser.add_argument('--posts', type=int, default=100000, help='生成的文章数')
+    parser.add_argument('--workers', type=int, default=None, help='渲染进程数，默认为CPU核数')
+    parser.add_argument('--changed', type=int, default=100, help='增量导出前修改的文章数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    from benchmarks import datagen
+
+    tmp_db = None
+    database_url = args.database_url
+    if database_url is None:
+        fd, tmp_db = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = f'sqlite:///{tmp_db}'
+    output = tempfile.mkdtemp(prefix='static-export-')
+    app = create_app(type('ExportConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'PASSWORD_HASH_WORKERS': 0,
+        'SQLALCHEMY_BINDS': {},
+    }))
+    try:
+        if tmp_db:
+            datagen.generate(app, users=max(10, args.posts // 100), posts=args.posts, comments=args.posts * 10,
+                             tags=max(10, args.posts // 200), seed=args.seed, search_index=False)
+        run(app, output, args.workers, args.changed, args.seed)
+    finally:
+        shutil.rmtree(output)
+        if tmp_db:
+            os.unlink(tmp_db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+工作进程启动基准：一个新的工作进程从启动到处理完第一个请求要花多少时间
+
+在一个已经执行过全部迁移的临时SQLite库上，对比三种启动方式（各在独立的进程中测量）：
+  cold          新解释器中导入应用并执行create_app（没有preload_app的Gunicorn工作进程）
+  cold+upgrade  同上，再加上原来run.py在每次启动时执行的upgrade()
+  preload       父进程已经执行过create_app、配置好ORM映射并编译好模板，fork出的子进程重置连接后直接处理请求
+                （wsgi.py + gunicorn.conf.py的方式）
+运行：
+
+    python -m benchmarks.worker_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import Config, basedir
+
+MODES = ('cold', 'cold+upgrade', 'preload')
+URL = '/'
+
+
+def _config(database_url):
+    return type('StartupConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'PAGE_CACHE_BACKEND': 'null',  # 每个请求都真正访问数据库和渲染模板
+    })
+
+
+def _prepare(database_url):
+    """在临时库上执行全部迁移并写入几篇文章"""
+    from datetime import datetime
+    from flask_migrate import upgrade
+    from app import create_app, db
+    from app.models.post import Post
+    from benchmarks.common import create_user
+
+    app = create_app(_config(database_url))
+    with app.app_context():
+        upgrade(directory=os.path.join(basedir, 'migrations'))
+        user = create_user(db)
+        for i in range(20):
+            db.session.add(Post(title=f'Post {i}', slug=f'post-{i}', content='hello ' * 200, excerpt='hello',
+                                is_published=True, user_id=user.id, published_at=datetime.utcnow()))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def _serve(app, timings):
+    """记录第一个请求（冷）和第二个请求（热）的耗时"""
+    client = app.test_client()
+    for name in ('first_request', 'warm_request'):
+        start = time.perf_counter()
+        response = client.get(URL)
+        timings[name] = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+
+
+def _child(mode, database_url):
+    """在新的解释器中执行，按mode测量各阶段耗时，以JSON输出到stdout"""
+    timings = {}
+    start = time.perf_counter()
+    from app import create_app, db
+    timings['import'] = time.perf_counter() - start
+
+    step = time.perf_counter()
+    app = create_app(_config(database_url))
+    timings['create_app'] = time.perf_counter() - step
+
+    if mode == 'cold+upgrade':
+        from flask_migrate import upgrade
+        step = time.perf_counter()
+        with app.app_context():
+            upgrade(directory=os.path.join(basedir, 'migrations'))
+        timings['upgrade'] = time.perf_counter() - step
+
+    if mode == 'preload':
+        # 父进程的导入、create_app和prepare_for_fork由Gunicorn主进程承担，只统计fork之后的部分
+        from app.utils.db_pool import dispose_after_fork
+        from app.utils.startup import prepare_for_fork
+        prepare_for_fork(app)
+        read_fd, write_fd = os.pipe()
+        step = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            timings = {'fork': time.perf_counter() - step}
+            step = time.perf_counter()
+            dispose_after_fork(app, db)
+            timings['post_fork'] = time.perf_counter() - step
+            _serve(app, timings)
+            os.write(write_fd, json.dumps(timings).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            timings = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+    else:
+        _serve(app, timings)
+    print(json.dumps(timings))
+
+
+def run(repeat):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    database_url = f'sqlite:///{path}'
+    results = {}
+    try:
+        _prepare(database_url)
+        for mode in MODES:
+            samples = []
+            for _ in range(repeat):
+                output = subprocess.run([sys.executable, '-m', 'benchmarks.worker_startup', '--child', mode,
+                                         '--database-url', database_url],
+                                        cwd=basedir, check=True, capture_output=True, text=True).stdout
+                samples.append(json.loads(output.strip().splitlines()[-1]))
+            results[mode] = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+    finally:
+        os.unlink(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.database_url)
+        return
+
+    print(f'每种方式启动 {args.repeat} 次，取中位数（毫秒），总计为启动到第一个请求完成')
+    for mode, timings in run(args.repeat).items():
+        total = sum(value for key, value in timings.items() if key != 'warm_request')
+        steps = '  '.join(f'{key} {value * 1000:.1f}' for key, value in timings.items())
+        print(f'{mode:<14}总计 {total * 1000:>7.1f}   {steps}')
+
+
+if __name__ == '__main__':
+    main()
@@ -35,14 +35,106 @@ class Config:
     
     # 是否追踪数据库修改，设为False可以提高性能
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 只读副本配置
+    # DATABASE_REPLICA_URLS是逗号分隔的副本连接URI，GET请求中的只读查询轮流发到这些副本，
+    # 写入、非GET请求和写入之后REPLICA_STICKY_SECONDS秒内同一用户的请求都使用主库
+    DATABASE_REPLICA_URLS = [url.strip() for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica{i}': url for i, url in enumerate(DATABASE_REPLICA_URLS)}
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 5)    # 写入后读主库的时间（秒），应大于正常的复制延迟
+    REPLICA_HEALTH_INTERVAL = int(os.environ.get('REPLICA_HEALTH_INTERVAL') or 10)  # 副本健康检查的间隔（秒）
+    REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG') or 30)  # MySQL副本复制延迟超过多少秒时暂停使用
+
+    # 数据库连接池配置（主库和只读副本各有一个连接池，SQLite不使用这些参数）
+    # 每个工作进程的最大连接数为 DB_POOL_SIZE + DB_MAX_OVERFLOW，所有进程合计不能超过MySQL的max_connections
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)        # 常驻连接数
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)  # 高峰时额外创建的连接数，归还后关闭
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # 等待空闲连接的最长时间（秒），超时抛出异常
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # 连接使用多久后重建（秒），要小于MySQL的wait_timeout
+    DB_POOL_PRE_PING = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() in ('1', 'true', 'yes')  # 取连接时先检测是否已断开
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT') or 5)  # 建立MySQL连接的超时时间（秒）
+    DB_POOL_SLOW_CHECKOUT_MS = int(os.environ.get('DB_POOL_SLOW_CHECKOUT_MS') or 100)  # 等待连接超过多少毫秒时记录告警
+    
+    # /internal/ 下的运行状态接口：管理员登录后可以访问，
+    # 监控系统可以在请求头 X-Internal-Token 中带上INTERNAL_TOKEN访问（不设置时只有管理员能访问）
+    INTERNAL_TOKEN = os.environ.get('INTERNAL_TOKEN')
     
     # 分页配置
     POSTS_PER_PAGE = 10      # 每页显示的文章数量
     COMMENTS_PER_PAGE = 10   # 每页显示的评论数量
+    FEED_ENTRIES = int(os.environ.get('FEED_ENTRIES') or 20)  # 订阅源（Atom/RSS）中的文章数
+    SITEMAP_SHARD_SIZE = int(os.environ.get('SITEMAP_SHARD_SIZE') or 10000)  # 每个文章站点地图分片覆盖的文章ID数，不能超过50000
+    POSTS_COUNT_TTL = int(os.environ.get('POSTS_COUNT_TTL') or 300)  # 文章近似总数的缓存时间（秒），在后台刷新
+    
+    # 浏览量缓冲配置
+    # 浏览量先在内存中累加，每隔VIEW_COUNT_FLUSH_INTERVAL秒批量写回数据库
+    # 进程崩溃时最多丢失一个刷新间隔内的浏览量
+    VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL') or 5)  # 刷新间隔（秒）
+    VIEW_COUNT_MAX_PENDING = int(os.environ.get('VIEW_COUNT_MAX_PENDING') or 1000)     # 累计多少次浏览后立即刷新
+    VIEW_COUNT_ENABLED = (os.environ.get('VIEW_COUNT_ENABLED') or 'true').lower() in ('1', 'true', 'yes')  # 关闭后不再统计浏览量
+    
+    # 缓存失效版本号：整页缓存的标签版本和身份缓存的用户版本，和缓存条目分开保存，不会过期或被淘汰
+    # CACHE_VERSION_BACKEND: filesystem（同一台机器上的所有工作进程共享）或 memory（只在当前进程有效，
+    # 仅适用于单进程的开发服务器和测试，gunicorn多个工作进程时拒绝启动）
+    # 多台机器共同提供服务时，CACHE_VERSION_DIR要放在它们共享的存储上
+    CACHE_VERSION_BACKEND = os.environ.get('CACHE_VERSION_BACKEND') or 'filesystem'
+    CACHE_VERSION_DIR = os.environ.get('CACHE_VERSION_DIR') or os.path.join(basedir, 'cache', 'versions')
+    
+    # 整页缓存配置（只对未登录的访客生效）
+    # PAGE_CACHE_BACKEND: memory（进程内LRU）、filesystem（多个工作进程共享）或 null（关闭）
+    # 条目是否过期由共享的版本号判断，所以每个进程各自的memory后端也能及时看到其他进程的失效
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL') or 60)  # 缓存有效期（秒）
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES') or 64 * 1024 * 1024)  # 缓存总大小上限（字节）
+    PAGE_CACHE_STREAM_TTL = int(os.environ.get('PAGE_CACHE_STREAM_TTL') or 3600)  # 订阅源和站点地图的缓存有效期（秒）
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR') or os.path.join(basedir, 'cache', 'pages')  # filesystem后端的缓存目录
+    
+    # 密码哈希配置
+    # PASSWORD_HASH_METHOD是Werkzeug的哈希方法和成本参数，例如 scrypt:32768:8:1 或 pbkdf2:sha256:600000；
+    # 修改后，旧哈希会在用户下次登录成功时按新参数重新生成
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    # 哈希在独立的进程池中计算，PASSWORD_HASH_WORKERS为进程数，0表示在请求线程中直接计算
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING') or 16)  # 最多排队的哈希任务数，超过时返回503
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)  # 等待哈希结果的最长时间（秒）
+    PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE') or 10)  # 哈希进程调低的调度优先级（nice值增量）
+    
+    # 登录用户身份缓存：每个进程一个进程内LRU，保存用户的只读快照
+    # IDENTITY_CACHE_BACKEND是可选的共享后端：null（只用进程内缓存）或 filesystem（多个工作进程共享快照）
+    # 快照的失效版本号保存在CACHE_VERSION_*中，用户资料、密码和管理员权限的修改在所有工作进程中立即生效
+    IDENTITY_CACHE_BACKEND = os.environ.get('IDENTITY_CACHE_BACKEND') or 'null'
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 300)  # 快照有效期（秒）
+    IDENTITY_CACHE_MAX_BYTES = int(os.environ.get('IDENTITY_CACHE_MAX_BYTES') or 4 * 1024 * 1024)  # 进程内缓存大小上限（字节）
+    IDENTITY_CACHE_DIR = os.environ.get('IDENTITY_CACHE_DIR') or os.path.join(basedir, 'cache', 'identity')  # filesystem后端的缓存目录
+    
+    # SQL查询预算
+    # 单个请求执行的SQL语句数超过预算时记录警告，0表示不限制
+    # SQL_QUERY_BUDGETS可以为单个路由单独设置预算，例如 {'main.index': 6}
+    # 测试环境可以把SQL_QUERY_BUDGET_RAISE设为True，超出预算时直接抛出异常让测试失败
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET') or 0)
+    SQL_QUERY_BUDGETS = {}
+    SQL_QUERY_BUDGET_RAISE = False
+    # 在响应头X-Query-Count中返回本次请求执行的SQL语句数和耗时，供负载测试按路由统计，生产环境不要开启
+    SQL_QUERY_COUNT_HEADER = (os.environ.get('SQL_QUERY_COUNT_HEADER') or 'false').lower() in ('1', 'true', 'yes')
+    
+    # 性能诊断
+    # 每个响应带Server-Timing头（SQL、模板渲染和总耗时），浏览器开发者工具中可以直接查看
+    SERVER_TIMING = (os.environ.get('SERVER_TIMING') or 'true').lower() in ('1', 'true', 'yes')
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or os.path.join(basedir, 'profiles')  # 单个请求的cProfile结果保存目录
+    PROFILER_TOKEN_MAX_AGE = int(os.environ.get('PROFILER_TOKEN_MAX_AGE') or 3600)  # flask profile token生成的令牌有效期（秒）
+    PROFILER_SLOW_STATEMENTS = int(os.environ.get('PROFILER_SLOW_STATEMENTS') or 10)  # 每个路由保留的最慢SQL条数
     
     # 管理员邮箱
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@example.com'
     
     # 上传配置
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads')  # 上传文件保存路径
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大上传文件大小：16MB（16*1024*1024字节）
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大上传文件大小：16MB（16*1024*1024字节）
+    # 上传图片的缩小版本宽度（像素），每个宽度同时生成原格式和WebP版本，模板按显示宽度选用
+    IMAGE_WIDTHS = [int(w) for w in (os.environ.get('IMAGE_WIDTHS') or '480,800,1200').split(',')]
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY') or 80)  # JPEG和WebP的压缩质量
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS') or 40_000_000)  # 拒绝像素数超过这个值的图片（防止解压炸弹）
+    # 生成缩略图的进程数，0表示在请求线程中直接生成（开发、测试）
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_MAX_PENDING = int(os.environ.get('IMAGE_MAX_PENDING') or 32)  # 排队的缩略图任务上限，超过时先使用原图
+    IMAGE_WORKER_NICE = int(os.environ.get('IMAGE_WORKER_NICE') or 10)  # 缩略图进程调低的优先级
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Gunicorn配置：gunicorn -c gunicorn.conf.py wsgi:app
+所有参数都可以用环境变量覆盖
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# 运行指标的多进程模式：每个工作进程把指标写入这个目录，/internal/metrics汇总所有进程
+# 必须在导入应用（prometheus_client）之前设置
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'blog-metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# 监听地址
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8000'
+
+# 工作进程数，默认 CPU核数 * 2 + 1
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+
+# 每个工作进程的线程数；大于1时使用gthread，等待数据库时线程可以处理其他请求
+# 每个进程的数据库连接池（DB_POOL_SIZE + DB_MAX_OVERFLOW）应不小于线程数
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# 请求处理超过这个时间（秒）的工作进程会被重启
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT') or 30)
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE') or 5)
+
+# 每个工作进程处理这么多请求后重启（加上随机抖动，避免同时重启），0表示不重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 0)
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER') or 0)
+
+# 在主进程中导入应用并执行create_app，工作进程fork后共享已加载的代码，
+# 启动新的工作进程（包括max_requests重启）时不必再导入一遍
+preload_app = True
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or '-'
+errorlog = os.environ.get('GUNICORN_ERROR_LOG') or '-'
+
+
+def post_fork(server, worker):
+    """工作进程fork之后：丢弃从主进程继承的数据库连接，每个进程使用自己的连接"""
+    from wsgi import app
+    from app import db
+    from app.utils.db_pool import dispose_after_fork
+
+    dispose_after_fork(app, db)
+
+
+def on_starting(server):
+    """
+    主进程启动时检查缓存失效版本号是否在工作进程之间共享，
+    并清空上次运行留下的指标文件，计数器从0开始
+    （preload_app时主进程已经导入了应用，它自己的指标文件一起删除，fork出的工作进程按自己的PID重新创建）
+    """
+    from config import Config
+
+    if server.cfg.workers > 1 and Config.CACHE_VERSION_BACKEND != 'filesystem':
+        raise RuntimeError(f'{server.cfg.workers} 个工作进程需要共享缓存失效版本号，'
+                           f'CACHE_VERSION_BACKEND={Config.CACHE_VERSION_BACKEND} 只在单个进程内有效，'
+                           '请改为 filesystem')
+
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """工作进程退出后移除它的仪表（正在处理的请求数、连接池连接数），计数器和直方图的值保留"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,30 @@
+"""Backfill published_at for published posts
+
+Revision ID: a61f3c8d2b94
+Revises: 4d8c2f61a7e9
+Create Date: 2026-10-18 21:06:42.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61f3c8d2b94'
+down_revision = '4d8c2f61a7e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 早期版本和直接写库的数据中有已发布但没有发布时间的文章，游标分页按(published_at, id)排序，
+    # 没有发布时间的文章无法出现在列表中；用创建时间（没有时用修改时间）回填
+    op.execute("""
+        UPDATE posts SET published_at = COALESCE(created_at, updated_at, CURRENT_TIMESTAMP)
+        WHERE is_published = 1 AND published_at IS NULL
+    """)
+
+
+def downgrade():
+    # 回填的值无法和原本就有的发布时间区分，保持不变
+    pass
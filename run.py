@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 """
-Flask博客网站启动脚本
-这个文件是整个网站的入口点，就像main函数一样
+Flask博客网站启动脚本（开发环境）
+这个文件是本地开发时的入口点，就像main函数一样
+生产环境请使用wsgi.py和gunicorn.conf.py：gunicorn -c gunicorn.conf.py wsgi:app
 """
 
 import os  # 导入操作系统功能，用于创建文件夹等
 from app import create_app, db  # 从app包导入创建应用的函数和数据库实例
 from app.models.user import User  # 导入用户模型类
 from app.models.post import Post, Tag, Comment  # 导入文章相关模型类
-from flask_migrate import upgrade  # 导入数据库迁移升级功能
 
 # 创建Flask应用实例
 # create_app()是工厂函数，返回配置好的Flask应用
@@ -37,10 +37,7 @@ if __name__ == '__main__':
     # exist_ok=True表示如果目录已存在不会报错
     os.makedirs('app/static/uploads', exist_ok=True)
     
-    # 初始化数据库
-    # app.app_context()创建应用上下文，确保数据库操作在应用环境中执行
-    with app.app_context():
-        upgrade()  # 执行数据库迁移，确保所有表都存在
+    # 数据库迁移不在启动时执行，第一次运行或拉取新代码后先执行：flask db upgrade
     
     # 启动Flask开发服务器
     # debug=True开启调试模式，代码修改后自动重启
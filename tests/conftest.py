@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    创建使用临时SQLite数据库的应用，关键字参数覆盖配置项
+    后台进程池、整页缓存和共享的失效版本号都关闭，测试之间互不影响
+    """
+    from app import create_app, db
+
+    apps = []
+
+    def factory(**overrides):
+        fd, path = tempfile.mkstemp(suffix='.db', dir=tmp_path)
+        os.close(fd)
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'SQLALCHEMY_BINDS': {},
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'PAGE_CACHE_BACKEND': 'null',
+            'CACHE_VERSION_BACKEND': 'memory',
+            'PASSWORD_HASH_WORKERS': 0,
+            'IMAGE_WORKERS': 0,
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'PROFILER_DIR': str(tmp_path / 'profiles'),
+        }
+        settings.update(overrides)
+        app = create_app(type('TestConfig', (Config,), settings))
+        with app.app_context():
+            db.create_all(bind_key=None)  # 只建主库的表；测试中配置的只读副本是另外准备的库
+        apps.append(app)
+        return app
+
+    yield factory
+
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
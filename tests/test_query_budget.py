@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.utils.query_stats import QueryBudgetExceeded, count_queries
+
+
+def test_query_budget_within_limit(make_app):
+    app = make_app(SQL_QUERY_BUDGET=100, SQL_QUERY_BUDGET_RAISE=True)
+    client = app.test_client()
+    with count_queries() as stats:
+        assert client.get('/').status_code == 200
+    assert 0 < stats.count <= 100
+
+
+def test_query_budget_exceeded_raises(make_app):
+    app = make_app(SQL_QUERY_BUDGET=1, SQL_QUERY_BUDGET_RAISE=True)
+    with pytest.raises(QueryBudgetExceeded, match='main.index'):
+        app.test_client().get('/')
+
+
+def test_query_budget_exceeded_logs_without_raise(make_app, caplog, monkeypatch):
+    # 执行迁移时alembic的fileConfig会禁用已有的logger，这里重新打开
+    monkeypatch.setattr(logging.getLogger('app.utils.query_stats'), 'disabled', False)
+    app = make_app(SQL_QUERY_BUDGET=1, SQL_QUERY_BUDGET_RAISE=False)
+    with caplog.at_level(logging.WARNING, logger='app.utils.query_stats'):
+        assert app.test_client().get('/').status_code == 200
+    assert any('超出预算 1 条' in record.getMessage() for record in caplog.records)
+
+
+def test_per_route_budget_overrides_default(make_app):
+    app = make_app(SQL_QUERY_BUDGET=1, SQL_QUERY_BUDGETS={'main.index': 100}, SQL_QUERY_BUDGET_RAISE=True)
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    with pytest.raises(QueryBudgetExceeded, match='post.index'):
+        client.get('/post/')
+
+
+def test_failed_statements_do_not_leak_timings(make_app):
+    """失败的语句不调用after_cursor_execute，计时不能留在连接上，也不能错配给下一条语句"""
+    app = make_app()
+    from app import db
+    with app.app_context(), count_queries(record=True) as stats:
+        with db.engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text('SELECT * FROM no_such_table'))
+            conn.execute(text('SELECT 1'))
+            assert 'query_start' not in conn.info
+    assert stats.count == 1
+    assert 0 <= stats.statements[0][2] < 1
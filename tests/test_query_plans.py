@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from sqlalchemy import MetaData, create_engine
+
+from app.utils.query_plan import plan_problems, run_plan_check
+
+
+MYSQL_URL = os.environ.get('TEST_MYSQL_URL')
+
+
+def _reset_database(url):
+    """删除库中的全部表（包括alembic_version），让迁移从头执行"""
+    engine = create_engine(url)
+    try:
+        metadata = MetaData()
+        metadata.reflect(engine)
+        with engine.begin() as conn:
+            if engine.dialect.name == 'mysql':
+                conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS = 0')
+            metadata.drop_all(conn)
+    finally:
+        engine.dispose()
+
+
+def _check(app, database_url=None):
+    with app.app_context():
+        checked, failures = run_plan_check(app.config, database_url)
+    # 写操作的路由（发文、编辑、评论、删除）也必须真正执行，否则run_plan_check会先抛出RuntimeError
+    assert checked > 0
+    assert [' '.join(statement.split()) for statement, _ in failures] == []
+
+
+def test_seeded_routes_have_no_plan_problems(make_app):
+    """访问main和post蓝图的全部路由，记录到的语句都不应有全表扫描或额外排序"""
+    _check(make_app())
+
+
+@pytest.mark.skipif(not MYSQL_URL, reason='设置TEST_MYSQL_URL（一个可以清空的临时MySQL库）后运行')
+def test_mysql_routes_have_no_plan_problems(make_app):
+    """同样的检查在MySQL上执行EXPLAIN：type为ALL或出现Using filesort都算失败"""
+    _reset_database(MYSQL_URL)
+    try:
+        _check(make_app(), MYSQL_URL)
+    finally:
+        _reset_database(MYSQL_URL)
+
+
+@pytest.mark.parametrize('detail, flagged', [
+    ('SCAN posts', True),
+    ('SCAN posts USING INDEX ix_posts_is_published_published_at', False),
+    ('SCAN posts USING COVERING INDEX ix_posts_user_id', False),
+    ('SEARCH posts USING INDEX ix_posts_slug (slug=?)', False),
+    ('SCAN tags', False),  # ALLOWED_SCANS
+    ('SCAN anon_1', False),
+    ('USE TEMP B-TREE FOR ORDER BY', True),
+])
+def test_sqlite_plan_problems(detail, flagged):
+    assert plan_problems('sqlite', [{'detail': detail}]) == ([detail] if flagged else [])
+
+
+def test_sqlite_cte_scans_are_not_problems():
+    assert plan_problems('sqlite', [{'detail': 'SCAN thread'}], ctes={'thread'}) == []
+
+
+def test_mysql_plan_problems():
+    plan = [
+        {'table': 'posts', 'type': 'ALL', 'Extra': 'Using where; Using filesort'},
+        {'table': 'users', 'type': 'eq_ref', 'Extra': None},
+        {'table': '<derived2>', 'type': 'ALL', 'Extra': None},
+        {'table': 'tags', 'type': 'ALL', 'Extra': None},
+    ]
+    assert plan_problems('mysql', plan) == ['posts: full table scan', 'posts: Using filesort']
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+
+from sqlalchemy import event, select
+
+from app import db
+from app.models.post import Tag
+
+
+def _app_with_replica(make_app, tmp_path):
+    """只读副本是一个空的SQLite库：查询副本上的业务表会出错"""
+    replica = tmp_path / 'replica.db'
+    sqlite3.connect(replica).close()
+    app = make_app(SQLALCHEMY_BINDS={'replica0': f'sqlite:///{replica}'})
+    router = app.extensions['replica_router']
+    router._checked_at = time.monotonic()  # 不启动后台健康检查，由查询出错来发现副本不可用
+    return app, router
+
+
+def test_failed_replica_read_retries_on_primary(make_app, tmp_path):
+    app, router = _app_with_replica(make_app, tmp_path)
+    response = app.test_client().get('/')
+    assert response.status_code == 200
+    assert not router.replicas[0].healthy
+
+
+def test_disconnected_replica_does_not_break_commit(make_app, tmp_path):
+    """副本连接断开后，同一个会话在主库上重试查询，之后的提交也能成功"""
+    app, router = _app_with_replica(make_app, tmp_path)
+    engine = router.replicas[0].engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def gone_away(*args):
+        raise sqlite3.OperationalError('server has gone away')
+
+    @event.listens_for(engine, 'handle_error')
+    def disconnect(context):
+        context.is_disconnect = True
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert db.session.scalars(select(Tag)).all() == []
+        db.session.add(Tag(name='replica', slug='replica'))
+        db.session.commit()
+        assert db.session.scalars(select(Tag.slug)).all() == ['replica']
+    assert not router.replicas[0].healthy
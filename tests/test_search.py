@@ -0,0 +1,51 @@
+from app import db
+from app.models.post import Post
+from app.models.user import User
+from app.search import index_post, search, tokenize
+
+
+def test_tokenize_cjk():
+    assert tokenize('数据库优化') == ['数据', '据库', '库优', '优化']
+    assert sorted(tokenize('数据库', unigrams=True)) == sorted(['数据', '据库', '数', '据', '库'])
+    assert tokenize('库') == ['库']
+
+
+def test_single_character_query_matches_longer_run(make_app):
+    app = make_app()
+    with app.app_context():
+        user = User(username='writer', email='writer@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(title='数据库优化', slug='db', content='索引和执行计划', is_published=True, user_id=user.id)
+        db.session.add(post)
+        db.session.flush()
+        index_post(post)
+        db.session.commit()
+
+        assert [p.slug for p in search('库').items] == ['db']
+        assert [p.slug for p in search('数据库').items] == ['db']
+        assert search('库存').total == 0
+
+
+def test_candidates_capped_per_term(make_app, monkeypatch):
+    """每个检索词只取词频最高的MAX_POSTINGS_PER_TERM篇文章，分页在这个候选集内进行"""
+    from app.search import index as search_index
+
+    monkeypatch.setattr(search_index, 'MAX_POSTINGS_PER_TERM', 2)
+    app = make_app()
+    with app.app_context():
+        user = User(username='writer', email='writer@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(1, 4):
+            post = Post(title=f'post {i}', slug=f'post-{i}', content='cache ' * i, is_published=True, user_id=user.id)
+            db.session.add(post)
+            db.session.flush()
+            index_post(post)
+        db.session.commit()
+
+        results = search('cache', per_page=1)
+        assert results.total == 2
+        assert [p.slug for p in results.items] == ['post-3']
+        assert [p.slug for p in search('cache', page=2, per_page=1).items] == ['post-2']
+        assert search('cache', page=3, per_page=1).items == []
@@ -0,0 +1,29 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.utils.passwords import PasswordHasher, PasswordHasherBusy
+from app.utils.workers import BoundedProcessPool
+
+
+def test_pool_recovers_after_worker_dies():
+    """工作进程意外退出后，受影响的任务以BrokenProcessPool结束，下一次提交换用新的进程池"""
+    pool = BoundedProcessPool(workers=1, max_pending=4, nice=0)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool.try_submit(os._exit, 1).result(timeout=30)
+        assert pool.try_submit(abs, -3).result(timeout=30) == 3
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_hasher_maps_broken_pool_to_busy():
+    hasher = PasswordHasher()
+    hasher.pool.configure(1, 4, 0)
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher._run(os._exit, 1)
+        assert hasher._run(abs, -3) == 3
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,14 @@
+"""
+生产环境的WSGI入口
+由Gunicorn等prefork服务器加载：gunicorn -c gunicorn.conf.py wsgi:app
+和run.py不同，这里不执行数据库迁移，也不开启调试模式；
+部署新版本时先单独执行一次 flask db upgrade
+"""
+
+from app import create_app
+from app.utils.startup import prepare_for_fork
+
+# 应用在主进程中创建一次（preload_app），工作进程fork后直接复用，
+# 工作进程中的数据库连接在gunicorn.conf.py的post_fork中重置
+app = create_app()
+prepare_for_fork(app)